@@ -0,0 +1,265 @@
+import math
+import random
+import statistics
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from cnfCache import CNFCache
+from knowledgeBase import KnowledgeBase
+
+class ApproxCounter:
+    """
+    Approximate model counter with (epsilon, delta) guarantees, in the style of ApproxMC.
+
+    The models of KB & query are split into cells by random XOR constraints
+    over the original symbols. The models in one cell are counted up to a
+    threshold with an exhaustive DPLL search, and the cell size scaled by the
+    number of cells estimates the total. The median over several rounds is
+    within a factor (1 + epsilon) of the exact count with probability at least
+    1 - delta.
+
+    Entailment itself is decided exactly, by searching for a model of KB & ~query.
+    """
+    def __init__(self, filename: Union[str, KnowledgeBase], cnf_mode: str = "standard", cache: CNFCache = None,
+                 workers: int = 1, epsilon: float = 0.8, delta: float = 0.2, seed: Optional[int] = None):
+        """
+        Initialize the ApproxCounter with the clauses of the knowledge base and query.
+
+        :param filename: The file containing the knowledge base and query, or an already compiled KnowledgeBase.
+        :param cnf_mode: "standard" for distributive CNF, "tseitin" for definitional CNF.
+        :param cache: The cache reused for standard CNF conversions, or None for a private one.
+        :param workers: The number of processes converting TELL sentences to standard CNF.
+        :param epsilon: The tolerance: the estimate is within a factor (1 + epsilon) of the count.
+        :param delta: The confidence: the tolerance holds with probability at least 1 - delta.
+        :param seed: The seed of the random XOR constraints, or None for a random seed.
+        """
+        if epsilon <= 0 or not 0 < delta < 1:
+            raise ValueError("epsilon must be positive and delta between 0 and 1")
+
+        if isinstance(filename, KnowledgeBase):
+            self.knowledge_base = filename
+        else:
+            # Two-sided definitions keep auxiliaries determined, so projected counts are exact counts
+            self.knowledge_base = KnowledgeBase.from_file(filename, cnf_mode=cnf_mode, cache=cache, workers=workers)
+
+        self.literals = self.knowledge_base.original_symbols()
+        self.original = set(self.literals)
+        self.clauses = self.knowledge_base.clauses.to_lists() + self.knowledge_base.query.to_lists()
+        self.epsilon = epsilon
+        self.delta = delta
+        self.random = random.Random(seed)
+        # Thresholds from Chakraborty, Meel and Vardi (2016)
+        self.threshold = 1 + math.ceil(9.84 * (1 + epsilon / (1 + epsilon)) * (1 + 1 / epsilon) ** 2)
+        self.rounds = math.ceil(17 * math.log2(3 / delta))
+
+    def bounded_count(self, clauses: List[List[int]], limit: int, xors: List[Tuple[List[int], bool]] = ()) -> int:
+        """
+        Count the models of some clauses and XOR constraints over the original symbols, stopping at a limit.
+
+        This is the DPLL search (unit propagation, then branching on a symbol of
+        the first open clause) run exhaustively instead of stopping at the
+        first model. Once every clause is satisfied, the open XOR rows are
+        reduced by Gaussian elimination: the branch counts 2^(k - r) models, k
+        being the number of original symbols it left unassigned and r the rank
+        of the rows, or none if they are inconsistent. Auxiliary symbols are
+        determined by the original ones, so they never multiply the count.
+
+        Assignments are kept on a trail with per-constraint counters, undone on
+        backtracking, instead of rebuilding the clause lists at every step as
+        DPLL.perform_unit_propagation does. XOR constraints are propagated
+        natively: once all but one of their symbols are assigned, the last one
+        is forced. Their CNF encoding would only propagate once every symbol of
+        a chain link is known, which makes the search far larger.
+
+        :param clauses: The clauses to count.
+        :param limit: The count at which the search stops.
+        :param xors: The XOR constraints, as (symbol ids, required parity).
+        :return: The number of models, or at least limit.
+        """
+        if any(not clause for clause in clauses) or any(not symbols and parity for symbols, parity in xors):
+            return 0
+
+        size = max([abs(literal) for clause in clauses for literal in clause] + self.literals + [0]) + 1
+        # Occurrence lists stored as [literal + size] -> [clause indices]
+        occurrences: List[List[int]] = [[] for _ in range(2 * size)]
+        for index, clause in enumerate(clauses):
+            for literal in clause:
+                occurrences[literal + size].append(index)
+        # XOR occurrences stored as [symbol id] -> [row indices]
+        xor_occurrences: List[List[int]] = [[] for _ in range(size)]
+        for row, (symbols, _) in enumerate(xors):
+            for symbol in symbols:
+                xor_occurrences[symbol].append(row)
+
+        value = [0] * size  # 1 true, -1 false, 0 unassigned
+        true_literals = [0] * len(clauses)
+        open_symbols = [len(symbols) for symbols, _ in xors]
+        # Parity still required from the unassigned symbols of each row
+        parities = [parity for _, parity in xors]
+        trail: List[int] = []
+        state = {"satisfied": 0, "originals": 0}
+
+        def assign(literal: int) -> bool:
+            """Assign a literal and propagate; return False on a conflict."""
+            queue = [literal]
+            while queue:
+                literal = queue.pop()
+                symbol = abs(literal)
+                if value[symbol]:
+                    if value[symbol] != (1 if literal > 0 else -1):
+                        return False
+                    continue
+                value[symbol] = 1 if literal > 0 else -1
+                trail.append(literal)
+                if symbol in self.original:
+                    state["originals"] += 1
+                for index in occurrences[literal + size]:
+                    true_literals[index] += 1
+                    if true_literals[index] == 1:
+                        state["satisfied"] += 1
+                for row in xor_occurrences[symbol]:
+                    open_symbols[row] -= 1
+                    if literal > 0:
+                        parities[row] = not parities[row]
+                # Conflicts and units are checked once the counters are consistent, so undo stays exact
+                for index in occurrences[-literal + size]:
+                    if true_literals[index]:
+                        continue
+                    unassigned = [other for other in clauses[index] if not value[abs(other)]]
+                    if not unassigned:
+                        return False
+                    if len(unassigned) == 1:
+                        queue.append(unassigned[0])
+                for row in xor_occurrences[symbol]:
+                    if open_symbols[row] == 0:
+                        if parities[row]:
+                            return False
+                    elif open_symbols[row] == 1:
+                        last = next(other for other in xors[row][0] if not value[other])
+                        queue.append(last if parities[row] else -last)
+            return True
+
+        def undo(mark: int) -> None:
+            while len(trail) > mark:
+                literal = trail.pop()
+                symbol = abs(literal)
+                value[symbol] = 0
+                if symbol in self.original:
+                    state["originals"] -= 1
+                for index in occurrences[literal + size]:
+                    true_literals[index] -= 1
+                    if true_literals[index] == 0:
+                        state["satisfied"] -= 1
+                for row in xor_occurrences[symbol]:
+                    open_symbols[row] += 1
+                    if literal > 0:
+                        parities[row] = not parities[row]
+
+        def visit() -> Iterator:
+            """Count the models below the current assignment, yielding the visits of its branches."""
+            if state["satisfied"] == len(clauses):
+                # Only XOR rows over original symbols remain: count their solutions by elimination
+                pivots: Dict[int, int] = {}
+                for row, count in enumerate(open_symbols):
+                    if not count:
+                        continue
+                    mask = sum(1 << other for other in xors[row][0] if not value[other]) << 1 | parities[row]
+                    while mask >> 1:
+                        top = mask.bit_length() - 1
+                        if top not in pivots:
+                            pivots[top] = mask
+                            break
+                        mask ^= pivots[top]
+                    else:
+                        if mask:
+                            return 0
+                return 1 << (len(self.literals) - state["originals"] - len(pivots))
+
+            clause = next(clause for index, clause in enumerate(clauses) if not true_literals[index])
+            symbol = next(abs(literal) for literal in clause if not value[abs(literal)])
+            total = 0
+            for literal in (symbol, -symbol):
+                mark = len(trail)
+                if assign(literal):
+                    total += yield visit()
+                undo(mark)
+                if total >= limit:
+                    break
+            return total
+
+        # Unit constraints first, as perform_unit_propagation does
+        for clause in clauses:
+            if len(clause) == 1 and not assign(clause[0]):
+                return 0
+        for symbols, parity in xors:
+            if len(symbols) == 1 and not assign(symbols[0] if parity else -symbols[0]):
+                return 0
+
+        # Run the visits on an explicit stack, resuming each with the count of the branch it yielded,
+        # so the number of branching symbols is not limited by the recursion limit
+        stack = [visit()]
+        result = None
+        while stack:
+            try:
+                call = stack[-1].send(result)
+            except StopIteration as returned:
+                stack.pop()
+                result = returned.value
+            else:
+                stack.append(call)
+                result = None
+        return result
+
+    def estimate_round(self, start: int) -> Tuple[Optional[int], int]:
+        """
+        Run one round: draw random XOR rows and find the number of rows leaving a small cell.
+
+        The constraints with m rows are the first m rows of one random matrix,
+        so cells only shrink as m grows. The search starts from the row count
+        of the previous round.
+
+        :param start: The row count to try first.
+        :return: The estimate of the round, or None if no row count gives a small cell, and the row count used.
+        """
+        rows = [([symbol for symbol in self.literals if self.random.random() < 0.5], self.random.random() < 0.5)
+                for _ in range(len(self.literals))]
+        counts: Dict[int, int] = {}
+
+        def cell_count(m: int) -> int:
+            if m not in counts:
+                counts[m] = self.bounded_count(self.clauses, self.threshold, rows[:m])
+            return counts[m]
+
+        m = max(1, min(start, len(self.literals)))
+        while cell_count(m) >= self.threshold:
+            if m == len(self.literals):
+                return None, m
+            m += 1
+        while m > 1 and cell_count(m - 1) < self.threshold:
+            m -= 1
+        return cell_count(m) << m, m
+
+    def count(self) -> int:
+        """
+        Estimate the number of models of KB & query.
+
+        :return: The exact count when it is below the threshold, otherwise the median of the round estimates.
+        """
+        exact = self.bounded_count(self.clauses, self.threshold)
+        if exact < self.threshold:
+            return exact
+
+        estimates = []
+        m = 1
+        for _ in range(self.rounds):
+            estimate, m = self.estimate_round(m)
+            if estimate is not None:
+                estimates.append(estimate)
+        return round(statistics.median(estimates)) if estimates else exact
+
+    def infer(self) -> None:
+        """
+        Decide entailment exactly and print the approximate TruthTable answer.
+        """
+        if self.bounded_count(self.knowledge_base.clauses.to_lists() + self.knowledge_base.negated_query.to_lists(), 1):
+            print("NO")
+            return
+        print(f"YES: {self.count()}")
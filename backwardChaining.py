@@ -1,92 +1,57 @@
-import re
-from collections import deque
-from forwardChaining import ForwardChaining
-from typing import Dict, List, Tuple, Optional
-from parser import Parser
+from typing import Dict, List, Optional, Union
+from knowledgeBase import KnowledgeBase
 
 class BackwardChaining:
-    def __init__(self, filename: str):
+    def __init__(self, filename: Union[str, KnowledgeBase], relevance: bool = False):
         """
         Initialize the BackwardChaining object.
 
         Args:
-            filename (str): The name of the file containing the knowledge base and query.
+            filename (str | KnowledgeBase): The name of the file containing the knowledge base and query,
+                or a KnowledgeBase compiled with rules.
+            relevance (bool): Whether to chain only over the rules the queries depend on.
         """
-        # Rules stored as { conclusion: [([premises], is_negated)] }
-        self.rules: Dict[str, List[Tuple[List[Tuple[str, bool]], bool]]] = {}
-        # Facts stored with negation flag
-        self.facts: Dict[str, bool] = {}
-        self.query: Optional[Tuple[str, bool]] = None
-        self.checked_literals: List[str] = []  # List of checked literals
-        self.prevent_infinite = set()  # Prevent recursive loop
-        self.parse_kb_and_query(filename)
-
-    def parse_kb_and_query(self, filename: str) -> None:
-        """
-        Parse the input file to get the knowledge base and query.
-
-        Args:
-            filename (str): The name of the file containing the knowledge base and query.
-        """
-        with open(filename, 'r') as file:
-            content = file.read()
-
-        # Separate TELL and ASK parts
-        tell_part = re.search(r'TELL\s+([\s\S]*?)\s+ASK', content).group(1).strip()
-        ask_part = re.search(r'ASK\s+(.*)', content).group(1).strip()
+        if isinstance(filename, KnowledgeBase):
+            self.knowledge_base = filename
+        else:
+            self.knowledge_base = KnowledgeBase.from_file(filename, clauses=False, rules=True)
 
         # Check if the input is in Horn form
-        if not Parser.is_horn_form(tell_part):
+        if not self.knowledge_base.horn:
             print("The input knowledge base is not in Horn form.")
             exit(1)
 
-        # Separate conditions in TELL
-        clauses = tell_part.split(";")
-        for clause in clauses:
-            clause = clause.strip()
-            if "||" in clause:
-                # Convert disjunction to implication
-                clause = Parser.disjunction_to_implication(clause)
-                if not clause:
-                    exit(1)
-            if "=>" in clause:
-                # Parse left-hand side and right-hand side
-                premises, conclusion = clause.split("=>")
-                premises = [
-                    (p.strip().lstrip("~"), p.strip().startswith("~")) for p in premises.split("&")
-                ]
-                conclusion = conclusion.strip().lstrip("~")
-                is_negated_conclusion = conclusion.startswith("~")
-                
-                # Add to self.rules
-                if conclusion not in self.rules:
-                    self.rules[conclusion] = []
-                self.rules[conclusion].append((premises, is_negated_conclusion))
-            else:
-                # If it is a fact
-                literal = clause.strip().lstrip("~")
-                is_negated = clause.strip().startswith("~")
-                self.facts[literal] = not is_negated  # Add negation state to facts
-
-        # Store query with negation flag if any
-        self.query = (ask_part.strip().lstrip("~"), ask_part.strip().startswith("~"))
+        self.symbols = self.knowledge_base.symbols
+        # Rules stored as premises followed by the conclusion, indexed by conclusion
+        self.rules = self.knowledge_base.rules
+        self.rule_index = self.knowledge_base.rule_index
+        # Relevance slicing counters, None when chaining over the whole rule base
+        self.slicing: Optional[Dict[str, int]] = None
+        if relevance:
+            goals = [literal for _, literal in self.knowledge_base.queries if literal is not None]
+            self.rules, self.rule_index, self.slicing = self.knowledge_base.relevant_rules(goals)
+        # Facts stored with their truth value
+        self.facts: Dict[int, bool] = self.knowledge_base.facts
+        self.query: Optional[int] = self.knowledge_base.query_literal
+        self.checked_literals: List[int] = []  # List of checked literals
+        self.prevent_infinite = set()  # Prevent recursive loop
 
     def infer(self) -> None:
         """
         Run the backward chaining algorithm and print YES or NO.
         """
-        result = self.DoesEntail(*self.query)
+        result = self.query is not None and self.DoesEntail(abs(self.query), self.query < 0)
         if result:
-            print("YES: " + ", ".join(self.checked_literals))
+            print("YES: " + ", ".join(self.symbols.name(symbol) for symbol in self.checked_literals))
         else:
             print("NO")
 
-    def DoesEntail(self, literal_name: str, is_negated: bool) -> bool:
+    def DoesEntail(self, literal_name: int, is_negated: bool) -> bool:
         """
         Check if the literal can be inferred from the knowledge base.
 
         Args:
-            literal_name (str): The name of the literal to check.
+            literal_name (int): The symbol id of the literal to check.
             is_negated (bool): Whether the literal is negated.
 
         Returns:
@@ -96,12 +61,12 @@ class BackwardChaining:
         result = self.TruthValue(literal_name, is_negated)
         return result if not is_negated else not result
 
-    def TruthValue(self, literal_name: str, is_negated: bool) -> bool:
+    def TruthValue(self, literal_name: int, is_negated: bool) -> bool:
         """
         Recursively check if the literal can be true.
 
         Args:
-            literal_name (str): The name of the literal to check.
+            literal_name (int): The symbol id of the literal to check.
             is_negated (bool): Whether the literal is negated.
 
         Returns:
@@ -124,12 +89,12 @@ class BackwardChaining:
         self.prevent_infinite.add(literal_name)
 
         # Check the rules
-        if literal_name in self.rules: # Check if there is any conclusion matching the name being searched
+        if literal_name in self.rule_index: # Check if there is any conclusion matching the name being searched
             # literal_name is "x", we will check if there is any rule with conclusion x (e.g., a & ~c => x).
-            for premises, conclusion_negated in self.rules[literal_name]:
-                if conclusion_negated == is_negated: # Ensure that only when the negations of the conclusion and literal match, the rule is further evaluated. For example, a => b or ~a => ~b
+            for rule_number in self.rule_index[literal_name]:
+                if not is_negated: # Horn conclusions are positive, so rules only help to prove a positive literal
                     # Check all premises with negation state
-                    if all(self.TruthValue(p, neg) for p, neg in premises):
+                    if all(self.TruthValue(abs(p), p < 0) for p in self.rules[rule_number][:-1]):
                         self.prevent_infinite.remove(literal_name) # Ensure that when returning to higher recursion levels, literal_name can be checked again if needed without being blocked by self.prevent_infinite
                         if literal_name not in self.checked_literals:
                             self.checked_literals.append(literal_name)
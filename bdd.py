@@ -0,0 +1,282 @@
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple, Union
+from cnfCache import CNFCache
+from formula import Formula
+from knowledgeBase import KnowledgeBase
+
+class BDD:
+    """
+    Reduced ordered binary decision diagram (ROBDD) of the knowledge base.
+
+    Nodes live in parallel arrays (level, low child, high child) and are
+    hash-consed through a unique table, so every Boolean function over the
+    chosen variable order has exactly one node and equivalence is an integer
+    comparison. All operations go through ITE (if-then-else), whose results
+    are memoized in a computed cache that evicts its least recently used
+    entries.
+
+    Only original symbols are variables: a Tseitin auxiliary stands for the
+    diagram of its definition, so both CNF modes compile to the same
+    diagram. The KB entails the query iff KB => query is the constant 1, and
+    the YES count is the number of models of KB & query, found by one pass
+    over its nodes, as in TruthTable. Once compiled, the KB diagram can be
+    reused for any number of queries.
+    """
+    FALSE = 0
+    TRUE = 1
+    # Maximum number of ITE results kept, least recently used are evicted first
+    CACHE_SIZE = 1 << 18
+    # Number of center-of-gravity passes refining the variable order
+    ORDER_ITERATIONS = 20
+
+    def __init__(self, filename: Union[str, KnowledgeBase], cnf_mode: str = "standard", cache: CNFCache = None,
+                 workers: int = 1):
+        """
+        Initialize the BDD by compiling the knowledge base and query.
+
+        :param filename: The file containing the knowledge base and query, or an already compiled KnowledgeBase.
+        :param cnf_mode: "standard" for distributive CNF, "tseitin" for definitional CNF.
+        :param cache: The cache reused for standard CNF conversions, or None for a private one.
+        :param workers: The number of processes converting TELL sentences to standard CNF.
+        """
+        if isinstance(filename, KnowledgeBase):
+            self.knowledge_base = filename
+        else:
+            self.knowledge_base = KnowledgeBase.from_file(filename, cnf_mode=cnf_mode, cache=cache, workers=workers)
+
+        self.literals = self.knowledge_base.original_symbols()
+        self.definitions = self.knowledge_base.definitions
+
+        # Original symbols each auxiliary depends on, built children first
+        support = {symbol: {symbol} for symbol in self.literals}
+        for auxiliary, (_, literals) in self.definitions.items():
+            support[auxiliary] = set().union(*(support[abs(literal)] for literal in literals))
+        clauses = self.knowledge_base.clauses.to_lists() + self.knowledge_base.query.to_lists()
+        supports = [set().union(*(support[abs(literal)] for literal in clause)) for clause in clauses]
+
+        self.order = self.variable_order(supports)
+        # Levels stored as { symbol id: position in the order }; terminals sit below every variable
+        self.levels: Dict[int, int] = {symbol: level for level, symbol in enumerate(self.order)}
+        terminal_level = len(self.order)
+
+        # Node arrays, nodes 0 and 1 being the constants
+        self.node_levels = array('i', [terminal_level, terminal_level])
+        self.lows = array('i', [BDD.FALSE, BDD.TRUE])
+        self.highs = array('i', [BDD.FALSE, BDD.TRUE])
+        # Unique table stored as { (level, low, high): node }
+        self.unique: Dict[Tuple[int, int, int], int] = {}
+        # Computed cache stored as { (f, g, h): ITE(f, g, h) }
+        self.computed: OrderedDict[Tuple[int, int, int], int] = OrderedDict()
+        self.cache_hits = 0
+
+        # Diagrams of the auxiliaries, built children first
+        self.definition_nodes: Dict[int, int] = {}
+        for auxiliary, (operation, literals) in self.definitions.items():
+            combine = self.conjoin if operation == Formula.AND else self.disjoin
+            node = BDD.TRUE if operation == Formula.AND else BDD.FALSE
+            for literal in literals:
+                node = combine(node, self.literal_node(literal))
+            self.definition_nodes[auxiliary] = node
+
+        self.kb = self.compile(self.knowledge_base.clauses)
+        self.query = self.compile(self.knowledge_base.query)
+
+    def variable_order(self, supports: List[set]) -> List[int]:
+        """
+        Choose a static variable order keeping the symbols of each clause close together.
+
+        This is the FORCE heuristic: starting from the order of first
+        appearance, every clause computes the center of gravity of its
+        symbols' positions, every symbol moves to the mean center of gravity
+        of its clauses, and the order with the smallest total clause span is
+        kept.
+
+        :param supports: The original symbols each clause depends on.
+        :return: The symbols from the root level down.
+        """
+        order = list(dict.fromkeys([symbol for support in supports for symbol in sorted(support)] + self.literals))
+        supports = [support for support in supports if len(support) > 1]
+
+        def span(order: List[int]) -> int:
+            position = {symbol: index for index, symbol in enumerate(order)}
+            return sum(max(position[symbol] for symbol in support) - min(position[symbol] for symbol in support)
+                       for support in supports)
+
+        best, best_span = order, span(order)
+        for _ in range(BDD.ORDER_ITERATIONS):
+            position = {symbol: index for index, symbol in enumerate(order)}
+            totals = dict.fromkeys(order, 0.0)
+            counts = dict.fromkeys(order, 0)
+            for support in supports:
+                center = sum(position[symbol] for symbol in support) / len(support)
+                for symbol in support:
+                    totals[symbol] += center
+                    counts[symbol] += 1
+            # Symbols in no clause keep their position; sorting is stable so ties keep the current order
+            order = sorted(order, key=lambda symbol: totals[symbol] / counts[symbol] if counts[symbol] else position[symbol])
+            order_span = span(order)
+            if order_span >= best_span:
+                break
+            best, best_span = order, order_span
+        return best
+
+    def make(self, level: int, low: int, high: int) -> int:
+        """
+        Return the node testing the variable at a level, reusing an identical node.
+
+        :param level: The level of the tested variable.
+        :param low: The node followed when the variable is false.
+        :param high: The node followed when the variable is true.
+        :return: The node.
+        """
+        if low == high:
+            return low
+        key = (level, low, high)
+        node = self.unique.get(key)
+        if node is None:
+            node = len(self.node_levels)
+            self.node_levels.append(level)
+            self.lows.append(low)
+            self.highs.append(high)
+            self.unique[key] = node
+        return node
+
+    def ite(self, f: int, g: int, h: int) -> int:
+        """
+        Return the node of "if f then g else h".
+
+        The cofactor calls run on an explicit stack, the low cofactor first as
+        in the recursive definition, so the number of levels is not limited by
+        the recursion limit.
+
+        :param f: The condition node.
+        :param g: The node taken where f holds.
+        :param h: The node taken where f does not hold.
+        :return: The result node.
+        """
+        levels, lows, highs, computed = self.node_levels, self.lows, self.highs, self.computed
+        # Pending calls stored as [(f, g, h), top level, high cofactors, low result]
+        stack = []
+        while True:
+            if f == BDD.TRUE or g == h:
+                result = g
+            elif f == BDD.FALSE:
+                result = h
+            elif g == BDD.TRUE and h == BDD.FALSE:
+                result = f
+            else:
+                key = (f, g, h)
+                result = computed.get(key)
+                if result is None:
+                    top = min(levels[f], levels[g], levels[h])
+                    f_low, f_high = (lows[f], highs[f]) if levels[f] == top else (f, f)
+                    g_low, g_high = (lows[g], highs[g]) if levels[g] == top else (g, g)
+                    h_low, h_high = (lows[h], highs[h]) if levels[h] == top else (h, h)
+                    stack.append([key, top, (f_high, g_high, h_high), None])
+                    f, g, h = f_low, g_low, h_low
+                    continue
+                self.cache_hits += 1
+                computed.move_to_end(key)
+
+            # Complete the calls waiting for this result as their high cofactor
+            while stack and stack[-1][3] is not None:
+                key, top, _, low = stack.pop()
+                result = self.make(top, low, result)
+                computed[key] = result
+                if len(computed) > BDD.CACHE_SIZE:
+                    computed.popitem(last=False)
+            if not stack:
+                return result
+            # The result is the low cofactor of the innermost call, whose high cofactor comes next
+            stack[-1][3] = result
+            f, g, h = stack[-1][2]
+
+    def negate(self, f: int) -> int:
+        """Return the node of ~f."""
+        return self.ite(f, BDD.FALSE, BDD.TRUE)
+
+    def conjoin(self, f: int, g: int) -> int:
+        """Return the node of f & g."""
+        return self.ite(f, g, BDD.FALSE)
+
+    def disjoin(self, f: int, g: int) -> int:
+        """Return the node of f || g."""
+        return self.ite(f, BDD.TRUE, g)
+
+    def implies(self, f: int, g: int) -> int:
+        """Return the node of f => g."""
+        return self.ite(f, g, BDD.TRUE)
+
+    def literal_node(self, literal: int) -> int:
+        """
+        Return the node of a signed literal, an auxiliary standing for its definition.
+
+        :param literal: The signed symbol id.
+        :return: The node.
+        """
+        symbol = abs(literal)
+        node = self.definition_nodes.get(symbol)
+        if node is None:
+            node = self.make(self.levels[symbol], BDD.FALSE, BDD.TRUE)
+        return node if literal > 0 else self.negate(node)
+
+    def compile(self, clauses: Iterable[Iterable[int]]) -> int:
+        """
+        Return the node of a conjunction of clauses.
+
+        :param clauses: The clauses, as signed symbol ids.
+        :return: The node.
+        """
+        result = BDD.TRUE
+        for clause in clauses:
+            node = BDD.FALSE
+            for literal in clause:
+                node = self.disjoin(node, self.literal_node(literal))
+            result = self.conjoin(result, node)
+            if result == BDD.FALSE:
+                break
+        return result
+
+    def entails(self, query: int) -> bool:
+        """
+        Check whether the KB entails a query.
+
+        :param query: The node of the query.
+        :return: True if KB => query is the constant 1.
+        """
+        return self.implies(self.kb, query) == BDD.TRUE
+
+    def count(self, f: int) -> int:
+        """
+        Count the assignments of the original symbols satisfying a node, in one pass over its nodes.
+
+        :param f: The node to count.
+        :return: The number of models.
+        """
+        levels, lows, highs = self.node_levels, self.lows, self.highs
+        reachable = set()
+        stack = [f]
+        while stack:
+            node = stack.pop()
+            if node > BDD.TRUE and node not in reachable:
+                reachable.add(node)
+                stack += [lows[node], highs[node]]
+
+        # Children are always created before their parents, so increasing ids are a bottom-up order
+        counts = {BDD.FALSE: 0, BDD.TRUE: 1}
+        for node in sorted(reachable):
+            low, high = lows[node], highs[node]
+            # Each level skipped below a node doubles the models through that edge
+            counts[node] = ((counts[low] << (levels[low] - levels[node] - 1)) +
+                            (counts[high] << (levels[high] - levels[node] - 1)))
+        return counts[f] << levels[f]
+
+    def infer(self) -> None:
+        """
+        Check entailment on the compiled diagrams and print the TruthTable answer.
+        """
+        if not self.entails(self.query):
+            print("NO")
+        else:
+            print(f"YES: {self.count(self.conjoin(self.kb, self.query))}")
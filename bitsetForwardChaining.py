@@ -0,0 +1,181 @@
+import heapq
+from array import array
+from typing import Dict, List, Optional, Union
+from knowledgeBase import KnowledgeBase
+
+class BitsetForwardChaining:
+    """
+    Forward chaining over compressed sparse row (CSR) arrays, for very large Horn rule bases.
+
+    The rules are numbered by their scan position in rule_index. Two CSR
+    incidence structures map each symbol to the positions of the rules having
+    it as a positive or negated premise: rows are slices of one flat 'i' array
+    delimited by a 'q' offsets array, built from the flat rule database in two
+    counting passes. The derived set is a byte map with one flag per symbol, and
+    the premise counters are flat arrays, so no per-rule Python object exists.
+
+    Propagation still updates one counter at a time, as ForwardChaining does;
+    the gain over it is in memory and in iterating contiguous CSR rows. The
+    set is not bit-packed and rounds are not vectorized: without numpy, word
+    level operations on Python integers cost time proportional to the whole
+    rule base per derived symbol, and a batched round would lose the scan
+    order that decides the YES line.
+
+    Derivation runs in semi-naive rounds. A round is the scan ForwardChaining
+    performs after popping a fact: the rules made ready by the previous round
+    fire in scan order, and only the symbols newly derived in the round update
+    the counters of the rules in their CSR rows. Since the agenda is first in,
+    first out, the facts are popped in derivation order, so the YES line is
+    the one ForwardChaining prints.
+    """
+    def __init__(self, filename: Union[str, KnowledgeBase], relevance: bool = False):
+        """
+        Initialize the BitsetForwardChaining object and build the CSR premise index.
+
+        Args:
+            filename (str | KnowledgeBase): The name of the file containing the knowledge base and query,
+                or a KnowledgeBase compiled with rules.
+            relevance (bool): Whether to chain only over the rules the queries depend on.
+        """
+        if isinstance(filename, KnowledgeBase):
+            self.knowledge_base = filename
+        else:
+            self.knowledge_base = KnowledgeBase.from_file(filename, clauses=False, rules=True)
+
+        # Check if the input is in Horn form
+        if not self.knowledge_base.horn:
+            print("The input knowledge base is not in Horn form.")
+            exit(1)
+
+        self.symbols = self.knowledge_base.symbols
+        self.rules = self.knowledge_base.rules
+        self.rule_index = self.knowledge_base.rule_index
+        # Relevance slicing counters, None when chaining over the whole rule base
+        self.slicing: Optional[Dict[str, int]] = None
+        if relevance:
+            goals = [literal for _, literal in self.knowledge_base.queries if literal is not None]
+            self.rules, self.rule_index, self.slicing = self.knowledge_base.relevant_rules(goals)
+        # Facts stored with their truth value
+        self.facts: Dict[int, bool] = self.knowledge_base.facts
+        self.query: Optional[int] = self.knowledge_base.query_literal
+        self.entailments: List[int] = []  # Derived symbols in the order they are popped
+        self.build_index()
+
+    def build_index(self) -> None:
+        """
+        Build the CSR premise incidence arrays and the conclusion of every scan position.
+        """
+        literals, offsets = self.rules.literals, self.rules.offsets
+        row_count = len(self.symbols) + 2
+
+        # Scan order stored as [position] -> rule number
+        self.order = array('i', (rule_number for rule_numbers in self.rule_index.values() for rule_number in rule_numbers))
+        self.conclusions = array('i', (literals[offsets[rule_number + 1] - 1] for rule_number in self.order))
+
+        # First pass: count the premise occurrences of every symbol, shifted by one row,
+        # and the positive premises of every rule
+        positive_offsets = array('q', bytes(8 * row_count))
+        negative_offsets = array('q', bytes(8 * row_count))
+        self.premise_counts = array('i', bytes(4 * len(self.order)))
+        for position, rule_number in enumerate(self.order):
+            for index in range(offsets[rule_number], offsets[rule_number + 1] - 1):
+                premise = literals[index]
+                if premise > 0:
+                    positive_offsets[premise + 1] += 1
+                    self.premise_counts[position] += 1
+                else:
+                    negative_offsets[1 - premise] += 1
+        for row in range(1, row_count):
+            positive_offsets[row] += positive_offsets[row - 1]
+            negative_offsets[row] += negative_offsets[row - 1]
+
+        # Second pass: fill the rows with the scan positions, which keeps each row sorted
+        self.positive_rules = array('i', bytes(4 * positive_offsets[-1]))
+        self.negative_rules = array('i', bytes(4 * negative_offsets[-1]))
+        positive_next = array('q', positive_offsets)
+        negative_next = array('q', negative_offsets)
+        for position, rule_number in enumerate(self.order):
+            for index in range(offsets[rule_number], offsets[rule_number + 1] - 1):
+                premise = literals[index]
+                if premise > 0:
+                    self.positive_rules[positive_next[premise]] = position
+                    positive_next[premise] += 1
+                else:
+                    self.negative_rules[negative_next[-premise]] = position
+                    negative_next[-premise] += 1
+        self.positive_offsets = positive_offsets
+        self.negative_offsets = negative_offsets
+
+    def derive(self, stop: Optional[int] = None) -> bool:
+        """
+        Derive symbols in semi-naive rounds, appending them to entailments in derivation order.
+
+        Args:
+            stop (int | None): The symbol id at which derivation stops, or None to compute the whole closure.
+
+        Returns:
+            bool: True if the stop symbol was derived, False once the closure is complete.
+        """
+        derived = bytearray(len(self.symbols) + 1)
+        initial = [fact for fact, is_true in self.facts.items() if is_true]
+        for fact in initial:
+            derived[fact] = 1
+        self.entailments = []
+        for fact in initial:
+            self.entailments.append(fact)
+            if fact == stop:
+                return True
+        if not initial:
+            # Nothing is ever popped, so no rule is ever scanned
+            return False
+
+        positive_rules, positive_offsets = self.positive_rules, self.positive_offsets
+        negative_rules, negative_offsets = self.negative_rules, self.negative_offsets
+        conclusions = self.conclusions
+
+        # Premise counters: positive premises not derived yet, negated premises derived
+        unsatisfied = array('i', self.premise_counts)
+        blocked = array('i', bytes(4 * len(self.order)))
+        for fact in initial:
+            for other in negative_rules[negative_offsets[fact]:negative_offsets[fact + 1]]:
+                blocked[other] += 1
+            for other in positive_rules[positive_offsets[fact]:positive_offsets[fact + 1]]:
+                unsatisfied[other] -= 1
+
+        pending = [position for position in range(len(self.order)) if not unsatisfied[position] and not blocked[position]]
+        while pending:
+            # One round: rules made ready further down the round fire in it, the others in the next round
+            heapq.heapify(pending)
+            next_round = []
+            while pending:
+                position = heapq.heappop(pending)
+                conclusion = conclusions[position]
+                if blocked[position] or derived[conclusion]:
+                    continue
+
+                derived[conclusion] = 1
+                self.entailments.append(conclusion)
+                if conclusion == stop:
+                    return True
+                for other in negative_rules[negative_offsets[conclusion]:negative_offsets[conclusion + 1]]:
+                    blocked[other] += 1
+                # A CSR row is a contiguous slice, copied and iterated at C speed
+                for other in positive_rules[positive_offsets[conclusion]:positive_offsets[conclusion + 1]]:
+                    unsatisfied[other] -= 1
+                    if not unsatisfied[other] and not blocked[other]:
+                        if other > position:
+                            heapq.heappush(pending, other)
+                        else:
+                            next_round.append(other)
+            pending = next_round
+        return False
+
+    def infer(self) -> None:
+        """
+        Run the forward chaining algorithm and print YES or NO with the required format.
+        """
+        # As in ForwardChaining, only a positive literal can be popped as the query
+        if self.query is not None and self.query > 0 and self.derive(self.query):
+            print(f"YES: {', '.join(self.symbols.name(symbol) for symbol in self.entailments)}")
+        else:
+            print("NO")
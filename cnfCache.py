@@ -0,0 +1,252 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import Executor
+from formula import Formula, FormulaParser
+from converter import CNFConverter
+
+class CNFCache:
+    """
+    Memoization layer for CNF conversion of single sentences.
+
+    Entries are keyed by a hash of the printed form of the parsed sentence, so
+    the same sentence written with different spacing or redundant parentheses
+    shares one entry. Recently used conversions stay in an in-process LRU. When a directory is given, entries
+    are also stored there as one JSON file per key, and the least recently used
+    files are evicted once the directory grows past max_disk_bytes.
+    """
+    # Bump when the converter output changes so stale disk entries are ignored
+    FORMAT_VERSION = 2
+
+    def __init__(self, capacity: int = 4096, directory: str = None, max_disk_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        :param capacity: The maximum number of conversions kept in memory.
+        :param directory: The directory of the on-disk store, or None to keep entries in memory only.
+        :param max_disk_bytes: The size the on-disk store is trimmed to.
+        """
+        self.capacity = capacity
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries: OrderedDict[str, tuple] = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_bytes = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self.disk_bytes = sum(size for _, _, size in self.disk_entries())
+
+    @staticmethod
+    def normalize(formula: Formula) -> str:
+        """
+        Normalize a formula so that formatting differences do not change its key.
+
+        :param formula: The parsed sentence.
+        :return: The formula printed with single spaces and minimal parentheses.
+        """
+        return str(formula)
+
+    def key(self, formula: Formula, negate: bool) -> str:
+        """
+        Compute the content address of a conversion.
+
+        :param formula: The parsed sentence.
+        :param negate: Whether the negation of the sentence is converted.
+        :return: The hexadecimal digest identifying the conversion.
+        """
+        text = f"{CNFCache.FORMAT_VERSION}\n{'~' if negate else ''}{CNFCache.normalize(formula)}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def convert(self, sentence: str, negate: bool = False) -> list[list[tuple[str, bool]]]:
+        """
+        Convert a sentence (or its negation) to CNF clauses, reusing earlier conversions.
+
+        :param sentence: The sentence as a string.
+        :param negate: Whether to convert the negation of the sentence.
+        :return: A fresh list of clauses, each a list of (symbol, is_negated) literals.
+        """
+        return self.convert_formula(FormulaParser.parse(sentence), negate)
+
+    def convert_formula(self, formula: Formula, negate: bool = False) -> list[list[tuple[str, bool]]]:
+        """
+        Convert a parsed sentence (or its negation) to CNF clauses, reusing earlier conversions.
+
+        :param formula: The parsed sentence.
+        :param negate: Whether to convert the negation of the sentence.
+        :return: A fresh list of clauses, each a list of (symbol, is_negated) literals.
+        """
+        return self.convert_formulas([formula], negate)[0]
+
+    def convert_formulas(self, formulas: list[Formula], negate: bool = False, executor: Executor = None,
+                         chunk_size: int = 1) -> list[list[list[tuple[str, bool]]]]:
+        """
+        Convert a batch of parsed sentences, optionally spreading the misses over an executor.
+
+        Cached conversions are looked up first; the remaining sentences are
+        converted by executor.map in chunks of chunk_size, so the results keep
+        the order of the batch whatever the worker scheduling.
+
+        :param formulas: The parsed sentences.
+        :param negate: Whether to convert the negation of each sentence.
+        :param executor: The executor converting the misses, or None to convert them in this process.
+        :param chunk_size: The number of sentences sent to a worker at a time.
+        :return: For each sentence, a fresh list of clauses.
+        """
+        results: list[tuple | None] = [None] * len(formulas)
+        # Missing conversions stored as { key: [indices in the batch] }, so repeated sentences are converted once
+        pending: dict[str, list[int]] = {}
+
+        for index, formula in enumerate(formulas):
+            key = self.key(formula, negate)
+            if key in pending:
+                pending[key].append(index)
+                continue
+
+            clauses = self.entries.get(key)
+            if clauses is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            else:
+                clauses = self.load(key)
+                if clauses is None:
+                    pending[key] = [index]
+                    continue
+                self.disk_hits += 1
+                self.remember(key, clauses)
+            results[index] = clauses
+
+        targets = [formulas[indices[0]] for indices in pending.values()]
+        if negate:
+            targets = [Formula.negate(formula) for formula in targets]
+        if executor is not None:
+            converted = executor.map(CNFCache.convert_uncached, targets, chunksize=chunk_size)
+        else:
+            converted = map(CNFCache.convert_uncached, targets)
+
+        for (key, indices), clauses in zip(pending.items(), converted):
+            self.misses += 1
+            self.store(key, clauses)
+            self.remember(key, clauses)
+            for index in indices:
+                results[index] = clauses
+
+        return [[list(clause) for clause in clauses] for clauses in results]
+
+    @staticmethod
+    def convert_uncached(formula: Formula) -> tuple:
+        """
+        Convert a formula to CNF without consulting the cache.
+
+        Static so that it can be sent to worker processes.
+
+        :param formula: The formula to convert.
+        :return: The clauses as tuples of (symbol, is_negated) literals.
+        """
+        return tuple(tuple(clause) for clause in CNFConverter.convert_formula(formula))
+
+    def remember(self, key: str, clauses: tuple) -> None:
+        """Add a conversion to the in-process LRU, dropping the least recently used entry if it is full."""
+        self.entries[key] = clauses
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def path(self, key: str) -> str:
+        """Return the file path of a key in the on-disk store."""
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def load(self, key: str) -> tuple | None:
+        """
+        Load a conversion from the on-disk store.
+
+        :param key: The content address of the conversion.
+        :return: The clauses, or None if the store is disabled or has no usable entry.
+        """
+        if not self.directory:
+            return None
+
+        path = self.path(key)
+        try:
+            with open(path, "r") as f:
+                clauses = json.load(f)
+            # Refresh the modification time so eviction keeps recently used entries
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return tuple(tuple((name, negated) for name, negated in clause) for clause in clauses)
+
+    def store(self, key: str, clauses: tuple) -> None:
+        """
+        Write a conversion to the on-disk store and evict old entries if it grew too large.
+
+        :param key: The content address of the conversion.
+        :param clauses: The clauses to store.
+        """
+        if not self.directory:
+            return
+
+        path = self.path(key)
+        data = json.dumps([[[name, negated] for name, negated in clause] for clause in clauses], separators=(",", ":"))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so concurrent runs never read a partial entry
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as f:
+                f.write(data)
+            os.replace(temporary, path)
+        except OSError:
+            return
+
+        self.disk_bytes += len(data)
+        if self.disk_bytes > self.max_disk_bytes:
+            self.evict()
+
+    def disk_entries(self) -> list[tuple[float, str, int]]:
+        """
+        List the files of the on-disk store.
+
+        :return: A list of (modification time, path, size) tuples.
+        """
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    status = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((status.st_mtime, path, status.st_size))
+        return entries
+
+    def evict(self) -> None:
+        """Delete the least recently used files until the store is back under three quarters of its limit."""
+        entries = sorted(self.disk_entries())
+        self.disk_bytes = sum(size for _, _, size in entries)
+
+        for _, path, size in entries:
+            if self.disk_bytes <= self.max_disk_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.disk_bytes -= size
+
+    def stats(self) -> dict[str, int]:
+        """
+        Return the cache counters.
+
+        :return: A dictionary with memory hits, disk hits, misses and cached entry counts.
+        """
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "disk_bytes": self.disk_bytes,
+        }
@@ -1,4 +1,7 @@
+from itertools import product
+from typing import Iterator
 from parser import Parser
+from formula import Formula
 
 class CNFConverter:
     @staticmethod
@@ -86,111 +89,142 @@ class CNFConverter:
 
     @staticmethod
     def apply_de_morgan(sentence: list[str]) -> list[str]:
-        """Apply De Morgan's laws to the sentence."""
-        if len(sentence) == 0:
-            return sentence
-        
-        if sentence[0] == "(" and Parser.find_end_parenthesis(sentence, 0) == len(sentence) - 1:
-            sentence = sentence[1:len(sentence)-1]
+        """Apply De Morgan's laws to the sentence, returning its negation with negations moved inwards."""
+        return CNFConverter.push_negations(sentence, True)
 
-        if len(sentence) == 1:
-            return ['~'] + sentence
-        
-        if sentence[0] == "~":
-            if len(sentence[1:len(sentence)]) == 1:
-                return sentence[1:len(sentence)]
-            elif sentence[1] == "(":
-                end_clause_index = Parser.find_end_parenthesis(sentence, 1)
-                if end_clause_index == len(sentence) - 1:
-                    return sentence[1:end_clause_index+1]
-                else:
-                    return sentence[1:end_clause_index+1] + CNFConverter.apply_de_morgan(sentence[end_clause_index+1:len(sentence)])
-                    
-        converted_clauses = []
-        start_clause_index = 0   
-
-        if "||" in sentence:
-            for i in range(len(sentence)):
-                if sentence[i] == "||":
-                    start_parenthesis_idx = Parser.find_start_parenthesis(sentence, i)
-                    if start_parenthesis_idx == -1:
-                        sub_clause = sentence[start_clause_index:i]
-                        converted_sub_clause = CNFConverter.apply_de_morgan(sub_clause)
-
-                        if len(converted_clauses) != 0:
-                            converted_clauses += ["&"]
-                        start_clause_index = i + 1
-
-                        converted_clauses += Parser.add_parentheses_if_needed(converted_sub_clause)
-                elif i == len(sentence) - 1 and start_clause_index != 0:
-                    sub_clause = sentence[start_clause_index:]
-                    converted_sub_clause = CNFConverter.apply_de_morgan(sub_clause)
-                    if len(converted_clauses) != 0:
-                        converted_clauses += ["&"]
-                    
-                    converted_clauses += Parser.add_parentheses_if_needed(converted_sub_clause)
-
-        if "&" in sentence:
-            start_clause_index = 0
-            for i in range(len(sentence)):
-                if sentence[i] == "&":
-                    start_parenthesis_idx = Parser.find_start_parenthesis(sentence, i)
-                    if start_parenthesis_idx == -1:
-                        sub_clause = sentence[start_clause_index:i]
-                        converted_sub_clause = CNFConverter.apply_de_morgan(sub_clause)
-
-                        if len(converted_clauses) != 0:
-                            converted_clauses += ["||"]
-                        start_clause_index = i + 1
-
-                        converted_clauses += Parser.add_parentheses_if_needed(converted_sub_clause)
-                elif i == len(sentence) - 1 and start_clause_index != 0:
-                    sub_clause = sentence[start_clause_index:]
-                    converted_sub_clause = CNFConverter.apply_de_morgan(sub_clause)
-                    if len(converted_clauses) != 0:
-                        converted_clauses += ["||"]
-                    
-                    converted_clauses += Parser.add_parentheses_if_needed(converted_sub_clause)
-
-        return converted_clauses
-        
     @staticmethod
     def move_negations_inwards(sentence: list[str]) -> list[str]:
         """Move negations inwards in the sentence."""
-        valid = False
-        while not valid:
-            valid = True
-
-            for i in range(len(sentence)):
-                if sentence[i] == '~': 
-                    if sentence[i+1] == '(':
-                        valid = False
-                        end_parenthesis = Parser.find_end_parenthesis(sentence, i + 1)
-                        converted_clause = CNFConverter.apply_de_morgan(sentence[i+1:end_parenthesis+1])
-
-                        if len(sentence[:i]) != 0 or end_parenthesis < len(sentence) - 1:
-                            converted_clause = Parser.add_parentheses_if_needed(converted_clause)
-
-                        sentence = sentence[:i] + converted_clause + sentence[end_parenthesis+1:]
-                        break
-
-                    elif sentence[i+1] == '~':
-                        valid = False
-                        if len(sentence[i+2:len(sentence)]) == 1:
-                            sentence = sentence[:i] + sentence[i+2]
-                        else:
-                            if sentence[i+2] == '(':
-                                end_parenthesis = Parser.find_end_parenthesis(sentence, i + 2)
-                                sub_clause = sentence[i+2:end_parenthesis+1]
-
-                                if len(sentence[:i]) != 0 or end_parenthesis < len(sentence) - 1:
-                                    sub_clause = Parser.add_parentheses_if_needed(sub_clause)
-                                    sentence = sentence[:i] + sub_clause + sentence[end_parenthesis+1:]
-                            else:
-                                sentence = sentence[:i] + [sentence[i+2]] + sentence[i+2:]
-                        break
-            
-        return sentence
+        return CNFConverter.push_negations(sentence, False)
+
+    @staticmethod
+    def push_negations(sentence: list[str], negate: bool) -> list[str]:
+        """
+        Push negations down to the literals in a single traversal.
+
+        Matching parentheses are computed once up front, so every token is
+        visited a constant number of times instead of rescanning the sentence
+        after each rewrite. A negated group is split on its top-level operators
+        (OR first, then AND) and each part is negated in turn. Converted
+        parts keep the parenthesization produced by apply_de_morgan.
+
+        The two emitters are generators that yield the sub-calls they need
+        and receive their results. A driver loop runs them on an explicit
+        stack, so the nesting depth is not limited by the recursion limit.
+
+        :param sentence: The list of tokens representing the sentence.
+        :param negate: Whether to return the negation of the sentence.
+        :return: The sentence with negations applied only to literals.
+        """
+        matches = Parser.match_parentheses(sentence)
+        # None marks a slot where an opening parenthesis may be needed once a part has been emitted
+        output = []
+
+        def operand_end(i: int) -> int:
+            while sentence[i] == '~':
+                i += 1
+            return matches[i] if sentence[i] == '(' else i
+
+        def wrap(start: int, wrapped: bool) -> None:
+            if len(output) - start - 1 > 2 and not wrapped:
+                output[start] = '('
+                output.append(')')
+
+        def emit_positive(start: int, end: int) -> Iterator:
+            # Returns whether the emitted tokens form a single parenthesised group
+            if sentence[start] == '(' and matches[start] == end:
+                output.append('(')
+                yield emit_positive(start + 1, end - 1)
+                output.append(')')
+                return True
+
+            wrapped = False
+            i = start
+            while i <= end:
+                if sentence[i] == '~' and sentence[i + 1] == '(':
+                    group_end = matches[i + 1]
+                    has_context = i != 0 or group_end != len(sentence) - 1
+                    slot = len(output)
+                    if has_context:
+                        output.append(None)
+                    wrapped = yield emit_negated(i + 1, group_end)
+                    if has_context:
+                        wrap(slot, wrapped)
+                        wrapped = wrapped or output[slot] == '('
+                    i = group_end + 1
+                elif sentence[i] == '~' and sentence[i + 1] == '~':
+                    # Double negation cancels out
+                    operand = operand_end(i + 2)
+                    wrapped = yield emit_positive(i + 2, operand)
+                    i = operand + 1
+                else:
+                    output.append(sentence[i])
+                    wrapped = False
+                    i += 1
+
+            return wrapped and operand_end(start) == end
+
+        def emit_negated(start: int, end: int) -> Iterator:
+            while sentence[start] == '(' and matches[start] == end:
+                start += 1
+                end -= 1
+
+            if start == end:
+                output.extend(['~', sentence[start]])
+                return False
+
+            if sentence[start] == '~' and operand_end(start + 1) == end:
+                return (yield emit_positive(start + 1, end))
+
+            or_positions = []
+            and_positions = []
+            i = start
+            while i <= end:
+                if sentence[i] == '(':
+                    i = matches[i]
+                elif sentence[i] == '||':
+                    or_positions.append(i)
+                elif sentence[i] == '&':
+                    and_positions.append(i)
+                i += 1
+
+            if not or_positions and not and_positions:
+                # Nothing to split on, keep the negation in front of the group
+                output.extend(['~', '('])
+                yield emit_positive(start, end)
+                output.append(')')
+                return True
+
+            # De Morgan: a negated OR becomes an AND of negated parts and vice versa
+            positions, joiner = (or_positions, '&') if or_positions else (and_positions, '||')
+            part_start = start
+            for position in positions + [end + 1]:
+                if part_start != start:
+                    output.append(joiner)
+                slot = len(output)
+                output.append(None)
+                wrap(slot, (yield emit_negated(part_start, position - 1)))
+                part_start = position + 1
+
+            return False
+
+        if len(sentence) == 0:
+            return sentence
+
+        # Run the emitters, resuming each generator with the result of the sub-call it yielded
+        stack = [emit_negated(0, len(sentence) - 1) if negate else emit_positive(0, len(sentence) - 1)]
+        result = None
+        while stack:
+            try:
+                call = stack[-1].send(result)
+            except StopIteration as returned:
+                stack.pop()
+                result = returned.value
+            else:
+                stack.append(call)
+                result = None
+
+        return [token for token in output if token is not None]
 
     @staticmethod
     def distribute_or_over_and(sentence: list[str]) -> list[str]:
@@ -278,4 +312,224 @@ class CNFConverter:
         sentence = CNFConverter.move_negations_inwards(sentence)  # Move negations inwards
         sentence = CNFConverter.distribute_or_over_and(sentence)  # Distribute OR over AND
         
-        return sentence
\ No newline at end of file
+        return sentence
+
+    @staticmethod
+    def to_negation_normal_form(formula: Formula) -> Formula:
+        """
+        Rewrite a formula into negation normal form.
+
+        Biconditionals and implications are eliminated and negations are pushed
+        down to the symbols. Each shared subtree is rewritten once per polarity.
+
+        :param formula: The formula to rewrite.
+        :return: An equivalent formula built only from literals, AND and OR.
+        """
+        rewritten = {}
+
+        def operands_of(node: Formula, negated: bool) -> list[tuple[Formula, bool]]:
+            # The (node, polarity) pairs the rewrite of a node is built from
+            if node.op == Formula.NOT:
+                return [(node.args[0], not negated)]
+            if node.op == Formula.IMPLIES:
+                premise, conclusion = node.args
+                return [(premise, not negated), (conclusion, negated)]
+            if node.op == Formula.IFF:
+                return [(operand, polarity) for operand in node.args for polarity in (True, False)]
+            return [(operand, negated) for operand in node.args]
+
+        # Post-order walk on an explicit stack, so deeply nested sentences do not hit the recursion limit
+        stack = [(formula, False)]
+        while stack:
+            key = stack[-1]
+            if key in rewritten:
+                stack.pop()
+                continue
+            node, negated = key
+            if node.op != Formula.SYMBOL:
+                missing = [operand for operand in operands_of(node, negated) if operand not in rewritten]
+                if missing:
+                    stack.extend(reversed(missing))
+                    continue
+            stack.pop()
+
+            if node.op == Formula.SYMBOL:
+                result = Formula.negate(node) if negated else node
+            elif node.op == Formula.NOT:
+                result = rewritten[(node.args[0], not negated)]
+            elif node.op == Formula.AND or node.op == Formula.OR:
+                operands = [rewritten[(operand, negated)] for operand in node.args]
+                # De Morgan: a negated AND becomes an OR and vice versa
+                if (node.op == Formula.AND) != negated:
+                    result = Formula.conjoin(operands)
+                else:
+                    result = Formula.disjoin(operands)
+            elif node.op == Formula.IMPLIES:
+                # a => b becomes ~a || b, and ~(a => b) becomes a & ~b
+                premise, conclusion = node.args
+                if negated:
+                    result = Formula.conjoin([rewritten[(premise, False)], rewritten[(conclusion, True)]])
+                else:
+                    result = Formula.disjoin([rewritten[(premise, True)], rewritten[(conclusion, False)]])
+            else:
+                # a <=> b becomes (~a || b) & (~b || a), and ~(a <=> b) becomes (a || b) & (~a || ~b)
+                left, right = node.args
+                if negated:
+                    result = Formula.conjoin([
+                        Formula.disjoin([rewritten[(left, False)], rewritten[(right, False)]]),
+                        Formula.disjoin([rewritten[(left, True)], rewritten[(right, True)]]),
+                    ])
+                else:
+                    result = Formula.conjoin([
+                        Formula.disjoin([rewritten[(left, True)], rewritten[(right, False)]]),
+                        Formula.disjoin([rewritten[(right, True)], rewritten[(left, False)]]),
+                    ])
+
+            rewritten[key] = result
+
+        return rewritten[(formula, False)]
+
+    @staticmethod
+    def convert_formula(formula: Formula) -> list[list[tuple[str, bool]]]:
+        """
+        Convert a formula to CNF clauses.
+
+        :param formula: The formula to convert.
+        :return: A list of clauses, each a list of (symbol, is_negated) literals.
+        """
+        converted = {}
+        formula = CNFConverter.to_negation_normal_form(formula)
+        for node in formula.postorder():
+            if node.op == Formula.SYMBOL:
+                converted[node] = [[(node.name, False)]]
+            elif node.op == Formula.NOT:
+                converted[node] = [[(node.args[0].name, True)]]
+            elif node.op == Formula.AND:
+                converted[node] = [clause for operand in node.args for clause in converted[operand]]
+            else:
+                # Distribute OR over AND: one clause per choice of a clause from each operand
+                converted[node] = [
+                    [literal for clause in combination for literal in clause]
+                    for combination in product(*(converted[operand] for operand in node.args))
+                ]
+
+        return [list(clause) for clause in converted[formula]]
+
+
+
+class TseitinEncoder:
+    """
+    Definitional (Tseitin) CNF encoder.
+
+    Every compound subformula of the negation normal form is named by a fresh
+    auxiliary symbol, so the clause count grows linearly with the formula instead
+    of exponentially. Auxiliary names start with an underscore, which the
+    tokenizer never produces, so they cannot clash with symbols of the KB.
+
+    With plaisted_greenbaum set, only the implication from each auxiliary symbol
+    to its subformula is emitted. The result is then only equisatisfiable, which
+    is enough for refutation-based engines but not for counting models.
+    """
+    def __init__(self, prefix: str = "_t", plaisted_greenbaum: bool = False):
+        """
+        Initialize the encoder.
+
+        :param prefix: The prefix used for auxiliary symbol names.
+        :param plaisted_greenbaum: Whether to emit only one direction of each definition.
+        """
+        self.prefix = prefix
+        self.plaisted_greenbaum = plaisted_greenbaum
+        # Definitions stored as { auxiliary: (operation, [literals]) }, children before parents
+        self.definitions: dict[str, tuple[str, list[tuple[str, bool]]]] = {}
+        self.names: dict[Formula, str] = {}
+
+    def encode(self, formula: Formula) -> list[list[tuple[str, bool]]]:
+        """
+        Encode a formula into definitional CNF clauses.
+
+        Auxiliary symbols are shared with earlier calls on the same encoder,
+        so identical subformulas across sentences are defined only once.
+
+        :param formula: The formula to encode.
+        :return: A list of clauses, each a list of (symbol, is_negated) literals.
+        """
+        clauses = []
+        formula = CNFConverter.to_negation_normal_form(formula)
+        conjuncts = formula.args if formula.op == Formula.AND else (formula,)
+
+        for conjunct in conjuncts:
+            if conjunct.op == Formula.OR:
+                clauses.append([self.literal_of(operand, clauses) for operand in conjunct.args])
+            else:
+                clauses.append([self.literal_of(conjunct, clauses)])
+
+        return clauses
+
+    def literal_of(self, node: Formula, clauses: list[list[tuple[str, bool]]]) -> tuple[str, bool]:
+        """
+        Return the literal standing for a node in negation normal form.
+
+        Definition clauses for newly named subformulas are appended to clauses.
+
+        :param node: The node to name.
+        :param clauses: The clause list receiving new definition clauses.
+        :return: The (symbol, is_negated) literal equivalent to the node.
+        """
+        # Operands are named before the nodes using them, walking an explicit stack instead of recursing
+        stack = [(node, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if current.op == Formula.SYMBOL or current.op == Formula.NOT or current in self.names:
+                continue
+            if not expanded:
+                stack.append((current, True))
+                stack.extend((operand, False) for operand in reversed(current.args))
+                continue
+            self.define(current, clauses)
+
+        if node.op == Formula.SYMBOL:
+            return (node.name, False)
+        if node.op == Formula.NOT:
+            return (node.args[0].name, True)
+        return (self.names[node], False)
+
+    def define(self, node: Formula, clauses: list[list[tuple[str, bool]]]) -> None:
+        """
+        Name a compound node whose operands are all literals or already named.
+
+        :param node: The AND or OR node to name.
+        :param clauses: The clause list receiving its definition clauses.
+        """
+        literals = [
+            (operand.name, False) if operand.op == Formula.SYMBOL else
+            (operand.args[0].name, True) if operand.op == Formula.NOT else
+            (self.names[operand], False)
+            for operand in node.args
+        ]
+        auxiliary = f"{self.prefix}{len(self.names) + 1}"
+        self.names[node] = auxiliary
+        self.definitions[auxiliary] = (node.op, literals)
+        clauses.extend(self.definition_clauses(auxiliary))
+
+    def definition_clauses(self, auxiliary: str) -> list[list[tuple[str, bool]]]:
+        """
+        Return the clauses defining an auxiliary symbol named by this encoder.
+
+        :param auxiliary: The auxiliary symbol.
+        :return: A list of clauses, each a list of (symbol, is_negated) literals.
+        """
+        operation, literals = self.definitions[auxiliary]
+        clauses = []
+        if operation == Formula.AND:
+            # x => (l1 & ... & ln), and (l1 & ... & ln) => x
+            for literal in literals:
+                clauses.append([(auxiliary, True), literal])
+            if not self.plaisted_greenbaum:
+                clauses.append([(auxiliary, False)] + [(name, not negated) for name, negated in literals])
+        else:
+            # x => (l1 || ... || ln), and (l1 || ... || ln) => x
+            clauses.append([(auxiliary, True)] + literals)
+            if not self.plaisted_greenbaum:
+                for name, negated in literals:
+                    clauses.append([(auxiliary, False), (name, not negated)])
+        return clauses
@@ -1,87 +1,39 @@
-from itertools import groupby
-from typing import List, Tuple
-from parser import Parser
-from converter import CNFConverter
+from typing import List, Tuple, Union
+from cnfCache import CNFCache
+from simplifier import ClauseSimplifier
+from knowledgeBase import KnowledgeBase
 
 class DPLL:
-    def __init__(self, filename: str):
+    def __init__(self, filename: Union[str, KnowledgeBase], cnf_mode: str = "standard", cache: CNFCache = None,
+                 workers: int = 1, simplify: bool = False):
         """
-        Initialize the TruthTable with literals, knowledge base, and query.
+        Initialize the DPLL with literals and the knowledge base joined with the negated query.
 
-        :param filename: The file containing the knowledge base and query.
+        :param filename: The file containing the knowledge base and query, or an already compiled KnowledgeBase.
+        :param cnf_mode: "standard" for distributive CNF, "tseitin" for definitional CNF.
+        :param cache: The cache reused for standard CNF conversions, or None for a private one.
+        :param workers: The number of processes converting TELL sentences to standard CNF.
+        :param simplify: Whether to clean up the knowledge base clauses with ClauseSimplifier first.
         """
-        self.literals = set()
-        self.kb = []
+        if isinstance(filename, KnowledgeBase):
+            self.knowledge_base = filename
+        else:
+            # Refutation only needs equisatisfiable clauses, so one-sided definitions suffice
+            self.knowledge_base = KnowledgeBase.from_file(filename, cnf_mode=cnf_mode, cache=cache, plaisted_greenbaum=True,
+                                                          workers=workers)
+
+        self.literals = self.knowledge_base.original_symbols()
+        # The shared knowledge base is left untouched, only this engine sees the simplified clauses
+        clauses = self.knowledge_base.clauses
+        self.simplification = None
+        if simplify:
+            simplifier = ClauseSimplifier()
+            clauses = simplifier.simplify(clauses)
+            self.simplification = simplifier.stats
+        self.kb = clauses.to_lists() + self.knowledge_base.negated_query.to_lists()
         self.assignments = {}
-        self.parse(filename)
-
-    def parse(self, filename: str) -> None:
-        """
-        Parse the file to extract literals, knowledge base, and query.
-
-        :param filename: The file containing the knowledge base and query.
-        :return: None
-        """
-        with open(filename, 'r') as f:
-            file_content = f.readlines()
-            kb_sentences = file_content[1]
-            query_sentence = file_content[3]
-            self.extract_knowledge_base(kb_sentences)
-            self.extract_query(query_sentence)
-
-    def extract_expression(self, expressions: str) -> List[str]:
-        """
-        Extract all expressions inside the whole expressions.
-
-        :param expressions: The string containing multiple expressions.
-        :return: A list of individual expressions.
-        """
-        expressions = expressions.split(";")
-        expressions = [item.strip() for item in expressions if item.strip()]
-        return expressions
-
-    def extract_knowledge_base(self, knowledge_base: str) -> None:
-        """
-        Extract and process the knowledge base from the given string.
-
-        :param knowledge_base: The string containing the knowledge base.
-        :return: None
-        """
-        knowledge_base = self.extract_expression(knowledge_base)
-
-        for expression in knowledge_base:
-            # Turn expression into a list of strings
-            expression = Parser.find_all_words(expression)
-            expression = CNFConverter.convert_sentence(expression)
-            [self.literals.add(item) for item in Parser.extract_literals(expression)]
-            expression = [list(group) for key, group in groupby(expression, lambda x: x == '&') if not key]
 
-            for clause in expression:
-                self.kb.append(Parser.extract_literals_with_signed(clause))
-
-    def extract_query(self, query: str) -> None:
-        """
-        Extract and process the query from the given string.
-
-        :param query: The string containing the query.
-        :return: None
-        """
-        # Extract query
-        query = self.extract_expression(query)[0]
-        query = Parser.find_all_words(query)
-        query = CNFConverter.convert_sentence(query)
-        query = Parser.add_parentheses_if_needed(query)
-        query = CNFConverter.move_negations_inwards(["~"] + query)
-        query = CNFConverter.convert_sentence(query)
-
-        # Convert each single query into a group of AND clauses
-        query = [list(group) for key, group in groupby(query, lambda x: x == '&') if not key]
-
-        # Store converted expression into total knowledge base
-        for clause in query:
-            self.kb.append(Parser.extract_literals_with_signed(clause))
-
-    def perform_unit_propagation(self, kb: List[List[Tuple[str, bool]]]) -> Tuple[List[List[Tuple[str, bool]]], str]:
+    def perform_unit_propagation(self, kb: List[List[int]]) -> Tuple[List[List[int]], str]:
         """
         Perform unit propagation on the knowledge base.
 
@@ -98,14 +50,14 @@ class DPLL:
             if unit_clause_idx == -1:
                 return kb, "UNDETERMINED"
 
-            unit_clause_literal, unit_clause_sign = kb.pop(unit_clause_idx)[0]
-            self.assignments[unit_clause_literal] = unit_clause_sign
+            unit_clause_literal = kb.pop(unit_clause_idx)[0]
+            self.assignments[abs(unit_clause_literal)] = unit_clause_literal > 0
 
             # Remove all clauses satisfied by the literal
-            kb = [clause for clause in kb if (unit_clause_literal, unit_clause_sign) not in clause]
+            kb = [clause for clause in kb if unit_clause_literal not in clause]
 
             # Remove the negated literal (~literal) from other clauses
-            negated_literal = (unit_clause_literal, not unit_clause_sign)
+            negated_literal = -unit_clause_literal
 
             for clause in kb:
                 if negated_literal in clause:
@@ -119,11 +71,11 @@ class DPLL:
             elif len(kb) == 0:
                 return kb, "SAT"
 
-    def is_pure_literal(self, literal: Tuple[str, bool], kb: List[List[Tuple[str, bool]]]) -> bool:
+    def is_pure_literal(self, literal: int, kb: List[List[int]]) -> bool:
         """
         Check if a literal is pure (only appears in one polarity in KB).
 
-        :param literal: The literal to check.
+        :param literal: The symbol id to check.
         :param kb: The knowledge base.
         :return: True if the literal is pure, False otherwise.
         """
@@ -131,32 +83,32 @@ class DPLL:
 
         for clause in kb:
             for clause_literal in clause:
-                if literal[0] == clause_literal[0]:
+                if literal == abs(clause_literal):
                     if literal_status is None:
-                        literal_status = clause_literal[1]
+                        literal_status = clause_literal
                     else:
-                        if literal_status != clause_literal[1]:
+                        if literal_status != clause_literal:
                             return False
 
         return True
 
-    def perform_pure_literal_elimination(self, kb: List[List[Tuple[str, bool]]]) -> List[List[Tuple[str, bool]]]:
+    def perform_pure_literal_elimination(self, kb: List[List[int]]) -> List[List[int]]:
         """
         Perform pure literal elimination on the knowledge base.
 
         :param kb: The knowledge base to process.
         :return: Updated knowledge base.
         """
-        all_literals = {literal for clause in kb for literal, _ in clause}
-        pure_literals = {literal for literal in all_literals if self.is_pure_literal((literal, True), kb)}
+        all_literals = {abs(literal) for clause in kb for literal in clause}
+        pure_literals = {literal for literal in all_literals if self.is_pure_literal(literal, kb)}
 
         for literal in pure_literals:
             self.assignments[literal] = True
-            kb = [clause for clause in kb if (literal, True) not in clause]
+            kb = [clause for clause in kb if -literal not in clause]
 
         return kb
 
-    def perform_branching(self, kb: List[List[Tuple[str, bool]]]) -> Tuple[List[List[Tuple[str, bool]]], bool]:
+    def perform_branching(self, kb: List[List[int]]) -> Tuple[List[List[int]], bool]:
         """
         Perform branching on the knowledge base as the last step of the DPLL algorithm.
 
@@ -170,14 +122,14 @@ class DPLL:
             return kb, False
 
         # Pick a literal for branching (choose the first literal in the first clause)
-        chosen_literal = kb[0][0][0]
+        chosen_literal = abs(kb[0][0])
 
         # Assume the literal is True
         new_kb = [clause.copy() for clause in kb]
-        new_kb = [clause for clause in new_kb if (chosen_literal, False) not in clause]
+        new_kb = [clause for clause in new_kb if chosen_literal not in clause]
         for clause in new_kb:
-            if (chosen_literal, True) in clause:
-                clause.remove((chosen_literal, True))
+            if -chosen_literal in clause:
+                clause.remove(-chosen_literal)
 
         result_kb, result_status = self.perform_branching(new_kb)
         if result_status:
@@ -186,10 +138,10 @@ class DPLL:
 
         # Assume the literal is False
         new_kb = [clause.copy() for clause in kb]
-        new_kb = [clause for clause in new_kb if (chosen_literal, True) not in clause]
+        new_kb = [clause for clause in new_kb if -chosen_literal not in clause]
         for clause in new_kb:
-            if (chosen_literal, False) in clause:
-                clause.remove((chosen_literal, False))
+            if chosen_literal in clause:
+                clause.remove(chosen_literal)
 
         result_kb, result_status = self.perform_branching(new_kb)
         if result_status:
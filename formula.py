@@ -0,0 +1,322 @@
+import weakref
+from typing import Iterator
+from lexer import Lexer, SymbolTable, TokenStream
+
+class Formula:
+    """
+    Immutable node of a propositional formula.
+
+    Nodes are hash-consed: constructing a node that is structurally identical
+    to a live one returns the existing instance. Identical subtrees are therefore
+    shared, and equality and hashing fall back to object identity.
+    """
+    SYMBOL = "symbol"
+    NOT = "~"
+    AND = "&"
+    OR = "||"
+    IMPLIES = "=>"
+    IFF = "<=>"
+
+    __slots__ = ("op", "args", "name", "__weakref__")
+    _table = weakref.WeakValueDictionary()
+
+    def __new__(cls, op: str, args: tuple = (), name: str = None) -> "Formula":
+        key = (op, name, args)
+        node = cls._table.get(key)
+        if node is None:
+            node = super().__new__(cls)
+            object.__setattr__(node, "op", op)
+            object.__setattr__(node, "args", args)
+            object.__setattr__(node, "name", name)
+            cls._table[key] = node
+        return node
+
+    def __setattr__(self, attribute, value):
+        raise AttributeError("Formula nodes are immutable")
+
+    def __reduce__(self):
+        # Pickled nodes are re-interned when loaded in another process
+        return (Formula, (self.op, self.args, self.name))
+
+    @staticmethod
+    def symbol(name: str) -> "Formula":
+        """Return the node for the symbol with the given name."""
+        return Formula(Formula.SYMBOL, (), name)
+
+    @staticmethod
+    def negate(operand: "Formula") -> "Formula":
+        """Return the negation of the operand."""
+        return Formula(Formula.NOT, (operand,))
+
+    @staticmethod
+    def conjoin(operands: list["Formula"]) -> "Formula":
+        """Return the conjunction of the operands, flattening nested conjunctions."""
+        return Formula._associative(Formula.AND, operands)
+
+    @staticmethod
+    def disjoin(operands: list["Formula"]) -> "Formula":
+        """Return the disjunction of the operands, flattening nested disjunctions."""
+        return Formula._associative(Formula.OR, operands)
+
+    @staticmethod
+    def implies(premise: "Formula", conclusion: "Formula") -> "Formula":
+        """Return the implication premise => conclusion."""
+        return Formula(Formula.IMPLIES, (premise, conclusion))
+
+    @staticmethod
+    def iff(left: "Formula", right: "Formula") -> "Formula":
+        """Return the biconditional left <=> right."""
+        return Formula(Formula.IFF, (left, right))
+
+    @staticmethod
+    def _associative(op: str, operands: list["Formula"]) -> "Formula":
+        flattened = []
+        for operand in operands:
+            if operand.op == op:
+                flattened.extend(operand.args)
+            else:
+                flattened.append(operand)
+
+        if len(flattened) == 1:
+            return flattened[0]
+        return Formula(op, tuple(flattened))
+
+    def is_literal(self) -> bool:
+        """Check if the node is a symbol or a negated symbol."""
+        return self.op == Formula.SYMBOL or (self.op == Formula.NOT and self.args[0].op == Formula.SYMBOL)
+
+    def symbols(self) -> list[str]:
+        """
+        Collect the symbol names of the formula.
+
+        :return: The symbol names in order of first occurrence.
+        """
+        names = {}
+        visited = set()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node in visited:
+                continue
+            visited.add(node)
+
+            if node.op == Formula.SYMBOL:
+                names.setdefault(node.name, None)
+            else:
+                stack.extend(reversed(node.args))
+        return list(names)
+
+    def postorder(self) -> Iterator["Formula"]:
+        """
+        Walk the formula without recursion.
+
+        :yield: Every distinct node once, after its operands, operands from left to right.
+        """
+        visited = set()
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                yield node
+            elif node not in visited:
+                visited.add(node)
+                stack.append((node, True))
+                stack.extend((operand, False) for operand in reversed(node.args) if operand not in visited)
+
+    def __str__(self) -> str:
+        texts = {}
+        for node in self.postorder():
+            if node.op == Formula.SYMBOL:
+                texts[node] = node.name
+                continue
+
+            parts = []
+            for operand in node.args:
+                text = texts[operand]
+                if operand.op not in (Formula.SYMBOL, Formula.NOT):
+                    text = f"({text})"
+                parts.append(text)
+            texts[node] = "~" + parts[0] if node.op == Formula.NOT else f" {node.op} ".join(parts)
+        return texts[self]
+
+    def __repr__(self) -> str:
+        return f"Formula({str(self)!r})"
+
+
+class FormulaParser:
+    """
+    Precedence-climbing parser that turns sentences into Formula trees.
+
+    The parser reads the integer token kinds of a TokenStream produced by
+    Lexer, so operators are recognised by integer comparison. Sentences in a
+    stream are separated by ";" tokens.
+
+    Operators from loosest to tightest binding: <=>, =>, ||, &, ~.
+    Biconditionals and implications associate to the right, matching the
+    order in which CNFConverter splits them.
+    """
+    BINARY_OPERATORS = {
+        Lexer.IFF: (1, True),
+        Lexer.IMPLIES: (2, True),
+        Lexer.OR: (3, False),
+        Lexer.AND: (4, False),
+    }
+    # Kind returned by peek at the end of the stream
+    END = -1
+
+    def __init__(self, stream: TokenStream, symbols: SymbolTable):
+        """
+        Initialize the parser over a token stream.
+
+        :param stream: The tokens to parse, as produced by Lexer.tokenize.
+        :param symbols: The symbol table the stream was interned into.
+        """
+        self.stream = stream
+        self.symbols = symbols
+        self.kinds = stream.kinds
+        self.position = 0
+        # Symbol nodes by symbol id, so repeated symbols skip the interning table
+        self.symbol_nodes: dict[int, Formula] = {}
+
+    @staticmethod
+    def parse(sentence: str | list[str]) -> Formula:
+        """
+        Parse a single sentence into a Formula.
+
+        :param sentence: The sentence as a string or as a list of tokens.
+        :return: The root node of the parsed formula.
+        """
+        if not isinstance(sentence, str):
+            sentence = " ".join(sentence)
+
+        symbols = SymbolTable()
+        parser = FormulaParser(Lexer(symbols).tokenize(sentence), symbols)
+        formula = parser.parse_expression()
+        if parser.position != len(parser.kinds):
+            raise ValueError(f"Unexpected token {parser.describe()} in sentence: {sentence}")
+        return formula
+
+    @staticmethod
+    def parse_stream(stream: TokenStream, symbols: SymbolTable) -> Iterator[Formula]:
+        """
+        Parse the ";"-separated sentences of a token stream.
+
+        :param stream: The tokens to parse, as produced by Lexer.tokenize.
+        :param symbols: The symbol table the stream was interned into.
+        :yield: The formula of each non-empty sentence, in order.
+        """
+        parser = FormulaParser(stream, symbols)
+        while True:
+            kind = parser.peek()
+            if kind == Lexer.SEPARATOR:
+                parser.position += 1
+                continue
+            if kind == FormulaParser.END:
+                return
+
+            yield parser.parse_expression()
+            if parser.peek() not in (Lexer.SEPARATOR, FormulaParser.END):
+                raise ValueError(f"Unexpected token {parser.describe()}")
+
+    def peek(self) -> int:
+        """Return the kind of the current token without consuming it, or END at the end."""
+        if self.position < len(self.kinds):
+            return self.kinds[self.position]
+        return FormulaParser.END
+
+    def describe(self) -> str:
+        """Describe the current token for error messages."""
+        return Lexer.describe(self.stream, self.position, self.symbols)
+
+    def parse_expression(self) -> Formula:
+        """
+        Parse one expression, stopping at the first token that cannot continue it.
+
+        This is precedence climbing driven by explicit stacks instead of
+        recursion, so the nesting depth of a sentence is not limited by the
+        interpreter's recursion limit. Pending negations and opening
+        parentheses sit on the operator stack with the binary operators; a
+        binary operator first applies every stacked operator binding more
+        tightly. The operands of an & or || chain are collected in a list and
+        joined into one node when the chain ends, so a chain of n operands is
+        built in O(n) rather than by copying a growing node n times.
+
+        :return: The parsed formula.
+        """
+        # Left operands of the stacked operators, as a list of operands for & and || chains
+        operands: list[Formula | list[Formula]] = []
+        operators: list[int] = []
+        open_parentheses = 0
+
+        while True:
+            # Expect an operand, possibly behind negations and opening parentheses
+            kind = self.peek()
+            if kind == Lexer.NOT or kind == Lexer.LEFT_PARENTHESIS:
+                self.position += 1
+                operators.append(kind)
+                open_parentheses += kind == Lexer.LEFT_PARENTHESIS
+                continue
+            if kind == FormulaParser.END or kind == Lexer.SEPARATOR:
+                if self.position < len(self.kinds):
+                    raise ValueError(f"Unexpected end of sentence at offset {self.stream.offsets[self.position]}")
+                raise ValueError("Unexpected end of sentence")
+            if kind != Lexer.SYMBOL:
+                raise ValueError(f"Unexpected token {self.describe()}")
+            self.position += 1
+            symbol_id = self.stream.symbols[self.position - 1]
+            operand = self.symbol_nodes.get(symbol_id)
+            if operand is None:
+                operand = self.symbol_nodes[symbol_id] = Formula.symbol(self.symbols.name(symbol_id))
+
+            while True:
+                # Negations bind tightest: they apply as soon as their operand is complete
+                while operators and operators[-1] == Lexer.NOT:
+                    operators.pop()
+                    operand = Formula.negate(operand)
+
+                operator = self.peek()
+                if operator in FormulaParser.BINARY_OPERATORS:
+                    precedence, right_associative = FormulaParser.BINARY_OPERATORS[operator]
+                    while operators and operators[-1] in FormulaParser.BINARY_OPERATORS:
+                        if FormulaParser.BINARY_OPERATORS[operators[-1]][0] <= precedence:
+                            break
+                        operand = FormulaParser.combine(operators.pop(), operands.pop(), operand)
+                    self.position += 1
+                    if operators and operators[-1] == operator and not right_associative:
+                        # The operand continues the chain of the stacked & or ||
+                        operands[-1].append(operand)
+                    else:
+                        operators.append(operator)
+                        operands.append(operand if right_associative else [operand])
+                    break
+
+                # The expression in the innermost parentheses, or the whole expression, is complete
+                while operators and operators[-1] in FormulaParser.BINARY_OPERATORS:
+                    operand = FormulaParser.combine(operators.pop(), operands.pop(), operand)
+                if not open_parentheses:
+                    return operand
+                if operator != Lexer.RIGHT_PARENTHESIS:
+                    if operator == FormulaParser.END:
+                        raise ValueError("Missing closing parenthesis at end of sentence")
+                    raise ValueError(f"Missing closing parenthesis before {self.describe()}")
+                self.position += 1
+                operators.pop()
+                open_parentheses -= 1
+
+    @staticmethod
+    def combine(operator: int, left: Formula | list[Formula], right: Formula) -> Formula:
+        """
+        Return the node joining operands with a binary operator token kind.
+
+        :param operator: The token kind of the operator.
+        :param left: The left operand, or the operands collected so far for & and ||.
+        :param right: The last operand.
+        :return: The joined formula.
+        """
+        if operator == Lexer.AND:
+            return Formula.conjoin(left + [right])
+        if operator == Lexer.OR:
+            return Formula.disjoin(left + [right])
+        if operator == Lexer.IMPLIES:
+            return Formula.implies(left, right)
+        return Formula.iff(left, right)
@@ -1,98 +1,406 @@
-import re
+import heapq
+import json
+from array import array
 from collections import deque
-from typing import Dict, List, Tuple, Optional
-from parser import Parser  
+from typing import Dict, List, Optional, Set, Union
+from knowledgeBase import KnowledgeBase
 
 class ForwardChaining:
-    def __init__(self, filename: str):
+    def __init__(self, filename: Union[str, KnowledgeBase], relevance: bool = False):
         """
         Initialize the ForwardChaining object with the given filename.
 
         Args:
-            filename (str): The name of the file containing the knowledge base and query.
+            filename (str | KnowledgeBase): The name of the file containing the knowledge base and query,
+                or a KnowledgeBase compiled with rules.
+            relevance (bool): Whether to chain only over the rules the queries depend on.
         """
-        # Rules stored as { conclusion: [([premises], is_negated)] }
-        self.rules: Dict[str, List[Tuple[List[Tuple[str, bool]], bool]]] = {}
-        # Facts stored with negation flag
-        self.facts: Dict[str, bool] = {}
-        self.query: Optional[Tuple[str, bool]] = None
-        self.derived_facts = set()  # Set of facts derived during execution
-        self.entailments = []  # List of derived symbols
-        self.parse_kb_and_query(filename)
+        if isinstance(filename, KnowledgeBase):
+            self.knowledge_base = filename
+        else:
+            self.knowledge_base = KnowledgeBase.from_file(filename, clauses=False, rules=True)
 
-    def parse_kb_and_query(self, filename: str) -> None:
+        # Check if the input is in Horn form
+        if not self.knowledge_base.horn:
+            print("The input knowledge base is not in Horn form.")
+            exit(1)
+
+        self.symbols = self.knowledge_base.symbols
+        # Rules stored as premises followed by the conclusion, indexed by conclusion
+        self.rules = self.knowledge_base.rules
+        self.rule_index = self.knowledge_base.rule_index
+        # Relevance slicing counters, None when chaining over the whole rule base
+        self.slicing: Optional[Dict[str, int]] = None
+        # Symbols the kept rules may depend on, None when chaining over the whole rule base
+        self.cone: Optional[Set[int]] = None
+        if relevance:
+            self.goals = {abs(literal) for _, literal in self.knowledge_base.queries if literal is not None}
+            self.slice()
+        self.query: Optional[int] = self.knowledge_base.query_literal
+        self.restart()
+
+    def slice(self) -> None:
+        """
+        Slice the rules of the knowledge base down to the dependency cone of the goals.
         """
-        Parse the input file to get the knowledge base (KB) and query.
+        self.rules, self.rule_index, self.slicing = self.knowledge_base.relevant_rules(self.goals)
+        self.cone = set(self.goals)
+        for rule in self.rules:
+            self.cone.update(abs(premise) for premise in rule[:-1])
+
+    def widen(self, symbol: int) -> None:
+        """
+        Make a symbol a goal of the relevance slice and restart the derivation over the new slice.
 
         Args:
-            filename (str): The name of the file containing the knowledge base and query.
+            symbol (int): The symbol id, outside the cone.
         """
-        with open(filename, 'r') as file:
-            content = file.read()
+        self.goals.add(symbol)
+        self.slice()
+        self.restart()
 
-        # Separate TELL and ASK parts
-        tell_part = re.search(r'TELL\s+([\s\S]*?)\s+ASK', content).group(1).strip()[:-1]
-        ask_part = re.search(r'ASK\s+(.*)', content).group(1).strip()
+    def restart(self) -> None:
+        """
+        Reset the derivation to the told facts, as a new ForwardChaining on the knowledge base would start.
+        """
+        # Facts stored with their truth value
+        self.facts: Dict[int, bool] = dict(self.knowledge_base.facts)
+        # Derived symbols in the order they were popped, as dict keys so that retraction removes them cheaply
+        self.entailments: Dict[int, None] = {}
 
-        # Check if the input is in Horn form
-        if not Parser.is_horn_form(tell_part):
-            print("The input knowledge base is not in Horn form.")
-            exit(1)
-        # Parse conditions in TELL
-        clauses = tell_part.split(";")
-        for clause in clauses:
-            clause = clause.strip()
-            if "||" in clause:
-                # Convert disjunction to implication
-                clause = Parser.disjunction_to_implication(clause)
-            if "=>" in clause:
-                # Parse left-hand side and right-hand side
-                premises, conclusion = clause.split("=>")
-                premises = [
-                    (p.strip().lstrip("~"), p.strip().startswith("~")) for p in premises.split("&")
-                ]
-                conclusion = conclusion.strip().lstrip("~")
-                is_negated_conclusion = clause.strip().startswith("~")
-                
-                # Add to self.rules
-                if conclusion not in self.rules:
-                    self.rules[conclusion] = []
-                self.rules[conclusion].append((premises, is_negated_conclusion))
+        # Initialize known facts
+        self.agenda = deque([fact for fact, is_true in self.facts.items() if is_true])
+        self.derived_facts = set(self.agenda)  # Set of facts derived during execution
+        self.build_premise_index()
+        # Positions of the rules ready for the next scan
+        self.next_scan = [position for position in range(len(self.order))
+                          if self.unsatisfied[position] == 0 and not self.blocked[position]]
+        # Whether the last popped fact stopped a run before its scan
+        self.scan_pending = False
+
+    def build_premise_index(self) -> None:
+        """
+        Index the rules by their premises and count the premises each rule still waits for.
+
+        Rules are numbered by their position in the scan order of rule_index, which
+        is the order in which they fire when several hold at once.
+        """
+        # Scan order stored as [position] -> rule number
+        self.order: List[int] = []
+        # Premise index stored as { symbol id: [positions of rules with the symbol as a premise] }, one entry per occurrence
+        self.positive_premises: Dict[int, List[int]] = {}
+        self.negative_premises: Dict[int, List[int]] = {}
+        # Conclusion index stored as { symbol id: [positions of rules concluding it] }
+        self.conclusion_rules: Dict[int, List[int]] = {}
+        # Number of positive premises not derived yet, by position
+        self.unsatisfied = array('i')
+        # Number of negated premises derived, by position; a rule only fires while it is zero
+        self.blocked = array('i')
+
+        for rule_numbers in self.rule_index.values():
+            for rule_number in rule_numbers:
+                self.index_rule(rule_number)
+
+    def index_rule(self, rule_number: int) -> int:
+        """
+        Append a rule to the scan order and index its premises.
+
+        Args:
+            rule_number (int): The number of the rule in self.rules.
+
+        Returns:
+            int: The position of the rule in the scan order.
+        """
+        position = len(self.order)
+        self.order.append(rule_number)
+        self.unsatisfied.append(0)
+        self.blocked.append(0)
+        self.conclusion_rules.setdefault(self.rules[rule_number][-1], []).append(position)
+        for premise in self.rules[rule_number][:-1]:
+            if premise > 0:
+                self.positive_premises.setdefault(premise, []).append(position)
+                if premise not in self.derived_facts:
+                    self.unsatisfied[position] += 1
             else:
-                # If it is a fact
-                literal = clause.strip().lstrip("~")
-                is_positive = clause.strip().startswith("~")
-                self.facts[literal] = not is_positive
+                self.negative_premises.setdefault(-premise, []).append(position)
+                if -premise in self.derived_facts:
+                    self.blocked[position] += 1
+        return position
+
+    def derive(self, symbol: int, position: int = -1, scan: Optional[List[int]] = None) -> None:
+        """
+        Add a derived symbol to the agenda and update the rules having it as a premise.
+
+        Args:
+            symbol (int): The id of the derived symbol.
+            position (int): The scan position of the rule deriving it, -1 outside a scan.
+            scan (List[int] | None): The heap of the current scan, or None outside a scan.
+        """
+        self.agenda.append(symbol)
+        self.derived_facts.add(symbol)
+        self.facts[symbol] = True
+        for other in self.negative_premises.get(symbol, ()):
+            self.blocked[other] += 1
+        for other in self.positive_premises.get(symbol, ()):
+            self.unsatisfied[other] -= 1
+            if self.unsatisfied[other] == 0 and not self.blocked[other]:
+                # Rules before the current one are only met again by the next scan
+                if scan is not None and other > position:
+                    heapq.heappush(scan, other)
+                else:
+                    self.next_scan.append(other)
+
+    def scan(self) -> None:
+        """
+        Fire the ready rules in scan order, as one pass over rule_index would.
+        """
+        scan = self.next_scan
+        heapq.heapify(scan)
+        self.next_scan = []
+        while scan:
+            position = heapq.heappop(scan)
+            conclusion = self.rules[self.order[position]][-1]
+            # Retraction may have undone the premises of a rule waiting for this scan
+            if self.unsatisfied[position] == 0 and not self.blocked[position] and conclusion not in self.derived_facts:
+                self.derive(conclusion, position, scan)
 
-        # Store query with negation flag if any
-        self.query = (ask_part.strip().lstrip("~"), ask_part.strip().startswith("~"))
+    def run(self, query: Optional[int]) -> bool:
+        """
+        Pop facts from the agenda, scanning the rules after each, until the query is popped.
+
+        The agenda, the counters and the pending scan are kept, so a later run
+        resumes where this one stopped.
+
+        Args:
+            query (int | None): The signed literal to stop at, or None to compute the whole closure.
+
+        Returns:
+            bool: True if the query was popped, False once the agenda is empty.
+        """
+        if self.scan_pending:
+            self.scan_pending = False
+            self.scan()
+
+        while self.agenda:
+            fact = self.agenda.popleft()
+            # Retracted facts, and re-derived facts pushed again, stay on the agenda
+            if fact not in self.derived_facts or fact in self.entailments:
+                continue
+            self.entailments[fact] = None
+
+            # Check if fact matches the query
+            if query is not None and fact == abs(query) and self.facts[fact] == (query > 0):
+                self.scan_pending = True
+                return True
+
+            self.scan()
+        return False
 
     def infer(self) -> None:
         """
         Run the forward chaining algorithm and print YES or NO with the required format.
+
+        This is PL-FC-Entails with premise counters: deriving a symbol only touches
+        the rules having it as a premise, and a rule becomes ready when its counter
+        reaches zero. Ready rules fire in the order a full scan of rule_index would
+        find them after each fact is popped from the agenda: rules becoming ready
+        further down the current scan fire in the same scan, the others in the next
+        one. Each rule is thus touched once per premise.
         """
-        # Initialize known facts
-        agenda = deque([fact for fact, is_true in self.facts.items() if is_true])
-        self.derived_facts = set(agenda)
+        if self.run(self.query):
+            print(f"YES: {', '.join(self.symbols.name(symbol) for symbol in self.entailments)}")
+        else:
+            # If the query cannot be derived
+            print("NO")
 
-        while agenda:
-            fact = agenda.popleft()
-            self.entailments.append(fact)
+    def infer_batch(self) -> None:
+        """
+        Answer every query of the knowledge base from one closure, printing one JSON line per query.
 
-            # Check if fact matches the query
-            if fact == self.query[0] and self.facts[fact] == (not self.query[1]):
-                print(f"YES: {', '.join(self.entailments)}")
+        The closure is computed once, then each query is a dictionary lookup.
+        A YES line holds the symbols popped up to the query, as infer prints them.
+        """
+        self.run(None)
+        names = [self.symbols.name(symbol) for symbol in self.entailments]
+        # Positions stored as { symbol id: index in the derivation order }
+        positions = {symbol: index for index, symbol in enumerate(self.entailments)}
+
+        for sentence, literal in self.knowledge_base.queries:
+            # As in infer, only a positive literal can be derived
+            index = positions.get(literal) if literal is not None and literal > 0 else None
+            if index is None:
+                print(json.dumps({"query": sentence, "result": "NO"}))
+            else:
+                print(json.dumps({"query": sentence, "result": "YES", "derivation": names[:index + 1]}))
+
+    def reaches_negation(self, symbol: int) -> bool:
+        """
+        Check whether a change to a symbol can reach a rule with a negated premise.
+
+        The symbols the change can reach are followed forwards through the
+        premise index. Without negated premises on the way, derivation is
+        monotone there and an incremental update gives the closure a new run
+        would. Otherwise the outcome depends on the order in which a new run
+        derives and blocks, so the session restarts instead.
+
+        Args:
+            symbol (int): The id of the told or retracted symbol.
+
+        Returns:
+            bool: True if a reached symbol is a negated premise, or a premise of a rule having one.
+        """
+        if not self.negative_premises:
+            return False
+        reached = {symbol}
+        stack = [symbol]
+        while stack:
+            current = stack.pop()
+            if current in self.negative_premises:
+                return True
+            for position in self.positive_premises.get(current, ()):
+                rule = self.rules[self.order[position]]
+                if any(premise < 0 for premise in rule[:-1]):
+                    return True
+                if rule[-1] not in reached:
+                    reached.add(rule[-1])
+                    stack.append(rule[-1])
+        return False
+
+    def tell_fact(self, name: str) -> None:
+        """
+        Add a fact to the session; only its new consequences are derived, by the next ask.
+
+        A fact reaching a rule with a negated premise restarts the derivation
+        instead, since it may block rules that have already fired.
+
+        Args:
+            name (str): The symbol name.
+        """
+        symbol = self.symbols.intern(name)
+        self.knowledge_base.facts[symbol] = True
+        if self.reaches_negation(symbol):
+            self.restart()
+        elif symbol not in self.derived_facts:
+            self.derive(symbol)
+
+    def tell_rule(self, premises: List[str], conclusion: str) -> None:
+        """
+        Add a rule to the session.
+
+        The rule is scanned after the rules already known, and fires at once if
+        its premises already hold. A rule with a negated premise, or whose
+        conclusion reaches one, restarts the derivation instead.
+
+        In a relevance slice, a rule concluding a symbol outside the cone is
+        only stored in the knowledge base, for a later wider slice. A rule
+        bringing new premises into the cone recomputes the slice.
+
+        Args:
+            premises (List[str]): The premise symbol names, "~" marking a negated premise.
+            conclusion (str): The concluded symbol name.
+        """
+        literals = [-self.symbols.intern(premise[1:]) if premise.startswith("~") else self.symbols.intern(premise)
+                    for premise in premises]
+        conclusion_id = self.symbols.intern(conclusion)
+        # The knowledge base keeps every rule, so that a wider slice finds them later
+        self.knowledge_base.add_rule(literals, conclusion_id)
+        if self.cone is not None:
+            if conclusion_id not in self.cone:
+                return
+            if any(abs(literal) not in self.cone for literal in literals):
+                self.widen(conclusion_id)
                 return
+            # A relevance slice has its own rules, a rule within the cone joins them
+            self.rule_index.setdefault(conclusion_id, []).append(len(self.rules))
+            self.rules.add(literals + [conclusion_id])
+        if any(literal < 0 for literal in literals) or self.reaches_negation(conclusion_id):
+            self.restart()
+            return
+        position = self.index_rule(len(self.rules) - 1)
+        if self.unsatisfied[position] == 0 and not self.blocked[position] and conclusion_id not in self.derived_facts:
+            self.derive(conclusion_id)
+
+    def ask(self, name: str) -> bool:
+        """
+        Check whether a symbol follows from everything told so far.
+
+        Facts are only popped until the symbol is, so consecutive asks share the work.
+        In a relevance slice, a symbol outside the cone becomes a goal first,
+        which recomputes the slice and restarts the derivation.
+
+        Args:
+            name (str): The symbol name.
+
+        Returns:
+            bool: True if the symbol is entailed, False otherwise.
+        """
+        symbol = self.symbols.ids.get(name)
+        if symbol is None:
+            return False
+        if self.cone is not None and symbol not in self.cone:
+            self.widen(symbol)
+        return symbol in self.derived_facts or self.run(symbol)
+
+    def retract_fact(self, name: str) -> None:
+        """
+        Withdraw a told fact and update the derived closure with delete and re-derive (DRed).
+
+        First every derived symbol that may depend on the fact is deleted,
+        following the premise index from the fact through the rules that hold;
+        other told facts are kept. The counters of the rules using the deleted
+        symbols are then undone. Finally a deleted symbol that still has a rule
+        whose premises hold is derived again, and the next ask propagates from
+        it. Only the deleted symbols and their rules are visited.
+
+        As in tell_fact, a fact reaching a rule with a negated premise
+        restarts the derivation instead: deleting it may unblock rules, whose
+        conclusions may block others in turn. So does a deleted symbol
+        concluded by such a rule, since whether a new run fires that rule
+        depends on its derivation order.
+
+        Args:
+            name (str): The symbol name.
+        """
+        symbol = self.symbols.ids.get(name)
+        if symbol is None or not self.knowledge_base.facts.get(symbol):
+            return
+        del self.knowledge_base.facts[symbol]
+        # Without any told fact a new run pops nothing, so not even a rule with only negated premises fires
+        if not any(self.knowledge_base.facts.values()) or self.reaches_negation(symbol):
+            self.restart()
+            return
+
+        # Over-delete the consequences of the fact
+        deleted = set()
+        stack = [symbol]
+        while stack:
+            current = stack.pop()
+            if current in deleted or current not in self.derived_facts:
+                continue
+            if current != symbol and self.knowledge_base.facts.get(current):
+                continue
+            deleted.add(current)
+            for position in self.positive_premises.get(current, ()):
+                if self.unsatisfied[position] == 0:
+                    stack.append(self.rules[self.order[position]][-1])
+
+        if any(premise < 0 for current in deleted for position in self.conclusion_rules.get(current, ())
+               for premise in self.rules[self.order[position]][:-1]):
+            self.restart()
+            return
+
+        # Undo their effect on the rules
+        candidates = []
+        for current in deleted:
+            self.derived_facts.discard(current)
+            self.entailments.pop(current, None)
+            self.facts.pop(current, None)
+            for position in self.positive_premises.get(current, ()):
+                self.unsatisfied[position] += 1
+            candidates += self.conclusion_rules.get(current, ())
 
-            # Process rules that have `fact` in their premises
-            for conclusion, rules in self.rules.items():
-                for premises, is_negated_conclusion in rules:
-                    # Check if all premises are in derived facts
-                    if all((p in self.derived_facts) == (not neg) for p, neg in premises):
-                        if conclusion not in self.derived_facts:
-                            agenda.append(conclusion)
-                            self.derived_facts.add(conclusion)
-                            self.facts[conclusion] = not is_negated_conclusion
-                        
-        # If the query cannot be derived
-        print("NO")
\ No newline at end of file
+        # Re-derive the symbols that still have a rule whose premises hold
+        for position in sorted(candidates):
+            conclusion = self.rules[self.order[position]][-1]
+            if self.unsatisfied[position] == 0 and not self.blocked[position] and conclusion not in self.derived_facts:
+                self.derive(conclusion)
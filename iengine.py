@@ -1,36 +1,170 @@
 import sys
+import argparse
 from truthTable import TruthTable
 from forwardChaining import ForwardChaining
+from bitsetForwardChaining import BitsetForwardChaining
 from backwardChaining import BackwardChaining
 from resolution import Resolution
 from dpll import DPLL
+from modelCounter import ModelCounter
+from approxCounter import ApproxCounter
+from bdd import BDD
+from cnfCache import CNFCache
+from progress import Progress
+from knowledgeBase import KnowledgeBase
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    :return: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Propositional logic inference engine.")
+    parser.add_argument("filename", help="The file containing the knowledge base and query, or a compiled image.")
+    parser.add_argument("method", help="The inference method: TT, FC, BC, RES, DPLL, COUNT, APPROX or BDD.")
+    parser.add_argument("--cnf", choices=["standard", "tseitin"], default="standard",
+                        help="CNF conversion used by TT, RES, DPLL, COUNT, APPROX and BDD (default: standard).")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Directory persisting CNF conversions between runs.")
+    parser.add_argument("--cache-size", type=int, default=64 * 1024 * 1024,
+                        help="Maximum size in bytes of the CNF cache directory.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes converting TELL sentences to standard CNF (default: 1).")
+    parser.add_argument("--tt-mode", choices=TruthTable.MODES, default="enumerate",
+                        help="Truth table enumeration strategy (default: enumerate). "
+                             "The sharded mode counts on --tt-workers processes.")
+    parser.add_argument("--tt-workers", type=int, default=None,
+                        help="Number of processes counting shards in the sharded TT mode (default: all cores).")
+    parser.add_argument("--progress", type=float, default=None, metavar="SECONDS",
+                        help="Report TT progress, throughput and ETA on stderr at this interval.")
+    parser.add_argument("--time-budget", type=float, default=None, metavar="SECONDS",
+                        help="Wall-clock budget of TT; the answer is UNKNOWN when it runs out.")
+    parser.add_argument("--assignment-budget", type=int, default=None,
+                        help="Number of assignments TT may cover; the answer is UNKNOWN when it runs out.")
+    parser.add_argument("--epsilon", type=float, default=0.8,
+                        help="APPROX tolerance: the count is within a factor 1 + epsilon (default: 0.8).")
+    parser.add_argument("--delta", type=float, default=0.2,
+                        help="APPROX confidence: the tolerance holds with probability 1 - delta (default: 0.2).")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed of the APPROX random hash constraints.")
+    parser.add_argument("--fc-mode", choices=["counter", "bitset"], default="counter",
+                        help="FC engine: premise counters per rule, or the same counters over flat CSR arrays, which use "
+                             "less memory on very large rule bases (default: counter). Batches always use the counter engine.")
+    parser.add_argument("--slice", action="store_true",
+                        help="Chain FC and BC only over the rules the queries depend on, reporting the pruning on stderr.")
+    parser.add_argument("--batch", action="store_true",
+                        help="Answer every ASK sentence with FC from one closure, as JSON lines.")
+    parser.add_argument("--queries", default=None,
+                        help="File of extra FC batch queries, one per line (implies --batch).")
+    parser.add_argument("--simplify", action="store_true",
+                        help="Remove tautologies, duplicate and subsumed clauses before TT, RES and DPLL.")
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="Print CNF cache hit and miss counters to stderr.")
+    return parser.parse_args()
+
+def parse_compile_arguments() -> argparse.Namespace:
+    """
+    Parse the command line arguments of the compile command.
+
+    :return: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(prog="iengine.py compile",
+                                     description="Compile a knowledge base into a binary image loaded by every method.")
+    parser.add_argument("source", help="The file containing the knowledge base and query.")
+    parser.add_argument("output", help="The binary image to write, e.g. kb.ikb.")
+    parser.add_argument("--cnf", choices=["standard", "tseitin"], default="standard",
+                        help="CNF conversion stored in the image (default: standard).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes converting TELL sentences to standard CNF (default: 1).")
+    return parser.parse_args(sys.argv[2:])
+
+def compile_knowledge_base() -> None:
+    """Compile a knowledge base with both its clauses and its Horn rules, and save it as a binary image."""
+    args = parse_compile_arguments()
+    knowledge_base = KnowledgeBase.from_file(args.source, cnf_mode=args.cnf, clauses=True, rules=True, workers=args.workers)
+    knowledge_base.save(args.output)
+
+def print_stats(stats: dict) -> None:
+    """
+    Print counters to stderr so they never mix with the inference result.
+
+    :param stats: The counters to print, by name.
+    """
+    print(", ".join(f"{name}: {value}" for name, value in stats.items()), file=sys.stderr)
 
 def main():
-    if len(sys.argv) == 3:
-        filename = sys.argv[1]
-        method = sys.argv[2]
-
-        if (method == "TT"):
-            tt = TruthTable(filename)
-            tt.infer()
-        elif (method == "FC"):
-            FC = ForwardChaining(filename)
+    if len(sys.argv) < 3:
+        print("Invalid number of arguments")
+        sys.exit()
+
+    if sys.argv[1] == "compile":
+        compile_knowledge_base()
+        return
+
+    args = parse_arguments()
+    filename = args.filename
+    method = args.method
+    cache = CNFCache(directory=args.cache_dir, max_disk_bytes=args.cache_size)
+
+    if (method == "TT"):
+        progress = None
+        if args.progress is not None or args.time_budget is not None or args.assignment_budget is not None:
+            progress = Progress(interval=args.progress, time_budget=args.time_budget,
+                                assignment_budget=args.assignment_budget)
+        tt = TruthTable(filename, cnf_mode=args.cnf, cache=cache, workers=args.workers, simplify=args.simplify,
+                        mode=args.tt_mode, progress=progress, tt_workers=args.tt_workers)
+        tt.infer()
+        if args.simplify:
+            print_stats(tt.simplification)
+        if progress is not None:
+            print_stats(progress.stats())
+    elif (method == "FC"):
+        knowledge_base = KnowledgeBase.from_file(filename, clauses=False, rules=True)
+        if args.batch or args.queries is not None:
+            if args.queries is not None:
+                # Read before slicing, so the slice covers these queries too
+                knowledge_base.read_queries(args.queries)
+            FC = ForwardChaining(knowledge_base, relevance=args.slice)
+            FC.infer_batch()
+        elif args.fc_mode == "bitset":
+            FC = BitsetForwardChaining(knowledge_base, relevance=args.slice)
             FC.infer()
-        elif (method == "BC"):
-            BC = BackwardChaining(filename)
-            BC.infer()
-        elif (method == "RES"):
-            res = Resolution(filename)
-            res.infer()
-        elif (method == "DPLL"):
-            dp = DPLL(filename)
-            dp.infer()
         else:
-            print("Invalid method")
-            sys.exit()
+            FC = ForwardChaining(knowledge_base, relevance=args.slice)
+            FC.infer()
+        if args.slice:
+            print_stats(FC.slicing)
+    elif (method == "BC"):
+        BC = BackwardChaining(filename, relevance=args.slice)
+        BC.infer()
+        if args.slice:
+            print_stats(BC.slicing)
+    elif (method == "RES"):
+        res = Resolution(filename, cnf_mode=args.cnf, cache=cache, workers=args.workers, simplify=args.simplify)
+        res.infer()
+        if args.simplify:
+            print_stats(res.simplification)
+    elif (method == "COUNT"):
+        counter = ModelCounter(filename, cnf_mode=args.cnf, cache=cache, workers=args.workers)
+        counter.infer()
+    elif (method == "APPROX"):
+        counter = ApproxCounter(filename, cnf_mode=args.cnf, cache=cache, workers=args.workers,
+                                epsilon=args.epsilon, delta=args.delta, seed=args.seed)
+        counter.infer()
+    elif (method == "BDD"):
+        bdd = BDD(filename, cnf_mode=args.cnf, cache=cache, workers=args.workers)
+        bdd.infer()
+    elif (method == "DPLL"):
+        dp = DPLL(filename, cnf_mode=args.cnf, cache=cache, workers=args.workers, simplify=args.simplify)
+        dp.infer()
+        if args.simplify:
+            print_stats(dp.simplification)
     else:
-        print("Invalid number of arguments")
+        print("Invalid method")
         sys.exit()
 
+    if args.cache_stats:
+        print_stats(cache.stats())
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
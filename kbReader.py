@@ -0,0 +1,129 @@
+import io
+import re
+import bz2
+import gzip
+import lzma
+from typing import Iterator, TextIO, Tuple
+
+class KBReader:
+    """
+    Streaming reader for TELL/ASK files.
+
+    The file is read in fixed-size chunks and sentences are yielded one at a
+    time, so memory stays bounded by the chunk size and the longest sentence.
+    TELL sentences are separated by ";" and may wrap across lines. The TELL
+    section ends at the ASK keyword; the last TELL sentence may omit its ";".
+    ASK sentences are separated by ";" or line breaks. Files compressed with
+    gzip, xz or bzip2 are decompressed transparently.
+    """
+    CHUNK_SIZE = 1 << 16
+
+    TELL_PATTERN = re.compile(r'TELL\s')
+    ASK_PATTERN = re.compile(r'\bASK\b')
+    ASK_SEPARATOR_PATTERN = re.compile(r'[;\n]')
+
+    def __init__(self, filename: str, chunk_size: int = CHUNK_SIZE):
+        """
+        Initialize the reader.
+
+        :param filename: The file containing the knowledge base and query, optionally compressed.
+        :param chunk_size: The number of characters read at a time.
+        """
+        self.filename = filename
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def open(filename: str) -> TextIO:
+        """
+        Open a file for reading text, decompressing it if needed.
+
+        :param filename: The file to open.
+        :return: A text stream over the (decompressed) content.
+        """
+        with open(filename, 'rb') as f:
+            magic = f.read(6)
+
+        if magic.startswith(b'\x1f\x8b'):
+            return gzip.open(filename, 'rt', encoding='utf-8')
+        if magic.startswith(b'\xfd7zXZ\x00'):
+            return lzma.open(filename, 'rt', encoding='utf-8')
+        if magic.startswith(b'BZh'):
+            return bz2.open(filename, 'rt', encoding='utf-8')
+        return io.open(filename, 'r', encoding='utf-8')
+
+    def sentences(self) -> Iterator[Tuple[str, str]]:
+        """
+        Stream the sentences of the file.
+
+        :yield: (section, sentence) pairs, where section is "TELL" or "ASK".
+        """
+        for section, text, _ in self.blocks():
+            for sentence in (text.split(';') if section == "TELL" else (text,)):
+                sentence = sentence.strip()
+                if sentence:
+                    yield section, sentence
+
+    def blocks(self) -> Iterator[Tuple[str, str, int]]:
+        """
+        Stream the file as blocks of whole sentences.
+
+        A TELL block holds every complete TELL sentence of the buffered chunk,
+        separated by ";", so it can be tokenized in one pass. An ASK block
+        holds one ASK sentence.
+
+        :yield: (section, text, offset) triples, where offset is the position of the text in the file.
+        """
+        with KBReader.open(self.filename) as stream:
+            buffer = ""
+            buffer_offset = 0
+            position = 0
+            section = None
+            eof = False
+
+            while True:
+                if section is None:
+                    match = KBReader.TELL_PATTERN.search(buffer, position)
+                    if match:
+                        section = "TELL"
+                        position = match.end()
+                        continue
+                    # Keep a short tail in case the keyword is split across chunks
+                    position = max(position, len(buffer) - 4)
+
+                elif section == "TELL":
+                    match = KBReader.ASK_PATTERN.search(buffer, position)
+                    # A keyword touching the end of the buffer may continue in the next chunk
+                    if match and (match.end() < len(buffer) or eof):
+                        if buffer[position:match.start()].strip():
+                            yield "TELL", buffer[position:match.start()], buffer_offset + position
+                        section = "ASK"
+                        position = match.end()
+                        continue
+
+                    end = buffer.rfind(';', position, match.start() if match else len(buffer)) + 1
+                    if end > position:
+                        yield "TELL", buffer[position:end], buffer_offset + position
+                        position = end
+
+                else:
+                    match = KBReader.ASK_SEPARATOR_PATTERN.search(buffer, position)
+                    if match or eof:
+                        end = match.start() if match else len(buffer)
+                        if buffer[position:end].strip():
+                            yield "ASK", buffer[position:end], buffer_offset + position
+                        if not match:
+                            return
+                        position = match.end()
+                        continue
+
+                if eof:
+                    if section == "TELL":
+                        raise ValueError(f"Missing ASK section in {self.filename}")
+                    if section is None:
+                        raise ValueError(f"Missing TELL section in {self.filename}")
+
+                chunk = stream.read(self.chunk_size)
+                eof = chunk == ""
+                buffer = buffer[position:] + chunk
+                buffer_offset += position
+                position = 0
@@ -0,0 +1,533 @@
+import os
+import sys
+import mmap
+import struct
+from array import array
+from itertools import islice
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from formula import Formula, FormulaParser
+from converter import TseitinEncoder
+from cnfCache import CNFCache
+from kbReader import KBReader
+from lexer import Lexer, SymbolTable
+
+class ClauseDatabase:
+    """
+    Clauses stored as one flat array of literals plus an array of offsets.
+
+    Clause i occupies literals[offsets[i]:offsets[i + 1]]. Literals are
+    signed symbol ids, so no per-clause Python objects are kept. A database
+    loaded from a binary image holds read-only memoryviews instead of arrays,
+    copied into arrays the first time a clause is added.
+    """
+    def __init__(self, literals: array = None, offsets: array = None):
+        """
+        Initialize the database, optionally over existing arrays.
+
+        :param literals: The flat literal array.
+        :param offsets: The clause offsets, starting with 0.
+        """
+        self.literals = literals if literals is not None else array('i')
+        self.offsets = offsets if offsets is not None else array('q', [0])
+
+    def add(self, clause: Iterable[int]) -> None:
+        """
+        Append a clause.
+
+        :param clause: The signed literals of the clause.
+        """
+        if not isinstance(self.literals, array):
+            self.literals = array('i', self.literals)
+            self.offsets = array('q', self.offsets)
+        self.literals.extend(clause)
+        self.offsets.append(len(self.literals))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> array:
+        return self.literals[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self) -> Iterator[array]:
+        literals = self.literals
+        offsets = self.offsets
+        for index in range(len(offsets) - 1):
+            yield literals[offsets[index]:offsets[index + 1]]
+
+    def to_lists(self) -> List[List[int]]:
+        """
+        Copy the clauses into mutable lists.
+
+        :return: A list of clauses, each a list of signed literals.
+        """
+        return [list(clause) for clause in self]
+
+
+class KnowledgeBase:
+    """
+    Compiled form of a TELL/ASK file shared by all inference engines.
+
+    The file is tokenized and parsed once. Symbols are interned to integer ids and clauses
+    are stored in ClauseDatabase arrays:
+        - clauses: the CNF of the TELL part.
+        - query: the CNF of the ASK sentence.
+        - negated_query: the CNF of its negation, for refutation engines.
+    For the chaining engines the Horn sentences are compiled into rules, each
+    stored as its premises followed by its conclusion, plus an index from each
+    conclusion to its rules and the list of facts.
+
+    A compiled knowledge base can be saved as a binary image and loaded back
+    with mmap; see save and load for the layout.
+    """
+    IMAGE_MAGIC = b"IKB\x00"
+    # Bump when the image layout or the meaning of its sections changes
+    IMAGE_VERSION = 2
+    IMAGE_HEADER = struct.Struct("<4sIIi")
+    SECTION_HEADER = struct.Struct("<Q")
+    HORN_FLAG = 1
+    QUERY_LITERAL_FLAG = 2
+    # Definition operations are stored as their index in this tuple
+    DEFINITION_OPERATIONS = (Formula.AND, Formula.OR)
+
+    def __init__(self, cnf_mode: str = "standard", cache: CNFCache = None, plaisted_greenbaum: bool = False,
+                 clauses: bool = True, rules: bool = False, workers: int = 1):
+        """
+        Initialize an empty knowledge base.
+
+        :param cnf_mode: "standard" for distributive CNF, "tseitin" for definitional CNF.
+        :param cache: The cache reused for standard CNF conversions, or None for a private one.
+        :param plaisted_greenbaum: Whether Tseitin definitions are emitted in one direction only.
+        :param clauses: Whether to compile the CNF clauses.
+        :param rules: Whether to compile the Horn rules.
+        :param workers: The number of processes converting TELL sentences to standard CNF.
+        """
+        self.compile_clauses = clauses
+        self.compile_rules = rules
+        self.workers = workers
+        self.encoder = TseitinEncoder(plaisted_greenbaum=plaisted_greenbaum) if cnf_mode == "tseitin" else None
+        self.cache = cache if cache is not None else CNFCache()
+
+        self.symbols = SymbolTable()
+        self.clauses = ClauseDatabase()
+        self.query = ClauseDatabase()
+        self.negated_query = ClauseDatabase()
+        # Definitions stored as { auxiliary id: (operation, [literals]) }, children before parents
+        self.definitions: Dict[int, Tuple[str, List[int]]] = {}
+
+        self.rules = ClauseDatabase()
+        # Rule index stored as { conclusion id: [rule numbers] }, in order of first appearance
+        self.rule_index: Dict[int, List[int]] = {}
+        # Facts stored as { symbol id: truth value }
+        self.facts: Dict[int, bool] = {}
+        self.query_sentence: Optional[str] = None
+        self.query_literal: Optional[int] = None
+        # Every ASK sentence with its signed literal, None when it is not a literal
+        self.queries: List[Tuple[str, Optional[int]]] = []
+        self.horn = True
+
+    @staticmethod
+    def from_file(filename: str, cnf_mode: str = "standard", cache: CNFCache = None, plaisted_greenbaum: bool = False,
+                  clauses: bool = True, rules: bool = False, workers: int = 1) -> "KnowledgeBase":
+        """
+        Compile a TELL/ASK file, streaming its sentences.
+
+        A binary image written by save is loaded instead, whatever the other parameters.
+
+        :param filename: The file containing the knowledge base and query, optionally compressed, or a binary image.
+        :return: The compiled knowledge base. See __init__ for the other parameters.
+        """
+        if KnowledgeBase.is_image(filename):
+            return KnowledgeBase.load(filename)
+
+        knowledge_base = KnowledgeBase(cnf_mode, cache, plaisted_greenbaum, clauses, rules, workers)
+
+        # Tseitin conversion numbers its auxiliaries in sentence order, so only standard conversion runs in parallel
+        executor = None
+        if workers > 1 and clauses and knowledge_base.encoder is None:
+            executor = ProcessPoolExecutor(max_workers=workers)
+
+        # Each block of sentences is tokenized in one pass and compiled as it is read,
+        # so the file is never held in memory
+        lexer = Lexer(knowledge_base.symbols)
+        try:
+            for section, text, offset in KBReader(filename).blocks():
+                formulas = FormulaParser.parse_stream(lexer.tokenize(text, offset), knowledge_base.symbols)
+                if section == "TELL":
+                    knowledge_base.tell_formulas(list(formulas), executor)
+                    continue
+                for formula in formulas:
+                    # The first ASK sentence is the query of every method, the others are only batch queries
+                    if knowledge_base.query_sentence is None:
+                        knowledge_base.ask_formula(formula, text.strip())
+                    else:
+                        knowledge_base.add_query(formula, text.strip())
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if knowledge_base.query_sentence is None:
+            raise ValueError(f"Missing ASK sentence in {filename}")
+        return knowledge_base
+
+    @staticmethod
+    def is_image(filename: str) -> bool:
+        """Return whether a file is a binary image written by save."""
+        with open(filename, 'rb') as f:
+            return f.read(len(KnowledgeBase.IMAGE_MAGIC)) == KnowledgeBase.IMAGE_MAGIC
+
+    def save(self, filename: str) -> None:
+        """
+        Write the compiled knowledge base to a binary image.
+
+        The image starts with a header (magic, version, flags, query literal)
+        followed by length-prefixed little-endian sections, each padded to 8
+        bytes: symbol names, query sentence, then the literal and offset arrays
+        of clauses, query, negated query and rules, the rule index as
+        conclusions, offsets and rule numbers, the facts as signed ids, the
+        definitions as (auxiliary, operation, length, literals...) records,
+        and the batch queries as NUL-separated sentences plus their signed
+        literals, 0 standing for a sentence that is not a literal.
+
+        :param filename: The file to write.
+        """
+        if sys.byteorder != "little":
+            raise ValueError("Binary images can only be written on little-endian machines")
+
+        rule_conclusions = array('i', self.rule_index.keys())
+        rule_offsets = array('q', [0])
+        rule_numbers = array('i')
+        for numbers in self.rule_index.values():
+            rule_numbers.extend(numbers)
+            rule_offsets.append(len(rule_numbers))
+
+        definitions = array('i')
+        for auxiliary, (operation, literals) in self.definitions.items():
+            definitions.extend([auxiliary, KnowledgeBase.DEFINITION_OPERATIONS.index(operation), len(literals)])
+            definitions.extend(literals)
+
+        sections = [
+            "\n".join(self.symbols.names[1:]).encode("utf-8"),
+            (self.query_sentence or "").encode("utf-8"),
+            array('i', self.clauses.literals), array('q', self.clauses.offsets),
+            array('i', self.query.literals), array('q', self.query.offsets),
+            array('i', self.negated_query.literals), array('q', self.negated_query.offsets),
+            array('i', self.rules.literals), array('q', self.rules.offsets),
+            rule_conclusions, rule_offsets, rule_numbers,
+            array('i', (symbol if value else -symbol for symbol, value in self.facts.items())),
+            definitions,
+            "\0".join(sentence for sentence, _ in self.queries).encode("utf-8"),
+            array('i', (literal or 0 for _, literal in self.queries)),
+        ]
+
+        flags = (KnowledgeBase.HORN_FLAG if self.horn else 0) | (KnowledgeBase.QUERY_LITERAL_FLAG if self.query_literal is not None else 0)
+        # Write to a temporary file first so a failed compile never leaves a truncated image
+        temporary = f"{filename}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(KnowledgeBase.IMAGE_HEADER.pack(KnowledgeBase.IMAGE_MAGIC, KnowledgeBase.IMAGE_VERSION, flags, self.query_literal or 0))
+            for section in sections:
+                data = section.tobytes() if isinstance(section, array) else section
+                f.write(KnowledgeBase.SECTION_HEADER.pack(len(data)))
+                f.write(data)
+                f.write(b"\x00" * (-len(data) % 8))
+        os.replace(temporary, filename)
+
+    @staticmethod
+    def load(filename: str) -> "KnowledgeBase":
+        """
+        Load a binary image written by save.
+
+        The file is memory-mapped and the clause, query and rule arrays are
+        read in place through memoryviews, so loading does not copy or convert
+        the clause database. Adding a clause or rule later copies that database.
+
+        :param filename: The image to load.
+        :return: The compiled knowledge base.
+        """
+        with open(filename, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, flags, query_literal = KnowledgeBase.IMAGE_HEADER.unpack_from(mapping, 0)
+        if magic != KnowledgeBase.IMAGE_MAGIC:
+            raise ValueError(f"{filename} is not a compiled knowledge base")
+        if version != KnowledgeBase.IMAGE_VERSION:
+            raise ValueError(f"{filename} has image version {version}, expected {KnowledgeBase.IMAGE_VERSION}; recompile it")
+
+        view = memoryview(mapping)
+        sections = []
+        position = KnowledgeBase.IMAGE_HEADER.size
+        while position < len(mapping):
+            length, = KnowledgeBase.SECTION_HEADER.unpack_from(mapping, position)
+            position += KnowledgeBase.SECTION_HEADER.size
+            sections.append(view[position:position + length])
+            position += length + (-length % 8)
+
+        (names, query_sentence, clause_literals, clause_offsets, query_literals, query_offsets,
+         negated_literals, negated_offsets, rule_literals, rule_offsets, rule_conclusions, rule_index_offsets,
+         rule_numbers, facts, definitions, batch_sentences, batch_literals) = sections
+
+        knowledge_base = KnowledgeBase()
+        # The memoryviews point into the mapping, which stays open as long as the knowledge base
+        knowledge_base.mapping = mapping
+        for name in (bytes(names).decode("utf-8").split("\n") if len(names) else []):
+            knowledge_base.symbols.intern(name)
+        knowledge_base.query_sentence = bytes(query_sentence).decode("utf-8")
+        knowledge_base.query_literal = query_literal if flags & KnowledgeBase.QUERY_LITERAL_FLAG else None
+        knowledge_base.queries = [(sentence, literal or None) for sentence, literal in
+                                  zip(bytes(batch_sentences).decode("utf-8").split("\0"), batch_literals.cast('i'))]
+        knowledge_base.horn = bool(flags & KnowledgeBase.HORN_FLAG)
+
+        knowledge_base.clauses = ClauseDatabase(clause_literals.cast('i'), clause_offsets.cast('q'))
+        knowledge_base.query = ClauseDatabase(query_literals.cast('i'), query_offsets.cast('q'))
+        knowledge_base.negated_query = ClauseDatabase(negated_literals.cast('i'), negated_offsets.cast('q'))
+        knowledge_base.rules = ClauseDatabase(rule_literals.cast('i'), rule_offsets.cast('q'))
+
+        rule_numbers = rule_numbers.cast('i')
+        rule_index_offsets = rule_index_offsets.cast('q')
+        for index, conclusion in enumerate(rule_conclusions.cast('i')):
+            knowledge_base.rule_index[conclusion] = list(rule_numbers[rule_index_offsets[index]:rule_index_offsets[index + 1]])
+        for literal in facts.cast('i'):
+            knowledge_base.facts[abs(literal)] = literal > 0
+
+        definitions = definitions.cast('i')
+        position = 0
+        while position < len(definitions):
+            auxiliary, operation, length = definitions[position:position + 3]
+            literals = list(definitions[position + 3:position + 3 + length])
+            knowledge_base.definitions[auxiliary] = (KnowledgeBase.DEFINITION_OPERATIONS[operation], literals)
+            position += 3 + length
+
+        return knowledge_base
+
+    def tell(self, sentence: str) -> None:
+        """
+        Compile one TELL sentence.
+
+        :param sentence: The sentence as a string.
+        """
+        self.tell_formula(self.parse(sentence))
+
+    def tell_formula(self, formula: Formula) -> None:
+        """
+        Compile one parsed TELL sentence.
+
+        :param formula: The parsed sentence.
+        """
+        if self.compile_rules:
+            self.add_horn_sentence(formula)
+        if self.compile_clauses:
+            for clause in self.convert_formula(formula):
+                self.clauses.add(self.intern_clause(clause))
+
+    def tell_formulas(self, formulas: List[Formula], executor: Executor = None) -> None:
+        """
+        Compile a batch of parsed TELL sentences.
+
+        With an executor the standard CNF conversions are spread over its
+        workers in chunks; the clauses are still added in sentence order.
+
+        :param formulas: The parsed sentences.
+        :param executor: The executor converting the sentences, or None to convert them in this process.
+        """
+        if executor is None or not self.compile_clauses or self.encoder is not None:
+            for formula in formulas:
+                self.tell_formula(formula)
+            return
+
+        if self.compile_rules:
+            for formula in formulas:
+                self.add_horn_sentence(formula)
+        # A few chunks per worker balances uneven sentences against pickling overhead
+        chunk_size = max(1, len(formulas) // (self.workers * 4))
+        for clauses in self.cache.convert_formulas(formulas, executor=executor, chunk_size=chunk_size):
+            for clause in clauses:
+                self.clauses.add(self.intern_clause(clause))
+
+    def ask(self, sentence: str) -> None:
+        """
+        Compile the ASK sentence.
+
+        :param sentence: The sentence as a string.
+        """
+        self.ask_formula(self.parse(sentence), sentence)
+
+    def ask_formula(self, formula: Formula, sentence: str) -> None:
+        """
+        Compile the parsed ASK sentence.
+
+        :param formula: The parsed sentence.
+        :param sentence: The sentence as a string.
+        """
+        self.query_sentence = sentence
+        self.add_query(formula, sentence)
+        if self.compile_rules and formula.is_literal():
+            self.query_literal = self.intern_literal(formula)
+        if self.compile_clauses:
+            first_definition = len(self.definitions)
+            for clause in self.convert_formula(formula):
+                self.query.add(self.intern_clause(clause))
+            query_auxiliaries = list(islice(self.definitions, first_definition, None))
+            negated_clauses = self.convert_formula(formula, negate=True)
+            # The negation reuses the auxiliaries named by the query, whose definitions only went into query
+            for auxiliary in query_auxiliaries:
+                negated_clauses.extend(self.encoder.definition_clauses(self.symbols.name(auxiliary)))
+            for clause in negated_clauses:
+                self.negated_query.add(self.intern_clause(clause))
+
+    def add_query(self, formula: Formula, sentence: str) -> None:
+        """
+        Record a batch query; only the first ASK sentence is compiled by ask_formula.
+
+        :param formula: The parsed sentence.
+        :param sentence: The sentence as a string.
+        """
+        self.queries.append((sentence, self.intern_literal(formula) if formula.is_literal() else None))
+
+    def read_queries(self, filename: str) -> None:
+        """
+        Record the batch queries of a file holding one ASK sentence per line.
+
+        :param filename: The query file, optionally compressed.
+        """
+        with KBReader.open(filename) as f:
+            for line in f:
+                sentence = line.strip()
+                if sentence:
+                    self.add_query(self.parse(sentence), sentence)
+
+    def parse(self, sentence: str) -> Formula:
+        """
+        Parse a single sentence, interning its symbols into this knowledge base.
+
+        :param sentence: The sentence as a string.
+        :return: The parsed formula.
+        """
+        formulas = list(FormulaParser.parse_stream(Lexer(self.symbols).tokenize(sentence), self.symbols))
+        if len(formulas) != 1:
+            raise ValueError(f"Expected exactly one sentence: {sentence}")
+        return formulas[0]
+
+    def convert_formula(self, formula: Formula, negate: bool = False) -> List[List[Tuple[str, bool]]]:
+        """
+        Convert a parsed sentence to CNF clauses using the selected conversion mode.
+
+        :param formula: The parsed sentence.
+        :param negate: Whether to convert the negation of the sentence instead.
+        :return: A list of clauses, each a list of (symbol, is_negated) literals.
+        """
+        if not self.encoder:
+            return self.cache.convert_formula(formula, negate)
+
+        clauses = self.encoder.encode(Formula.negate(formula) if negate else formula)
+
+        # Record the definitions introduced by this sentence
+        for auxiliary, (operation, literals) in islice(self.encoder.definitions.items(), len(self.definitions), None):
+            self.definitions[self.symbols.intern(auxiliary)] = (operation, self.intern_clause(literals))
+        return clauses
+
+    def intern_clause(self, clause: List[Tuple[str, bool]]) -> List[int]:
+        """
+        Turn (symbol, is_negated) literals into signed symbol ids, dropping repeated literals.
+
+        :param clause: The literals to intern.
+        :return: The signed literals.
+        """
+        intern = self.symbols.intern
+        # Distribution repeats literals, and engines removing one false literal at a time would keep the copies
+        return list(dict.fromkeys(-intern(name) if negated else intern(name) for name, negated in clause))
+
+    def intern_literal(self, formula: Formula) -> int:
+        """Turn a symbol or negated symbol into a signed symbol id."""
+        if formula.op == Formula.NOT:
+            return -self.symbols.intern(formula.args[0].name)
+        return self.symbols.intern(formula.name)
+
+    def add_horn_sentence(self, formula: Formula) -> None:
+        """
+        Compile a Horn sentence into facts or a rule.
+
+        Accepted forms are literals and conjunctions of literals (facts),
+        conjunctions of literals implying a symbol, and disjunctions of
+        literals with exactly one positive literal. Anything else marks the
+        knowledge base as not Horn.
+
+        :param formula: The parsed sentence.
+        """
+        if formula.is_literal() or (formula.op == Formula.AND and all(operand.is_literal() for operand in formula.args)):
+            for operand in (formula.args if formula.op == Formula.AND else (formula,)):
+                literal = self.intern_literal(operand)
+                self.facts[abs(literal)] = literal > 0
+            return
+
+        if formula.op == Formula.IMPLIES:
+            premise, conclusion = formula.args
+            premises = premise.args if premise.op == Formula.AND else (premise,)
+            if conclusion.op == Formula.SYMBOL and all(operand.is_literal() for operand in premises):
+                self.add_rule([self.intern_literal(operand) for operand in premises], self.symbols.intern(conclusion.name))
+                return
+
+        elif formula.op == Formula.OR and all(operand.is_literal() for operand in formula.args):
+            # ~a || ~b || c is the rule a & b => c
+            positives = [operand for operand in formula.args if operand.op == Formula.SYMBOL]
+            if len(positives) == 1:
+                premises = [self.symbols.intern(operand.args[0].name) for operand in formula.args if operand.op == Formula.NOT]
+                self.add_rule(premises, self.symbols.intern(positives[0].name))
+                return
+            if len(positives) == 0:
+                # A goal clause cannot derive anything by chaining
+                return
+
+        self.horn = False
+
+    def add_rule(self, premises: List[int], conclusion: int) -> None:
+        """
+        Store a rule and index it by its conclusion.
+
+        :param premises: The signed literals of the premises.
+        :param conclusion: The id of the concluded symbol.
+        """
+        self.rule_index.setdefault(conclusion, []).append(len(self.rules))
+        self.rules.add(premises + [conclusion])
+
+    def relevant_rules(self, goals: Iterable[int]) -> Tuple[ClauseDatabase, Dict[int, List[int]], Dict[str, int]]:
+        """
+        Slice the rules down to the backward dependency cone of some goals.
+
+        The cone is every symbol reachable from a goal through the
+        conclusion -> premises graph, negated premises included; a rule is kept
+        iff its conclusion is in the cone, so every rule able to derive, or to
+        block, a goal is kept. Kept rules are renumbered in rule_index order,
+        which keeps their relative scan order.
+
+        :param goals: The signed literals of the goals.
+        :return: The kept rules, their rule index, and counters of the kept and pruned rules and symbols.
+        """
+        cone = {abs(goal) for goal in goals}
+        stack = list(cone)
+        while stack:
+            for rule_number in self.rule_index.get(stack.pop(), ()):
+                for premise in self.rules[rule_number][:-1]:
+                    if abs(premise) not in cone:
+                        cone.add(abs(premise))
+                        stack.append(abs(premise))
+
+        rules = ClauseDatabase()
+        rule_index: Dict[int, List[int]] = {}
+        for conclusion, rule_numbers in self.rule_index.items():
+            if conclusion in cone:
+                for rule_number in rule_numbers:
+                    rule_index.setdefault(conclusion, []).append(len(rules))
+                    rules.add(self.rules[rule_number])
+
+        stats = {
+            "rules": len(self.rules),
+            "relevant_rules": len(rules),
+            "pruned_rules": len(self.rules) - len(rules),
+            "symbols": len(self.symbols),
+            "relevant_symbols": len(cone),
+        }
+        return rules, rule_index, stats
+
+    def original_symbols(self) -> List[int]:
+        """Return the ids of all symbols that are not Tseitin auxiliaries."""
+        return [symbol_id for symbol_id in range(1, len(self.symbols) + 1) if symbol_id not in self.definitions]
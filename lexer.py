@@ -0,0 +1,137 @@
+import re
+from array import array
+from typing import Dict, List, Optional
+
+class SymbolTable:
+    """
+    Interns symbol names to integer ids.
+
+    Ids start at 1 so that a literal can be stored as a signed id:
+    +id for the symbol and -id for its negation.
+    """
+    def __init__(self):
+        self.names: List[Optional[str]] = [None]
+        self.ids: Dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        """
+        Return the id of a symbol, assigning the next free id on first use.
+
+        :param name: The symbol name.
+        :return: The symbol id.
+        """
+        symbol_id = self.ids.get(name)
+        if symbol_id is None:
+            symbol_id = len(self.names)
+            self.ids[name] = symbol_id
+            self.names.append(name)
+        return symbol_id
+
+    def name(self, symbol_id: int) -> str:
+        """Return the name of a symbol id."""
+        return self.names[symbol_id]
+
+    def __len__(self) -> int:
+        return len(self.names) - 1
+
+
+class TokenStream:
+    """
+    Compact token stream.
+
+    Tokens are stored in three parallel arrays: the token kind, the symbol id
+    (0 for operators) and the offset of the token in the source text.
+    """
+    def __init__(self):
+        self.kinds = array('b')
+        self.symbols = array('i')
+        self.offsets = array('q')
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+
+class Lexer:
+    """
+    Single-pass lexer turning a block of sentences into a TokenStream.
+
+    The whole block is scanned by one regular expression. Symbols are interned
+    into the given symbol table while scanning, so later stages compare integer
+    kinds and ids instead of strings. Characters that are not part of any token
+    are skipped, as Parser.find_all_words does.
+    """
+    SYMBOL = 0
+    NOT = 1
+    AND = 2
+    OR = 3
+    IMPLIES = 4
+    IFF = 5
+    LEFT_PARENTHESIS = 6
+    RIGHT_PARENTHESIS = 7
+    SEPARATOR = 8
+    UNKNOWN = 9
+
+    OPERATOR_KINDS = {
+        "~": NOT,
+        "&": AND,
+        "||": OR,
+        "=>": IMPLIES,
+        "<=>": IFF,
+        "(": LEFT_PARENTHESIS,
+        ")": RIGHT_PARENTHESIS,
+        ";": SEPARATOR,
+    }
+    TOKEN_TEXT = {kind: text for text, kind in OPERATOR_KINDS.items()}
+    TOKEN_PATTERN = re.compile(r'([a-zA-Z0-9]+)|[<=>]+|[~&();]|\|\|')
+
+    def __init__(self, symbols):
+        """
+        Initialize the lexer.
+
+        :param symbols: The SymbolTable receiving the symbol names.
+        """
+        self.symbols = symbols
+
+    def tokenize(self, text: str, base_offset: int = 0) -> TokenStream:
+        """
+        Tokenize a block of text.
+
+        :param text: The text to tokenize, possibly holding many ";"-separated sentences.
+        :param base_offset: The offset of the text in its source, added to every token offset.
+        :return: The token stream of the text.
+        """
+        stream = TokenStream()
+        kinds = stream.kinds
+        symbols = stream.symbols
+        offsets = stream.offsets
+        intern = self.symbols.intern
+        operator_kinds = Lexer.OPERATOR_KINDS
+
+        for match in Lexer.TOKEN_PATTERN.finditer(text):
+            name = match.group(1)
+            if name is not None:
+                kinds.append(Lexer.SYMBOL)
+                symbols.append(intern(name))
+            else:
+                kinds.append(operator_kinds.get(match.group(), Lexer.UNKNOWN))
+                symbols.append(0)
+            offsets.append(base_offset + match.start())
+
+        return stream
+
+    @staticmethod
+    def describe(stream: TokenStream, index: int, symbols: SymbolTable) -> str:
+        """
+        Describe a token for error messages.
+
+        :param stream: The token stream.
+        :param index: The index of the token in the stream.
+        :param symbols: The symbol table the stream was interned into.
+        :return: The token text and its source offset.
+        """
+        kind = stream.kinds[index]
+        if kind == Lexer.SYMBOL:
+            text = symbols.name(stream.symbols[index])
+        else:
+            text = Lexer.TOKEN_TEXT.get(kind, "?")
+        return f"'{text}' at offset {stream.offsets[index]}"
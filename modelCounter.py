@@ -0,0 +1,204 @@
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Set, Tuple, Union
+from cnfCache import CNFCache
+from knowledgeBase import KnowledgeBase
+
+class ModelCounter:
+    """
+    Exact model counter (#SAT) answering like TruthTable without enumerating.
+
+    The count is a DPLL-style search over the signed-id clauses compiled by
+    KnowledgeBase: unit propagation, then the remaining clauses are split into
+    connected components (clauses sharing no symbol), each counted separately
+    and multiplied together. Component counts are cached, keyed by the set of
+    their reduced clauses, so identical sub-problems met in other branches are
+    counted once.
+
+    The KB entails the query iff the KB has as many models as KB & query;
+    the YES count is the number of models of KB & query, as in TruthTable.
+    """
+    # Maximum number of component counts kept, least recently used are evicted first
+    CACHE_SIZE = 1 << 16
+
+    def __init__(self, filename: Union[str, KnowledgeBase], cnf_mode: str = "standard", cache: CNFCache = None,
+                 workers: int = 1):
+        """
+        Initialize the ModelCounter with the clauses of the knowledge base and query.
+
+        :param filename: The file containing the knowledge base and query, or an already compiled KnowledgeBase.
+        :param cnf_mode: "standard" for distributive CNF, "tseitin" for definitional CNF.
+        :param cache: The cache reused for standard CNF conversions, or None for a private one.
+        :param workers: The number of processes converting TELL sentences to standard CNF.
+        """
+        if isinstance(filename, KnowledgeBase):
+            self.knowledge_base = filename
+        else:
+            # Counting needs two-sided definitions, so that auxiliaries are determined by the original symbols
+            self.knowledge_base = KnowledgeBase.from_file(filename, cnf_mode=cnf_mode, cache=cache, workers=workers)
+
+        self.kb = self.knowledge_base.clauses.to_lists()
+        self.query = self.knowledge_base.query.to_lists()
+        # Every original symbol counts, even when it occurs in no clause
+        self.variables = set(self.knowledge_base.original_symbols())
+        self.component_cache: OrderedDict[FrozenSet[Tuple[int, ...]], int] = OrderedDict()
+        self.cache_hits = 0
+
+    @staticmethod
+    def symbols_of(clauses: Iterable[Tuple[int, ...]]) -> Set[int]:
+        """Return the symbol ids occurring in some clauses."""
+        return {abs(literal) for clause in clauses for literal in clause}
+
+    def count_models(self, clauses: List[List[int]]) -> int:
+        """
+        Count the assignments of self.variables and of the auxiliaries in some clauses satisfying them.
+
+        An auxiliary only counts where its definition is among the clauses,
+        which determines it: the query's auxiliaries must not double the KB count.
+
+        :param clauses: The clauses, as lists of signed symbol ids.
+        :return: The number of models.
+        """
+        normalized = set()
+        for clause in clauses:
+            literals = set(clause)
+            # Tautologies hold in every assignment
+            if not any(-literal in literals for literal in literals):
+                normalized.add(tuple(sorted(literals)))
+
+        normalized = list(normalized)
+        variables = self.variables | ModelCounter.symbols_of(clauses)
+        free = len(variables) - len(ModelCounter.symbols_of(normalized))
+        return self.count(normalized) << free
+
+    def count(self, clauses: List[Tuple[int, ...]]) -> int:
+        """
+        Count the assignments of the symbols of some clauses that satisfy them.
+
+        count_clauses and count_component are generators that yield the
+        sub-counts they need and receive their results. A driver loop runs
+        them on an explicit stack, so the number of branching symbols is not
+        limited by the recursion limit.
+
+        :param clauses: The clauses, as sorted tuples of signed symbol ids.
+        :return: The number of models over the symbols occurring in the clauses.
+        """
+        stack = [self.count_clauses(clauses)]
+        result = None
+        while stack:
+            try:
+                call = stack[-1].send(result)
+            except StopIteration as returned:
+                stack.pop()
+                result = returned.value
+            else:
+                stack.append(call)
+                result = None
+        return result
+
+    def count_clauses(self, clauses: List[Tuple[int, ...]]) -> Iterator:
+        """
+        Count the models of some clauses: unit propagation, then the product of their component counts.
+
+        :param clauses: The clauses, as sorted tuples of signed symbol ids.
+        :return: The number of models over the symbols occurring in the clauses, once the generator is run by count.
+        """
+        symbol_count = len(ModelCounter.symbols_of(clauses))
+
+        # Unit propagation
+        assigned = 0
+        while True:
+            unit = next((clause[0] for clause in clauses if len(clause) == 1), None)
+            if unit is None:
+                break
+            assigned += 1
+            reduced = []
+            for clause in clauses:
+                if unit in clause:
+                    continue
+                if -unit in clause:
+                    clause = tuple(literal for literal in clause if literal != -unit)
+                    if not clause:
+                        return 0
+                reduced.append(clause)
+            clauses = reduced
+
+        # Symbols that dropped out with satisfied clauses are free
+        total = 1 << (symbol_count - assigned - len(ModelCounter.symbols_of(clauses)))
+        for component in ModelCounter.components(clauses):
+            total *= yield self.count_component(component)
+            if total == 0:
+                return 0
+        return total
+
+    @staticmethod
+    def components(clauses: List[Tuple[int, ...]]) -> List[List[Tuple[int, ...]]]:
+        """
+        Split clauses into connected components, two clauses being connected when they share a symbol.
+
+        :param clauses: The clauses to split.
+        :return: The components, each a list of clauses.
+        """
+        # Occurrences stored as { symbol id: [clause indices] }
+        occurrences: Dict[int, List[int]] = {}
+        for index, clause in enumerate(clauses):
+            for literal in clause:
+                occurrences.setdefault(abs(literal), []).append(index)
+
+        visited = [False] * len(clauses)
+        components = []
+        for start in range(len(clauses)):
+            if visited[start]:
+                continue
+            visited[start] = True
+            stack = [start]
+            component = []
+            while stack:
+                index = stack.pop()
+                component.append(clauses[index])
+                for literal in clauses[index]:
+                    for other in occurrences.pop(abs(literal), ()):
+                        if not visited[other]:
+                            visited[other] = True
+                            stack.append(other)
+            components.append(component)
+        return components
+
+    def count_component(self, clauses: List[Tuple[int, ...]]) -> Iterator:
+        """
+        Count the models of a connected component, branching on its most frequent symbol.
+
+        :param clauses: The clauses of the component.
+        :return: The number of models over the symbols of the component, once the generator is run by count.
+        """
+        key = frozenset(clauses)
+        cached = self.component_cache.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            self.component_cache.move_to_end(key)
+            return cached
+
+        frequency: Dict[int, int] = {}
+        for clause in clauses:
+            for literal in clause:
+                frequency[abs(literal)] = frequency.get(abs(literal), 0) + 1
+        symbol = max(frequency, key=frequency.get)
+
+        result = (yield self.count_clauses(clauses + [(symbol,)])) + (yield self.count_clauses(clauses + [(-symbol,)]))
+
+        self.component_cache[key] = result
+        if len(self.component_cache) > ModelCounter.CACHE_SIZE:
+            self.component_cache.popitem(last=False)
+        return result
+
+    def infer(self) -> None:
+        """
+        Count the models of KB and of KB & query, and print the TruthTable answer.
+        """
+        kb_models = self.count_models(self.kb)
+        valid_cases = self.count_models(self.kb + self.query)
+
+        # A model of the KB where the query fails exists iff the two counts differ
+        if kb_models != valid_cases:
+            print("NO")
+        else:
+            print(f"YES: {valid_cases}")
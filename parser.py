@@ -50,6 +50,25 @@ class Parser:
                 count -= 1
         return -1
 
+    @staticmethod
+    def match_parentheses(sentence: list[str]) -> list[int]:
+        """
+        Find the matching parenthesis of every parenthesis in one pass.
+
+        :param sentence: The list of tokens representing the sentence.
+        :return: A list where each parenthesis index holds the index of its match, and every other index holds -1.
+        """
+        matches = [-1] * len(sentence)
+        opened = []
+        for i in range(len(sentence)):
+            if sentence[i] == '(':
+                opened.append(i)
+            elif sentence[i] == ')' and opened:
+                start = opened.pop()
+                matches[start] = i
+                matches[i] = start
+        return matches
+
     @staticmethod
     def add_parentheses_if_needed(clause: list[str]) -> list[str]:
         """
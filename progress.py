@@ -0,0 +1,117 @@
+import sys
+import time
+from typing import Dict, Optional, TextIO
+
+class BudgetExceeded(Exception):
+    """Raised by Progress.advance once the time or assignment budget runs out."""
+
+
+class Progress:
+    """
+    Progress, throughput and budget tracking for a long enumeration.
+
+    The enumeration calls advance with the number of assignments it has just
+    covered. Every CHECK_EVERY assignments the clock is read: a report with
+    the covered fraction, the assignments per second and the ETA is written
+    to the stream once per interval, and BudgetExceeded is raised when the
+    wall-clock or assignment budget is spent. Reading the clock only every
+    few thousand assignments keeps the tracking cost negligible.
+    """
+    # Number of assignments covered between two clock readings
+    CHECK_EVERY = 4096
+
+    def __init__(self, interval: Optional[float] = None, time_budget: Optional[float] = None,
+                 assignment_budget: Optional[int] = None, stream: TextIO = None):
+        """
+        Initialize the tracker.
+
+        :param interval: The seconds between two progress reports, or None for no reports.
+        :param time_budget: The wall-clock seconds allowed, or None for no limit.
+        :param assignment_budget: The number of assignments allowed, or None for no limit.
+        :param stream: The stream receiving the reports, stderr by default.
+        """
+        self.interval = interval
+        self.time_budget = time_budget
+        self.assignment_budget = assignment_budget
+        self.stream = stream
+        self.start(0)
+
+    def start(self, total: int) -> None:
+        """
+        Reset the tracker and start the clock.
+
+        :param total: The number of assignments in the whole space.
+        """
+        self.total = total
+        self.covered = 0
+        self.exhausted: Optional[str] = None
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.next_report = self.started + self.interval if self.interval is not None else None
+        self.next_check = self.check_point()
+
+    def check_point(self) -> int:
+        """Return the covered count at which the clock and budgets are checked next."""
+        point = self.covered + Progress.CHECK_EVERY
+        if self.assignment_budget is not None:
+            point = min(point, self.assignment_budget)
+        return point
+
+    def advance(self, count: int = 1) -> None:
+        """
+        Record covered assignments.
+
+        :param count: The number of assignments just covered.
+        :raises BudgetExceeded: When the time or assignment budget is spent.
+        """
+        self.covered += count
+        if self.covered >= self.next_check:
+            self.check()
+
+    def check(self) -> None:
+        """
+        Report if the interval elapsed and enforce the budgets.
+
+        :raises BudgetExceeded: When the time or assignment budget is spent.
+        """
+        now = time.monotonic()
+        self.next_check = self.check_point()
+        if self.next_report is not None and now >= self.next_report:
+            self.report()
+            self.next_report = now + self.interval
+
+        if self.assignment_budget is not None and self.covered >= self.assignment_budget < self.total:
+            self.exhausted = "assignments"
+        elif self.time_budget is not None and now - self.started >= self.time_budget:
+            self.exhausted = "time"
+        if self.exhausted:
+            raise BudgetExceeded(self.exhausted)
+
+    def finish(self) -> None:
+        """Stop the clock, so later statistics describe the finished run."""
+        self.finished = time.monotonic()
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Return the current statistics.
+
+        :return: The covered and total assignments, the covered fraction, the elapsed seconds,
+                 the assignments per second, the estimated seconds left and the exhausted budget, if any.
+        """
+        elapsed = (self.finished or time.monotonic()) - self.started
+        rate = self.covered / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.covered, 0)
+        return {
+            "assignments": self.covered,
+            "total": self.total,
+            "covered": f"{self.covered / self.total:.2%}" if self.total else "100.00%",
+            "elapsed": f"{elapsed:.2f}s",
+            "rate": f"{rate:.0f}/s",
+            "eta": f"{remaining / rate:.1f}s" if rate else "unknown",
+            "budget_exhausted": self.exhausted or "no",
+        }
+
+    def report(self) -> None:
+        """Write the current statistics as one line."""
+        stats = self.stats()
+        print(", ".join(f"{name}: {value}" for name, value in stats.items()), file=self.stream or sys.stderr)
@@ -1,103 +1,53 @@
-from itertools import groupby
-from typing import List, Tuple
-from parser import Parser
-from converter import CNFConverter
+from typing import List, Union
+from cnfCache import CNFCache
+from simplifier import ClauseSimplifier
+from knowledgeBase import KnowledgeBase
 
 class Resolution:
-    def __init__(self, filename: str):
-        """
-        Initialize the TruthTable with literals, knowledge base, and query.
-
-        :param filename: The file containing the knowledge base and query.
-        """
-        self.literals = set()
-        self.kb = []
-        self.query = []
-
-        self.parse(filename)
-
-    def extract_expression(self, expressions: str) -> List[str]:
-        """
-        Extract all expressions inside the whole expressions.
-
-        :param expressions: The string containing multiple expressions.
-        :return: A list of individual expressions.
-        """
-        expressions = expressions.split(";")
-        expressions = [item.strip() for item in expressions if item.strip()]
-
-        return expressions
-
-    def extract_knowledge_base(self, knowledge_base: str) -> None:
-        """
-        Extract and process the knowledge base from the given string.
-
-        :param knowledge_base: The string containing the knowledge base.
-        :return: None
-        """
-        knowledge_base = self.extract_expression(knowledge_base)
-
-        for expression in knowledge_base:
-            # Turn expression into a list of strings
-            expression = Parser.find_all_words(expression)
-            expression = CNFConverter.convert_sentence(expression)
-            [self.literals.add(item) for item in Parser.extract_literals(expression)]
-            expression = [list(group) for key, group in groupby(expression, lambda x: x == '&') if not key]
-
-            for clause in expression:
-                self.kb.append(Parser.extract_literals_with_signed(clause))
-
-    def extract_query(self, query: str) -> None:
-        """
-        Extract and process the query from the given string.
-
-        :param query: The string containing the query.
-        :return: None
-        """
-        # Extract query
-        query = self.extract_expression(query)[0]
-        query = Parser.find_all_words(query)
-        query = CNFConverter.convert_sentence(query)
-        query = Parser.add_parentheses_if_needed(query)
-        query = CNFConverter.move_negations_inwards(["~"] + query)
-        query = CNFConverter.convert_sentence(query)
-
-        # Convert each single query into a group of AND clauses
-        query = [list(group) for key, group in groupby(query, lambda x: x == '&') if not key]
-
-        # Store converted expression into total knowledge base
-        for clause in query:
-            self.query.append(Parser.extract_literals_with_signed(clause))
-
-    def parse(self, filename: str) -> None:
-        """
-        Parse the file to extract literals, knowledge base, and query.
-
-        :param filename: The file containing the knowledge base and query.
-        :return: None
-        """
-        with open(filename, 'r') as f:
-            file_content = f.readlines()
-            kb_sentences = file_content[1]
-            query_sentence = file_content[3]
-            self.extract_knowledge_base(kb_sentences)
-            self.extract_query(query_sentence)
-
-    def complement_literal_exist(self, literal: List[int], clause: List[List[int]]) -> int:
+    def __init__(self, filename: Union[str, KnowledgeBase], cnf_mode: str = "standard", cache: CNFCache = None,
+                 workers: int = 1, simplify: bool = False):
+        """
+        Initialize the Resolution with literals, knowledge base, and query.
+
+        :param filename: The file containing the knowledge base and query, or an already compiled KnowledgeBase.
+        :param cnf_mode: "standard" for distributive CNF, "tseitin" for definitional CNF.
+        :param cache: The cache reused for standard CNF conversions, or None for a private one.
+        :param workers: The number of processes converting TELL sentences to standard CNF.
+        :param simplify: Whether to clean up the knowledge base clauses with ClauseSimplifier first.
+        """
+        if isinstance(filename, KnowledgeBase):
+            self.knowledge_base = filename
+        else:
+            # Refutation only needs equisatisfiable clauses, so one-sided definitions suffice
+            self.knowledge_base = KnowledgeBase.from_file(filename, cnf_mode=cnf_mode, cache=cache, plaisted_greenbaum=True,
+                                                          workers=workers)
+
+        self.literals = self.knowledge_base.original_symbols()
+        # The shared knowledge base is left untouched, only this engine sees the simplified clauses
+        clauses = self.knowledge_base.clauses
+        self.simplification = None
+        if simplify:
+            simplifier = ClauseSimplifier()
+            clauses = simplifier.simplify(clauses)
+            self.simplification = simplifier.stats
+        self.kb = clauses.to_lists()
+        self.query = self.knowledge_base.negated_query.to_lists()
+
+    def complement_literal_exist(self, literal: int, clause: List[int]) -> int:
         """
         Check if the complement of a literal exists in a clause.
 
-        :param literal: The literal to check.
+        :param literal: The literal to check, as a signed symbol id.
         :param clause: The clause to check against.
         :return: The index of the complement literal if it exists, otherwise -1.
         """
         for i in range(len(clause)):
-            if literal[0] == clause[i][0] and literal[1] != clause[i][1]:
+            if clause[i] == -literal:
                 return i
             
         return -1
     
-    def verify_converted_clause(self, clause: List[Tuple[str, bool]]) -> List[Tuple[str, bool]]:
+    def verify_converted_clause(self, clause: List[int]) -> List[int]:
         """
         Verify and simplify a clause:
             - Remove duplicates of the same sign (keep only one).
@@ -107,22 +57,23 @@ class Resolution:
         :return: The simplified clause.
         """
         literal_sign_map = {}
-        for literal, sign in clause:
-            if literal in literal_sign_map:
-                if literal_sign_map[literal] != sign:
+        for literal in clause:
+            symbol = abs(literal)
+            if symbol in literal_sign_map:
+                if literal_sign_map[symbol] != literal:
                     # Conflicting signs found; remove the literal entirely
-                    literal_sign_map.pop(literal)
+                    literal_sign_map.pop(symbol)
                 # Otherwise, it is a duplicate with the same sign; do nothing
             else:
                 # Add the literal and its sign to the map
-                literal_sign_map[literal] = sign
+                literal_sign_map[symbol] = literal
 
-        # Return the simplified clause as a list of tuples
-        return [(literal, sign) for literal, sign in literal_sign_map.items()]
+        # Return the simplified clause as a list of signed literals
+        return list(literal_sign_map.values())
 
 
     
-    def resolve(self, clause: List[Tuple[int, int]], kb: List[List[Tuple[int, int]]]) -> bool:
+    def resolve(self, clause: List[int], kb: List[List[int]]) -> bool:
         """
         Resolve a clause against the knowledge base.
 
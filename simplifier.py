@@ -0,0 +1,122 @@
+from array import array
+from typing import Dict, List
+from knowledgeBase import ClauseDatabase
+
+class ClauseSimplifier:
+    """
+    Equivalence-preserving cleanup of a clause database before solving.
+
+    Removes, in order:
+        - duplicate literals inside a clause,
+        - tautologies (clauses holding a literal and its complement),
+        - duplicate clauses,
+        - subsumed clauses (clauses that are a superset of another clause).
+    Subsumption uses 64-bit clause signatures to reject most candidates
+    cheaply and one-watched-literal occurrence lists, so each kept clause is
+    compared only against clauses sharing its watched literal. Surviving
+    clauses keep their original order.
+    """
+    def __init__(self):
+        self.stats: Dict[str, int] = {
+            "tautologies": 0,
+            "duplicate_literals": 0,
+            "duplicate_clauses": 0,
+            "subsumed_clauses": 0,
+            "clauses_removed": 0,
+            "literals_removed": 0,
+        }
+
+    @staticmethod
+    def signature(clause: List[int]) -> int:
+        """Return the 64-bit signature of a clause: one bit per literal, hashed by value."""
+        signature = 0
+        for literal in clause:
+            signature |= 1 << (literal % 64)
+        return signature
+
+    def simplify(self, database: ClauseDatabase) -> ClauseDatabase:
+        """
+        Simplify a clause database.
+
+        :param database: The clauses to simplify; it is left unchanged.
+        :return: A new database holding the surviving clauses.
+        """
+        stats = self.stats
+        clauses: List[List[int]] = []
+        seen = set()
+
+        for clause in database:
+            # dict.fromkeys keeps the first occurrence of each literal in order
+            literals = list(dict.fromkeys(clause))
+            stats["duplicate_literals"] += len(clause) - len(literals)
+            stats["literals_removed"] += len(clause) - len(literals)
+
+            present = set(literals)
+            if any(-literal in present for literal in literals):
+                stats["tautologies"] += 1
+                stats["clauses_removed"] += 1
+                stats["literals_removed"] += len(literals)
+                continue
+
+            key = frozenset(present)
+            if key in seen:
+                stats["duplicate_clauses"] += 1
+                stats["clauses_removed"] += 1
+                stats["literals_removed"] += len(literals)
+                continue
+            seen.add(key)
+            clauses.append(literals)
+
+        kept = self.remove_subsumed(clauses)
+
+        result = ClauseDatabase()
+        for index, clause in enumerate(clauses):
+            if kept[index]:
+                result.add(clause)
+        return result
+
+    def remove_subsumed(self, clauses: List[List[int]]) -> List[bool]:
+        """
+        Find the clauses subsumed by another clause.
+
+        Clauses are visited from shortest to longest, so a clause is only
+        checked against the shorter or equally long clauses kept before it.
+
+        :param clauses: Clauses without duplicate literals and without duplicates of each other.
+        :return: For each clause, whether it is kept.
+        """
+        kept = [True] * len(clauses)
+        signatures = array('Q', (ClauseSimplifier.signature(clause) for clause in clauses))
+        # Occurrence lists stored as { literal: [indices of kept clauses watching it] }
+        occurrences: Dict[int, List[int]] = {}
+        members: Dict[int, set] = {}
+
+        for index in sorted(range(len(clauses)), key=lambda i: len(clauses[i])):
+            clause = clauses[index]
+            signature = signatures[index]
+            present = set(clause)
+
+            subsumed = False
+            for literal in clause:
+                for other in occurrences.get(literal, ()):
+                    # A subsuming clause cannot have a signature bit this clause lacks
+                    if signatures[other] & ~signature == 0 and members[other] <= present:
+                        subsumed = True
+                        break
+                if subsumed:
+                    break
+
+            if subsumed:
+                kept[index] = False
+                self.stats["subsumed_clauses"] += 1
+                self.stats["clauses_removed"] += 1
+                self.stats["literals_removed"] += len(clause)
+                continue
+
+            # Watch the literal with the shortest occurrence list to keep the lists balanced
+            watch = min(clause, key=lambda literal: len(occurrences.get(literal, ())), default=None)
+            if watch is not None:
+                occurrences.setdefault(watch, []).append(index)
+                members[index] = present
+
+        return kept
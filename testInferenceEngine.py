@@ -1,13 +1,33 @@
+import os
+import sys
+import json
+import gzip
+import inspect
+import lzma
+import random
+import tempfile
 import unittest
+from array import array
 from unittest.mock import patch
 from io import StringIO
 from parser import Parser
-from converter import CNFConverter
+from converter import CNFConverter, TseitinEncoder
+from formula import Formula, FormulaParser
+from cnfCache import CNFCache
+from knowledgeBase import ClauseDatabase, KnowledgeBase
+from simplifier import ClauseSimplifier
+from kbReader import KBReader
+from lexer import Lexer, SymbolTable
 from forwardChaining import ForwardChaining
+from bitsetForwardChaining import BitsetForwardChaining
 from backwardChaining import BackwardChaining
 from resolution import Resolution
 from dpll import DPLL
+from modelCounter import ModelCounter
+from approxCounter import ApproxCounter
+from bdd import BDD
 from truthTable import TruthTable
+from progress import Progress
 
 
 class TestMapSolver(unittest.TestCase):
@@ -293,6 +313,29 @@ class TestMapSolver(unittest.TestCase):
         self.assertEqual(output_4, expected_output_4)
         self.assertEqual(output_5, expected_output_5)
 
+    def test_move_negations_inwards_nested(self):
+        cases = [
+            ("~(A || (B & ~C)) || D", ['(', '~', 'A', '&', '(', '~', 'B', '||', 'C', ')', ')', '||', 'D']),
+            ("~~(a & b)", ['(', 'a', '&', 'b', ')']),
+            ("~(~(a || b) & c)", ['(', 'a', '||', 'b', ')', '||', '~', 'c']),
+        ]
+        for sentence, expected_output in cases:
+            output = CNFConverter.move_negations_inwards(Parser.find_all_words(sentence))
+            self.assertEqual(output, expected_output)
+
+    def test_move_negations_inwards_deepNesting(self):
+        # Nested deeper than the recursion limit: ~(a1499 & ~(a1498 & ... ~(a1 & a0)))
+        sentence, positive, negative = "a0", "a0", "~ a0"
+        for i in range(1, 1500):
+            sentence = f"~(a{i} & {sentence})"
+            positive, negative = (f"~ a{i} || " + (f"( {negative} )" if i > 1 else negative),
+                                  f"a{i} & " + (f"( {positive} )" if i > 1 else positive))
+
+        output = CNFConverter.move_negations_inwards(Parser.find_all_words(sentence))
+        self.assertEqual(output, positive.split())
+        output = CNFConverter.apply_de_morgan(Parser.find_all_words(sentence))
+        self.assertEqual(output, f"( {negative} )".split())
+
     def test_distribute_or_over_and(self):
         clause_1 = Parser.find_all_words("a || (b & c)")
         clause_2 = Parser.find_all_words("(a & b) || c")
@@ -343,6 +386,224 @@ class TestMapSolver(unittest.TestCase):
         self.assertEqual(output_4, expected_output_4)
         self.assertEqual(output_5, expected_output_5)
 
+    # Test Formula Parser
+    def test_formulaParser_returnCorrectFormula(self):
+        output_1 = FormulaParser.parse("a & b || c => d")
+        output_2 = FormulaParser.parse("~(a || b) & c")
+        output_3 = FormulaParser.parse("a <=> b <=> c")
+
+        self.assertEqual(str(output_1), "((a & b) || c) => d")
+        self.assertEqual(str(output_2), "~(a || b) & c")
+        self.assertEqual(str(output_3), "a <=> (b <=> c)")
+
+    def test_formulaParser_sharesIdenticalSubtrees(self):
+        output_1 = FormulaParser.parse("(a & b) => c")
+        output_2 = FormulaParser.parse("c || (a & b)")
+
+        self.assertIs(output_1.args[0], output_2.args[1])
+        self.assertIs(output_1.args[1], Formula.symbol("c"))
+        self.assertRaises(ValueError, FormulaParser.parse, "(a & b")
+
+    def test_convert_formula(self):
+        cases = [
+            ("a", [[('a', False)]]),
+            ("(a => b) & c", [[('a', True), ('b', False)], [('c', False)]]),
+            ("~(A || (B & ~C)) || D", [[('A', True), ('D', False)], [('B', True), ('C', False), ('D', False)]]),
+            ("a <=> b", [[('a', True), ('b', False)], [('b', True), ('a', False)]]),
+        ]
+        for sentence, expected_output in cases:
+            output = CNFConverter.convert_formula(FormulaParser.parse(sentence))
+            self.assertEqual(output, expected_output)
+
+    def test_formulaParser_buildsLongChainsOnce(self):
+        # A chain of n conjuncts is joined once, instead of copying a growing conjunction n times
+        with patch.object(Formula, "_associative", wraps=Formula._associative) as associative:
+            formula = FormulaParser.parse(" & ".join(f"p{i}" for i in range(20000)) + " || q & r")
+        self.assertEqual(formula.op, Formula.OR)
+        self.assertEqual(len(formula.args[0].args), 20000)
+        self.assertEqual(sum(len(call.args[1]) for call in associative.call_args_list), 20000 + 2 + 2)
+
+    def test_convert_formula_deepNesting(self):
+        # Nested deeper than the recursion limit: ~(a1499 & ~(a1498 & ... ~(a1 & a0)))
+        sentence, positive, negative = "a0", "a0", "~a0"
+        for i in range(1, 1500):
+            sentence = f"~(a{i} & {sentence})"
+            if i == 300:
+                shallow = sentence
+            positive, negative = (f"~a{i} || " + (f"({negative})" if i > 1 else negative),
+                                  f"a{i} & " + (f"({positive})" if i > 1 else positive))
+        formula = FormulaParser.parse(sentence)
+
+        self.assertEqual(str(formula), sentence)
+        self.assertIs(FormulaParser.parse(str(formula)), formula)
+        self.assertEqual(str(CNFConverter.to_negation_normal_form(formula)), positive)
+        self.assertEqual(CNFConverter.convert_formula(FormulaParser.parse("~(" * 1500 + "a" + ")" * 1500)), [[('a', False)]])
+
+        # Distributive CNF grows quadratically with the depth, so the engines are checked at a smaller one
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.txt")
+            with open(path, "w") as f:
+                f.write(f"TELL\n{shallow};\nASK\na0\n")
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                DPLL(path).infer()
+            self.assertEqual(mock_stdout.getvalue().strip(), "NO")
+
+    def test_tseitinEncoder_returnDefinitionalClauses(self):
+        encoder = TseitinEncoder()
+        output = encoder.encode(FormulaParser.parse("a || (b & c)"))
+
+        self.assertEqual(encoder.definitions, {"_t1": ("&", [('b', False), ('c', False)])})
+        self.assertEqual(output, [
+            [('_t1', True), ('b', False)],
+            [('_t1', True), ('c', False)],
+            [('_t1', False), ('b', True), ('c', True)],
+            [('a', False), ('_t1', False)],
+        ])
+
+        # Subformulas nested deeper than the recursion limit are named without recursing
+        sentence = "a0"
+        for i in range(1, 1500):
+            sentence = f"~(a{i} & {sentence})"
+        encoder = TseitinEncoder()
+        output = encoder.encode(FormulaParser.parse(sentence))
+        self.assertEqual(len(encoder.definitions), 1498)
+        self.assertEqual(encoder.definitions["_t1"], ("||", [('a1', True), ('a0', True)]))
+        self.assertEqual(output[-1], [('a1499', True), ('_t1498', False)])
+
+    # Test CNF Cache
+    def test_cnfCache_reusesConversions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = CNFCache(directory=directory)
+            output_1 = cache.convert("(a => b) & c")
+            output_2 = cache.convert("(a=>b)&c")
+            output_3 = CNFCache(directory=directory).convert("(a => b) & c")
+            output_4 = cache.convert("a || b", negate=True)
+
+            self.assertEqual(output_1, [[('a', True), ('b', False)], [('c', False)]])
+            self.assertEqual(output_2, output_1)
+            self.assertEqual(output_3, output_1)
+            self.assertEqual(output_4, [[('a', True)], [('b', True)]])
+            self.assertEqual(cache.stats()["hits"], 1)
+            self.assertEqual(cache.stats()["misses"], 2)
+
+            small_cache = CNFCache(directory=directory, max_disk_bytes=80)
+            small_cache.convert("d => e")
+            self.assertLessEqual(small_cache.disk_bytes, 60)
+
+    # Test Knowledge Base
+    def test_knowledgeBase_compilesInternedClauses(self):
+        knowledge_base = KnowledgeBase.from_file("test_genericKB.txt", rules=True)
+        symbols = knowledge_base.symbols
+
+        self.assertEqual(symbols.names[1:], ['a', 'c', 'd', 'b', 'f', 'g'])
+        self.assertEqual(list(knowledge_base.clauses.offsets), [0, 3, 5, 7, 8, 10, 11, 13])
+        self.assertEqual(knowledge_base.clauses.to_lists()[0], [-1, -2, -3])
+        self.assertEqual(knowledge_base.query.to_lists(), [[3]])
+        self.assertEqual(knowledge_base.negated_query.to_lists(), [[-3]])
+        self.assertFalse(knowledge_base.horn)
+
+    def test_knowledgeBase_compilesHornRules(self):
+        knowledge_base = KnowledgeBase.from_file("test_case/test_Horn_Mix_2.txt", clauses=False, rules=True)
+        symbols = knowledge_base.symbols
+        x, y = symbols.ids['x'], symbols.ids['y']
+
+        self.assertTrue(knowledge_base.horn)
+        self.assertEqual(len(knowledge_base.clauses), 0)
+        self.assertEqual(knowledge_base.facts, {symbols.ids['a']: True, symbols.ids['b']: True, symbols.ids['c']: False})
+        self.assertEqual(list(knowledge_base.rules[knowledge_base.rule_index[x][0]]), [symbols.ids['a'], -symbols.ids['c'], x])
+        self.assertEqual(list(knowledge_base.rules[knowledge_base.rule_index[y][0]]), [symbols.ids['b'], y])
+        self.assertEqual(knowledge_base.query_literal, symbols.ids['v'])
+
+    def test_knowledgeBase_parallelConversionKeepsClauseOrder(self):
+        for file in [self.file_generic_2, self.file_res_3]:
+            serial = KnowledgeBase.from_file(file)
+            parallel = KnowledgeBase.from_file(file, workers=2)
+
+            self.assertEqual(parallel.symbols.names, serial.symbols.names)
+            self.assertEqual(parallel.clauses.literals, serial.clauses.literals)
+            self.assertEqual(parallel.clauses.offsets, serial.clauses.offsets)
+
+    def test_knowledgeBase_savesAndLoadsBinaryImage(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.ikb")
+            for file, cnf_mode in [(self.file_horn_9, "standard"), (self.file_generic_4, "tseitin")]:
+                knowledge_base = KnowledgeBase.from_file(file, cnf_mode=cnf_mode, clauses=True, rules=True)
+                knowledge_base.save(path)
+                output = KnowledgeBase.from_file(path)
+
+                self.assertEqual(output.symbols.names, knowledge_base.symbols.names)
+                self.assertEqual(output.clauses.to_lists(), knowledge_base.clauses.to_lists())
+                self.assertEqual(output.negated_query.to_lists(), knowledge_base.negated_query.to_lists())
+                self.assertEqual(output.rules.to_lists(), knowledge_base.rules.to_lists())
+                self.assertEqual(output.rule_index, knowledge_base.rule_index)
+                self.assertEqual(output.facts, knowledge_base.facts)
+                self.assertEqual(output.definitions, knowledge_base.definitions)
+                self.assertEqual((output.query_sentence, output.query_literal, output.horn),
+                                 (knowledge_base.query_sentence, knowledge_base.query_literal, knowledge_base.horn))
+
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                TruthTable(path).infer()
+            self.assertEqual(mock_stdout.getvalue().strip(), "YES: 7")
+
+    def test_clauseSimplifier_removesRedundantClauses(self):
+        database = ClauseDatabase()
+        for clause in [[1, 2, 1], [3, -3], [2, 1], [1, 2, 4], [-4], [5, -4, 6], [4, 5]]:
+            database.add(clause)
+
+        simplifier = ClauseSimplifier()
+        output = simplifier.simplify(database)
+
+        self.assertEqual(output.to_lists(), [[1, 2], [-4], [4, 5]])
+        self.assertEqual(simplifier.stats, {
+            "tautologies": 1,
+            "duplicate_literals": 1,
+            "duplicate_clauses": 1,
+            "subsumed_clauses": 2,
+            "clauses_removed": 4,
+            "literals_removed": 11,
+        })
+
+        cases = [(self.file_horn_1, "YES: 3", "YES"), (self.file_res_1, "NO", "NO")]
+        for file, expected_output, expected_refutation in cases:
+            for engine, expected in [(TruthTable, expected_output), (Resolution, expected_refutation), (DPLL, expected_refutation)]:
+                with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                    engine(file, simplify=True).infer()
+                self.assertEqual(mock_stdout.getvalue().strip(), expected)
+
+    # Test KB Reader
+    def test_kbReader_streamsWrappedAndCompressedSentences(self):
+        content = "TELL\na => b;\nb &\n c => d; a;\nc\nASK\nd; ~a\n"
+        expected_output = [("TELL", "a => b"), ("TELL", "b &\n c => d"), ("TELL", "a"), ("TELL", "c"), ("ASK", "d"), ("ASK", "~a")]
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name, opener in [("kb.txt", open), ("kb.txt.gz", gzip.open), ("kb.txt.xz", lzma.open)]:
+                path = os.path.join(directory, name)
+                with opener(path, "wt") as f:
+                    f.write(content)
+
+                for chunk_size in [1, 3, KBReader.CHUNK_SIZE]:
+                    output = list(KBReader(path, chunk_size).sentences())
+                    self.assertEqual(output, expected_output)
+
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                TruthTable(os.path.join(directory, "kb.txt.xz")).infer()
+            self.assertEqual(mock_stdout.getvalue().strip(), "YES: 1")
+
+    def test_lexer_tokenizesBlockIntoArrays(self):
+        symbols = SymbolTable()
+        stream = Lexer(symbols).tokenize("a => b; ~(b || c)", 10)
+
+        self.assertEqual(list(stream.kinds), [Lexer.SYMBOL, Lexer.IMPLIES, Lexer.SYMBOL, Lexer.SEPARATOR, Lexer.NOT,
+                                              Lexer.LEFT_PARENTHESIS, Lexer.SYMBOL, Lexer.OR, Lexer.SYMBOL, Lexer.RIGHT_PARENTHESIS])
+        self.assertEqual(list(stream.symbols), [1, 0, 2, 0, 0, 0, 2, 0, 3, 0])
+        self.assertEqual(list(stream.offsets), [10, 12, 15, 16, 18, 19, 20, 22, 25, 26])
+
+        output = list(FormulaParser.parse_stream(stream, symbols))
+        self.assertEqual(output, [FormulaParser.parse("a => b"), FormulaParser.parse("~(b || c)")])
+
+        with self.assertRaisesRegex(ValueError, "offset 5"):
+            list(FormulaParser.parse_stream(Lexer(symbols).tokenize("a; b ) c"), symbols))
+
     # Test Truth Table
     def test_truth_table(self):
         cases = [
@@ -364,11 +625,185 @@ class TestMapSolver(unittest.TestCase):
             (self.file_res_4, "NO"),
         ]
         for file, expected_output in cases:
+            for cnf_mode in ["standard", "tseitin"]:
+                for mode in TruthTable.MODES:
+                    # Small blocks so the bit-parallel mode also enumerates across blocks
+                    with patch('sys.stdout', new_callable=StringIO) as mock_stdout, patch.object(TruthTable, "BLOCK_BITS", 2):
+                        TruthTable(file, cnf_mode=cnf_mode, mode=mode).infer()
+                        output = mock_stdout.getvalue().strip()
+                    self.assertEqual(output, expected_output)
+
+        # The shard pool size is its own option, independent of the CNF conversion workers
+        for tt_workers in [1, 2]:
             with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
-                TruthTable(file).infer()
+                TruthTable(self.file_horn_2, mode="sharded", tt_workers=tt_workers).infer()
+            self.assertEqual(mock_stdout.getvalue().strip(), "YES: 14")
+        self.assertRaises(ValueError, TruthTable, self.file_horn_2, mode="sharded", tt_workers=0)
+
+    def test_truthTable_cachesGeneratedEvaluatorPerKB(self):
+        engine_1 = TruthTable(self.file_generic_2, mode="compiled")
+        engine_2 = TruthTable(self.file_generic_2, mode="compiled")
+        self.assertEqual(engine_1.evaluator_key(), engine_2.evaluator_key())
+        self.assertNotEqual(engine_1.evaluator_key(), TruthTable(self.file_generic_3, mode="compiled").evaluator_key())
+
+        with patch('sys.stdout', new_callable=StringIO):
+            engine_1.infer()
+        evaluator = TruthTable.evaluators[engine_1.evaluator_key()]
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            engine_2.infer()
+        self.assertIs(TruthTable.evaluators[engine_2.evaluator_key()], evaluator)
+        self.assertEqual(mock_stdout.getvalue().strip(), "YES: 9")
+
+        # Field boundaries are part of the key: symbols [1, 2] with clause (3) differ from symbols [1] with clause (2 | 3)
+        engine_1.literals, engine_1.kb = [1, 2], ClauseDatabase(array('i', [3]), array('q', [0, 1]))
+        engine_2.literals, engine_2.kb = [1], ClauseDatabase(array('i', [2, 3]), array('q', [0, 1]))
+        self.assertNotEqual(engine_1.evaluator_key(), engine_2.evaluator_key())
+
+        # Only the most recently used evaluators are kept
+        with patch.object(TruthTable, "EVALUATOR_CAPACITY", 1), patch('sys.stdout', new_callable=StringIO):
+            engine_3 = TruthTable(self.file_generic_3, mode="compiled")
+            engine_3.infer()
+        self.assertEqual(list(TruthTable.evaluators), [engine_3.evaluator_key()])
+
+    def test_truthTable_progressBudget(self):
+        for mode in TruthTable.MODES:
+            # Without a budget the answer is unchanged and the whole space is covered
+            progress = Progress(stream=StringIO())
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout, patch.object(TruthTable, "BLOCK_BITS", 2):
+                TruthTable(self.file_horn_2, mode=mode, progress=progress).infer()
+            self.assertEqual(mock_stdout.getvalue().strip(), "YES: 14")
+            self.assertEqual(progress.stats()["budget_exhausted"], "no")
+
+            progress = Progress(assignment_budget=4, stream=StringIO())
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout, patch.object(TruthTable, "BLOCK_BITS", 2):
+                TruthTable(self.file_horn_2, mode=mode, progress=progress).infer()
+            self.assertEqual(mock_stdout.getvalue().strip(), "UNKNOWN")
+            stats = progress.stats()
+            self.assertEqual(stats["budget_exhausted"], "assignments")
+            self.assertLess(stats["assignments"], stats["total"])
+
+        progress = Progress(interval=0, time_budget=0, stream=StringIO())
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            TruthTable(self.file_horn_2, progress=progress).infer()
+        self.assertEqual(mock_stdout.getvalue().strip(), "UNKNOWN")
+        self.assertIn("eta: ", progress.stream.getvalue())
+
+    # Test Model Counter
+    def test_model_counter(self):
+        cases = [
+            (self.file_horn_1, "YES: 3"),
+            (self.file_horn_2, "YES: 14"),
+            (self.file_generic_2, "YES: 9"),
+            (self.file_generic_4, "YES: 7"),
+            (self.file_generic_6, "NO"),
+            (self.file_res_1, "NO"),
+        ]
+        for file, expected_output in cases:
+            for cnf_mode in ["standard", "tseitin"]:
+                with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                    ModelCounter(file, cnf_mode=cnf_mode).infer()
+                    output = mock_stdout.getvalue().strip()
+                self.assertEqual(output, expected_output)
+
+        # Auxiliaries defined by a compound query do not double the KB count
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.txt")
+            with open(path, "w") as f:
+                f.write("TELL\na <=> (b || c); d;\nASK\n(a & d) || ~(b & c)\n")
+            for cnf_mode in ["standard", "tseitin"]:
+                counter = ModelCounter(path, cnf_mode=cnf_mode)
+                self.assertEqual(counter.count_models(counter.kb), 4)
+                with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                    counter.infer()
+                self.assertEqual(mock_stdout.getvalue().strip(), "YES: 4")
+
+        # Two independent halves are counted as separate components
+        counter = ModelCounter(self.file_horn_1)
+        self.assertEqual(counter.count([(1, 2), (3, 4)]), 9)
+        self.assertEqual(len(ModelCounter.components([(1, 2), (3, 4), (-2, 5)])), 2)
+
+    def test_approx_counter(self):
+        cases = [
+            (self.file_horn_2, "YES: 14"),
+            (self.file_generic_2, "YES: 9"),
+            (self.file_generic_6, "NO"),
+            (self.file_res_1, "NO"),
+        ]
+        for file, expected_output in cases:
+            # Counts below the threshold are exact
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                ApproxCounter(file, seed=0).infer()
                 output = mock_stdout.getvalue().strip()
             self.assertEqual(output, expected_output)
-    
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.txt")
+            with open(path, "w") as f:
+                f.write("TELL\n" + "; ".join(f"p{i} || q{i}" for i in range(6)) + ";\nASK\np0 || q0\n")
+            model_counter = ModelCounter(path)
+            exact = model_counter.count_models(model_counter.kb + model_counter.query)
+            counter = ApproxCounter(path, epsilon=0.8, delta=0.2, seed=1)
+            self.assertGreater(exact, counter.threshold)
+            estimate = counter.count()
+            self.assertLessEqual(exact / 1.8, estimate)
+            self.assertLessEqual(estimate, exact * 1.8)
+
+        # XOR constraints are propagated natively
+        counter = ApproxCounter(self.file_horn_1)
+        self.assertEqual(counter.bounded_count([], 1 << 20, [([1, 2], True)]), 1 << (len(counter.literals) - 1))
+        self.assertEqual(counter.bounded_count([[1]], 1 << 20, [([1], False)]), 0)
+
+    def test_bdd(self):
+        cases = [
+            (self.file_horn_1, "YES: 3"),
+            (self.file_horn_2, "YES: 14"),
+            (self.file_generic_2, "YES: 9"),
+            (self.file_generic_4, "YES: 7"),
+            (self.file_generic_6, "NO"),
+            (self.file_res_1, "NO"),
+        ]
+        for file, expected_output in cases:
+            for cnf_mode in ["standard", "tseitin"]:
+                with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                    BDD(file, cnf_mode=cnf_mode).infer()
+                    output = mock_stdout.getvalue().strip()
+                self.assertEqual(output, expected_output)
+
+        # The unique table makes equivalent functions the same node, even when the computed cache evicts
+        with patch.object(BDD, "CACHE_SIZE", 2):
+            bdd = BDD(self.file_generic_4)
+            a, b = (bdd.literal_node(symbol) for symbol in bdd.order[:2])
+            self.assertEqual(bdd.negate(bdd.conjoin(a, b)), bdd.disjoin(bdd.negate(a), bdd.negate(b)))
+            self.assertEqual(bdd.implies(a, b), bdd.compile([[-bdd.order[0], bdd.order[1]]]))
+            self.assertLessEqual(len(bdd.computed), 2)
+            self.assertEqual(bdd.count(bdd.disjoin(a, b)), 3 << (len(bdd.order) - 2))
+            self.assertTrue(bdd.entails(bdd.implies(bdd.kb, a)))
+
+    def test_counters_deepBranching(self):
+        # Each branching settles a few symbols of one chain, so the searches get as deep as the KB is wide
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.txt")
+            with open(path, "w") as f:
+                f.write("TELL\n" + "; ".join(f"x{i} || x{i + 1}" for i in range(399)) + ";\nASK\nx0 || x1\n")
+            knowledge_base = KnowledgeBase.from_file(path)
+        # A chain of n symbols has the Fibonacci number F(n + 2) of models
+        previous, models = 1, 2
+        for _ in range(399):
+            previous, models = models, previous + models
+
+        # Far below the depth of the searches, so only the explicit stacks let them finish
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(len(inspect.stack(0)) + 100)
+        try:
+            for engine in [ModelCounter, BDD]:
+                with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                    engine(knowledge_base).infer()
+                self.assertEqual(mock_stdout.getvalue().strip(), f"YES: {models}")
+            counter = ApproxCounter(knowledge_base)
+            self.assertGreaterEqual(counter.bounded_count(counter.clauses, 1), 1)
+        finally:
+            sys.setrecursionlimit(limit)
+
     # Test Forward Chaining
     def test_forward_chaining(self):
         cases = [
@@ -391,11 +826,228 @@ class TestMapSolver(unittest.TestCase):
             (self.file_horn_12, "NO"),
         ]
         for file, expected_output in cases:
-            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
-                ForwardChaining(file).infer()
-                output = mock_stdout.getvalue().strip()
-            self.assertEqual(output, expected_output)
+            for engine in [ForwardChaining, BitsetForwardChaining]:
+                with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                    engine(file).infer()
+                    output = mock_stdout.getvalue().strip()
+                self.assertEqual(output, expected_output)
+
+    def test_forward_chaining_scanOrder(self):
+        cases = [
+            # c becomes ready further down the scan that fires b, so it fires before d
+            ("a => b; b => c; a => d; a;", "d", "YES: a, b, c, d"),
+            # c comes before b in the scan, so it waits for the next one
+            ("b => c; a => b; a => d; a;", "c", "YES: a, b, d, c"),
+            # A derived symbol rules out the rules with it as a negated premise
+            ("a => b; ~b => c; a;", "c", "NO"),
+            ("~b => c; a => b; a;", "c", "YES: a, c"),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.txt")
+            for tell, ask, expected_output in cases:
+                with open(path, "w") as f:
+                    f.write(f"TELL\n{tell}\nASK\n{ask}\n")
+                for engine in [ForwardChaining, BitsetForwardChaining]:
+                    with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                        engine(path).infer()
+                        output = mock_stdout.getvalue().strip()
+                    self.assertEqual(output, expected_output)
     
+    def test_forward_chaining_csrMatchesCounters(self):
+        # A generated rule base large enough for long CSR rows, negated premises included
+        generator = random.Random(7)
+        rules = []
+        for conclusion in range(20, 3000):
+            for _ in range(generator.randint(1, 8)):
+                premises = [("~" if generator.random() < 0.1 else "") + f"p{generator.randrange(conclusion)}"
+                            for _ in range(generator.randint(1, 3))]
+                rules.append(f"{' & '.join(premises)} => p{conclusion}")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.txt")
+            with open(path, "w") as f:
+                f.write("TELL\n" + "; ".join([f"p{fact}" for fact in range(10)] + rules) + "\nASK\np0\n")
+            knowledge_base = KnowledgeBase.from_file(path, clauses=False, rules=True)
+
+            answers = []
+            for query in range(0, 3000, 199):
+                knowledge_base.query_literal = knowledge_base.symbols.intern(f"p{query}")
+                outputs = []
+                for engine in [ForwardChaining, BitsetForwardChaining]:
+                    with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                        engine(knowledge_base).infer()
+                    outputs.append(mock_stdout.getvalue().strip())
+                self.assertEqual(outputs[0], outputs[1])
+                answers.append(outputs[0] != "NO")
+            # Both answers occur, so the comparison is not vacuous
+            self.assertIn(True, answers)
+            self.assertIn(False, answers)
+
+    def test_forward_chaining_session(self):
+        session = ForwardChaining(KnowledgeBase(clauses=False, rules=True))
+        session.tell_rule(["a", "b"], "c")
+        session.tell_rule(["c"], "d")
+        session.tell_fact("a")
+        self.assertFalse(session.ask("d"))
+        self.assertFalse(session.ask("unknown"))
+
+        # Only the consequences of b are derived, the closure of a is kept
+        session.tell_fact("b")
+        self.assertTrue(session.ask("c"))
+        self.assertEqual([session.symbols.name(symbol) for symbol in session.entailments], ["a", "b", "c"])
+        self.assertTrue(session.ask("d"))
+
+        # A rule whose premises already hold fires when told
+        session.tell_rule(["d", "~e"], "f")
+        self.assertTrue(session.ask("f"))
+        session.tell_fact("e")
+        session.tell_rule(["a", "~e"], "g")
+        self.assertFalse(session.ask("g"))
+        # A told fact blocks the rules that fired with it as a negated premise, as in a new run
+        self.assertFalse(session.ask("f"))
+
+        session = ForwardChaining(KnowledgeBase(clauses=False, rules=True))
+        session.tell_rule(["a", "~b"], "c")
+        session.tell_rule(["c"], "d")
+        session.tell_fact("a")
+        self.assertTrue(session.ask("d"))
+        session.tell_fact("b")
+        self.assertFalse(session.ask("c"))
+        self.assertFalse(session.ask("d"))
+
+        # A session can also continue from a file
+        session = ForwardChaining(self.file_horn_5)
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            session.infer()
+        self.assertEqual(mock_stdout.getvalue().strip(), "NO")
+        session.tell_fact(session.symbols.name(abs(session.query)))
+        self.assertTrue(session.ask(session.symbols.name(abs(session.query))))
+
+        # and from a binary image, whose memory-mapped rules are copied when a rule is told
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.ikb")
+            KnowledgeBase.from_file(self.file_horn_1, clauses=False, rules=True).save(path)
+            session = ForwardChaining(path)
+            session.tell_rule(["d"], "e")
+            self.assertTrue(session.ask("e"))
+            self.assertEqual(len(session.knowledge_base.rules), len(KnowledgeBase.load(path).rules) + 1)
+
+    def test_forward_chaining_retraction(self):
+        session = ForwardChaining(KnowledgeBase(clauses=False, rules=True))
+        session.tell_rule(["a"], "c")
+        session.tell_rule(["b"], "c")
+        session.tell_rule(["c"], "d")
+        session.tell_rule(["a", "d"], "e")
+        session.tell_fact("a")
+        session.tell_fact("b")
+        self.assertTrue(session.ask("e"))
+
+        # c and d still follow from b, e only followed from a
+        session.retract_fact("a")
+        self.assertTrue(session.ask("d"))
+        self.assertFalse(session.ask("e"))
+
+        session.retract_fact("b")
+        self.assertFalse(session.ask("c"))
+        self.assertEqual(session.derived_facts, set())
+
+        # Retracting a premise of a negated rule lets it fire
+        session.tell_rule(["~b", "f"], "g")
+        session.tell_fact("b")
+        session.tell_fact("f")
+        self.assertFalse(session.ask("g"))
+        session.retract_fact("b")
+        self.assertTrue(session.ask("g"))
+
+        # Told and retracted facts block and unblock rules through their consequences, as in a new run
+        session = ForwardChaining(KnowledgeBase(clauses=False, rules=True))
+        session.tell_rule(["x"], "y")
+        session.tell_rule(["a", "~y"], "z")
+        session.tell_rule(["z"], "w")
+        session.tell_fact("a")
+        self.assertTrue(session.ask("w"))
+        session.tell_fact("x")
+        self.assertFalse(session.ask("z"))
+        self.assertFalse(session.ask("w"))
+        session.retract_fact("x")
+        self.assertTrue(session.ask("w"))
+
+        # A rule with only negated premises fires in a scan, so not once every fact is retracted
+        session.tell_rule(["~p"], "q")
+        self.assertTrue(session.ask("q"))
+        session.retract_fact("a")
+        self.assertFalse(session.ask("q"))
+        self.assertEqual(session.derived_facts, set())
+
+    def test_forward_chaining_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.txt")
+            with open(path, "w") as f:
+                f.write("TELL\na; a => b; b & a => c; c => d\nASK\nd\nb; x\n~a\n")
+            queries = os.path.join(directory, "queries.txt")
+            with open(queries, "w") as f:
+                f.write("c\n\nc || d\n")
+
+            FC = ForwardChaining(path)
+            FC.knowledge_base.read_queries(queries)
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                FC.infer_batch()
+            lines = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+
+            # A compiled image keeps every ASK sentence
+            image = os.path.join(directory, "kb.ikb")
+            knowledge_base = KnowledgeBase.from_file(path, clauses=True, rules=True)
+            knowledge_base.save(image)
+            self.assertEqual(KnowledgeBase.load(image).queries, knowledge_base.queries)
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                ForwardChaining(image).infer_batch()
+            image_lines = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+            self.assertEqual(image_lines, lines[:4])
+
+        self.assertEqual(lines, [
+            {"query": "d", "result": "YES", "derivation": ["a", "b", "c", "d"]},
+            {"query": "b", "result": "YES", "derivation": ["a", "b"]},
+            {"query": "x", "result": "NO"},
+            {"query": "~a", "result": "NO"},
+            {"query": "c", "result": "YES", "derivation": ["a", "b", "c"]},
+            {"query": "c || d", "result": "NO"},
+        ])
+
+    def test_relevance_slicing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.txt")
+            with open(path, "w") as f:
+                f.write("TELL\na; a => x; a => b; x => y; b => c; ~y => d\nASK\nc\n")
+
+            cases = [
+                (ForwardChaining, False, "YES: a, x, b, y, c"),
+                (ForwardChaining, True, "YES: a, b, c"),
+                (BitsetForwardChaining, True, "YES: a, b, c"),
+                (BackwardChaining, True, "YES: a, b, c"),
+            ]
+            for engine, relevance, expected_output in cases:
+                with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                    engine(path, relevance=relevance).infer()
+                self.assertEqual(mock_stdout.getvalue().strip(), expected_output)
+
+            knowledge_base = KnowledgeBase.from_file(path, clauses=False, rules=True)
+            _, rule_index, stats = knowledge_base.relevant_rules([knowledge_base.symbols.intern("d")])
+            # d depends on y through its negated premise
+            self.assertEqual([knowledge_base.symbols.name(symbol) for symbol in rule_index], ["x", "y", "d"])
+            self.assertEqual(stats, {"rules": 5, "relevant_rules": 3, "pruned_rules": 2, "symbols": 6, "relevant_symbols": 4})
+
+            # Sessions widen their slice to told rules and asked symbols outside the cone
+            with open(path, "w") as f:
+                f.write("TELL\na; a => b; c => d\nASK\nb\n")
+            session = ForwardChaining(path, relevance=True)
+            self.assertEqual(session.slicing["pruned_rules"], 1)
+            session.tell_rule(["b"], "q")
+            self.assertTrue(session.ask("q"))
+            session = ForwardChaining(path, relevance=True)
+            session.tell_rule(["d"], "q")
+            session.tell_fact("c")
+            self.assertTrue(session.ask("q"))
+            self.assertEqual(session.slicing["pruned_rules"], 0)
+
     # Test Backward Chaining
     def test_backward_chaining(self):
         cases = [
@@ -470,10 +1122,32 @@ class TestMapSolver(unittest.TestCase):
             (self.file_res_4, "NO"),
         ]
         for file, expected_output in cases:
+            for cnf_mode in ["standard", "tseitin"]:
+                with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                    DPLL(file, cnf_mode=cnf_mode).infer()
+                    output = mock_stdout.getvalue().strip()
+                self.assertEqual(output, expected_output)
+
+        # The negated query reuses the auxiliaries of the query, so it must carry their definitions too
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.txt")
+            with open(path, "w") as f:
+                f.write("TELL\n~a; ~b;\nASK\na <=> (b & c)\n")
+            for cnf_mode in ["standard", "tseitin"]:
+                outputs = []
+                for engine in [TruthTable(path, cnf_mode=cnf_mode), DPLL(path, cnf_mode=cnf_mode),
+                               ApproxCounter(path, cnf_mode=cnf_mode, seed=0)]:
+                    with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                        engine.infer()
+                    outputs.append(mock_stdout.getvalue().strip())
+                self.assertEqual(outputs, ["YES: 2", "YES", "YES: 2"])
+
+            # Distribution repeats literals, which unit propagation must not leave behind
+            with open(path, "w") as f:
+                f.write("TELL\nc; ~d; ~(d || d) & (d || ~b);\nASK\n~((~c <=> d) || (~b & c)) <=> ((~b <=> b) <=> ~(d & ~b))\n")
             with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
-                DPLL(file).infer()
-                output = mock_stdout.getvalue().strip()
-            self.assertEqual(output, expected_output)
+                DPLL(path).infer()
+            self.assertEqual(mock_stdout.getvalue().strip(), "YES")
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,22 +1,75 @@
-from itertools import groupby, product
-from typing import Generator, List, Dict
-from parser import Parser
-from converter import CNFConverter
+import os
+import hashlib
+import heapq
+import multiprocessing
+from array import array
+from collections import OrderedDict
+from itertools import product
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.synchronize import Event
+from typing import Callable, Dict, Generator, List, Optional, Sequence, Union
+from cnfCache import CNFCache
+from progress import BudgetExceeded, Progress
+from simplifier import ClauseSimplifier
+from knowledgeBase import ClauseDatabase, KnowledgeBase
 
 class TruthTable:
-    def __init__(self, filename: str):
+    # Enumeration strategies selectable with the mode parameter
+    MODES = ("enumerate", "bitparallel", "sharded", "gray", "prune", "compiled")
+    # Number of symbols enumerated inside one bit-parallel block, i.e. 2^18 assignments per block
+    BLOCK_BITS = 18
+    # The sharded mode makes about this many shards per worker process
+    SHARDS_PER_WORKER = 4
+    # Seconds the sharded mode waits for a shard before checking the progress budgets
+    PROGRESS_POLL = 0.1
+    # Number of generated model counters the compiled mode keeps
+    EVALUATOR_CAPACITY = 16
+    # Generated model counters of the compiled mode stored as { KB hash: function }, least recently used first
+    evaluators: OrderedDict[str, Callable[[], Optional[int]]] = OrderedDict()
+
+    def __init__(self, filename: Union[str, KnowledgeBase], cnf_mode: str = "standard", cache: CNFCache = None,
+                 workers: int = 1, simplify: bool = False, mode: str = "enumerate", progress: Progress = None,
+                 tt_workers: Optional[int] = None):
         """
         Initialize the TruthTable with literals, knowledge base, and query.
 
-        :param filename: The file containing the knowledge base and query.
+        :param filename: The file containing the knowledge base and query, or an already compiled KnowledgeBase.
+        :param cnf_mode: "standard" for distributive CNF, "tseitin" for definitional CNF.
+        :param cache: The cache reused for standard CNF conversions, or None for a private one.
+        :param workers: The number of processes converting TELL sentences to standard CNF.
+        :param simplify: Whether to clean up the knowledge base clauses with ClauseSimplifier first.
+        :param mode: The enumeration strategy, one of MODES.
+        :param progress: The tracker reporting progress and enforcing budgets, or None.
+        :param tt_workers: The number of processes counting shards in the sharded mode, or None for all cores.
         """
-        self.literals = set()
-        self.kb = []
-        self.query = []
+        if mode not in TruthTable.MODES:
+            raise ValueError(f"Unknown truth table mode: {mode}")
+        self.mode = mode
+        if tt_workers is not None and tt_workers < 1:
+            raise ValueError("tt_workers must be at least 1")
+        self.tt_workers = tt_workers
+        self.progress = progress
 
-        self.parse(filename)
-    
-    def evaluate_expression(self, expression: List[List[str]], assignment: Dict[str, bool]) -> bool:
+        if isinstance(filename, KnowledgeBase):
+            self.knowledge_base = filename
+        else:
+            self.knowledge_base = KnowledgeBase.from_file(filename, cnf_mode=cnf_mode, cache=cache, workers=workers)
+
+        # Auxiliary symbols are never enumerated, their values follow from their definitions
+        self.literals = self.knowledge_base.original_symbols()
+        self.definitions = self.knowledge_base.definitions
+        self.symbol_count = len(self.knowledge_base.symbols)
+        # The shared knowledge base is left untouched, only this engine sees the simplified clauses
+        clauses = self.knowledge_base.clauses
+        self.simplification = None
+        if simplify:
+            simplifier = ClauseSimplifier()
+            clauses = simplifier.simplify(clauses)
+            self.simplification = simplifier.stats
+        self.kb = clauses
+        self.query = self.knowledge_base.query
+
+    def evaluate_expression(self, expression: ClauseDatabase, assignment: List[bool]) -> bool:
         """
         Evaluate whether an expression is True or False.
         An expression contains clauses operated by AND.
@@ -24,7 +77,7 @@ class TruthTable:
         An expression is True when all clauses inside it are True.
 
         :param expression: The expression to evaluate.
-        :param assignment: The truth assignment for literals.
+        :param assignment: The truth assignment, indexed by symbol id.
         :return: True if the expression is True, False otherwise.
         """
         for clause in expression:
@@ -34,136 +87,582 @@ class TruthTable:
             
         return True
 
-    def evaluate_clause(self, clause: List[str], assignment: Dict[str, bool]) -> bool:
+    def evaluate_clause(self, clause: Sequence[int], assignment: List[bool]) -> bool:
         """
         Evaluate whether a clause is True or False.
         A clause contains literals operated by OR.
         Eg. a || ~b
         A clause is True when at least one literal is True.
 
-        :param clause: The clause to evaluate.
-        :param assignment: The truth assignment for literals.
+        :param clause: The clause to evaluate, as signed symbol ids.
+        :param assignment: The truth assignment, indexed by symbol id.
         :return: True if the clause is True, False otherwise.
         """
         for literal in clause:
-            if literal[1] == True:
-                literal_value = not assignment[literal[0]]
+            if literal < 0:
+                literal_value = not assignment[-literal]
             else:
-                literal_value = assignment[literal[0]]
+                literal_value = assignment[literal]
 
             if literal_value:
                 return True
             
         return False
     
-    def evaluate_kb(self, kb: List[List[List[str]]], assignment: Dict[str, bool]) -> bool:
+    def evaluate_kb(self, kb: ClauseDatabase, assignment: List[bool]) -> bool:
         """
         Evaluate whether the knowledge base (kb) is True or False.
-        A kb contains different expressions.
-        A kb is True when all expressions are True.
+        A kb is True when all of its clauses are True.
 
         :param kb: The knowledge base to evaluate.
-        :param assignment: The truth assignment for literals.
+        :param assignment: The truth assignment, indexed by symbol id.
         :return: True if the knowledge base is True, False otherwise.
         """
-        for expression in kb:
-            expression_value = self.evaluate_expression(expression, assignment)
-            if not expression_value:
-                return False
-            
-        return True
+        return self.evaluate_expression(kb, assignment)
 
-    def extract_expression(self, expressions: str) -> List[str]:
+    def generate_truth_assignments(self) -> Generator[List[bool], None, None]:
         """
-        Extract all expressions inside the whole expressions.
+        Generate all possible combinations of truth values for literals.
 
-        :param expressions: The string containing multiple expressions.
-        :return: A list of individual expressions.
+        :yield: A list representing a truth assignment, indexed by symbol id.
+                The same list is updated in place for every combination.
         """
-        expressions = expressions.split(";")
-        expressions = [item.strip() for item in expressions if item.strip()]
+        assignment = [False] * (self.symbol_count + 1)
+        for values in product([True, False], repeat=len(self.literals)):
+            for literal, value in zip(self.literals, values):
+                assignment[literal] = value
+            self.assign_definitions(assignment)
+            yield assignment
 
-        return expressions
+    def assign_definitions(self, assignment: List[bool]) -> None:
+        """
+        Extend an assignment with the values of the auxiliary symbols.
 
-    def extract_knowledge_base(self, knowledge_base: str) -> None:
+        :param assignment: The truth assignment for the original literals, updated in place.
         """
-        Extract and process the knowledge base from the given string.
+        for auxiliary, (operation, literals) in self.definitions.items():
+            values = (assignment[literal] if literal > 0 else not assignment[-literal] for literal in literals)
+            assignment[auxiliary] = all(values) if operation == "&" else any(values)
 
-        :param knowledge_base: The string containing the knowledge base.
+    def infer(self) -> None:
         """
-        knowledge_base = self.extract_expression(knowledge_base)
+        Run the truth table algorithm to determine if the knowledge base entails the query.
 
-        for expression in knowledge_base:
-            # Turn expression into a list of strings
-            expression = Parser.find_all_words(expression)
-            expression = CNFConverter.convert_sentence(expression)
-            [self.literals.add(item) for item in Parser.extract_literals(expression)]
-            expression = [list(group) for key, group in groupby(expression, lambda x: x == '&') if not key]
+        With a progress tracker, the answer is UNKNOWN when its budget runs out;
+        the partial statistics stay available from the tracker.
+        """
+        if self.progress is not None:
+            self.progress.start(1 << len(self.literals))
 
-            # Store converted expression into total knowledge base
-            knowledge_base_clause = []
-            for clause in expression:
-                knowledge_base_clause.append(Parser.extract_literals_with_signed(clause))
+        try:
+            if self.mode == "bitparallel":
+                self.infer_bitparallel()
+            elif self.mode == "sharded":
+                self.infer_sharded()
+            elif self.mode == "gray":
+                self.infer_gray()
+            elif self.mode == "prune":
+                self.infer_prune()
+            elif self.mode == "compiled":
+                self.infer_compiled()
+            else:
+                self.infer_enumerate()
+        except BudgetExceeded:
+            print("UNKNOWN")
+        finally:
+            if self.progress is not None:
+                self.progress.finish()
 
-            self.kb.append(knowledge_base_clause)
+    def infer_enumerate(self) -> None:
+        """
+        Run the truth table algorithm one assignment at a time.
+        """
+        advance = self.progress.advance if self.progress is not None else None
+        valid_cases = 0
+        for assignment in self.generate_truth_assignments():
+            if advance is not None:
+                advance()
+            kb_value = self.evaluate_kb(self.kb, assignment)  
+            query_value = self.evaluate_expression(self.query, assignment)
+            
+            if kb_value and query_value:
+                valid_cases += 1
 
-    def extract_query(self, query: str) -> None:
+            if kb_value and not query_value:
+                print("NO")
+                return
+        
+        print(f"YES: {valid_cases}") 
+
+    @staticmethod
+    def column_patterns(width_bits: int) -> List[int]:
         """
-        Extract and process the query from the given string.
+        Build the bit columns of the symbols enumerated inside a block.
+
+        Bit i of column j is bit j of i, so the columns together hold every
+        assignment of width_bits symbols, one assignment per bit position.
 
-        :param query: The string containing the query.
+        :param width_bits: The number of symbols enumerated inside the block.
+        :return: One column per symbol.
         """
-        # Extract query
-        query = self.extract_expression(query)[0]
-        query = Parser.find_all_words(query)
-        query = CNFConverter.convert_sentence(query)
-        query = [list(group) for key, group in groupby(query, lambda x: x == '&') if not key]
+        width = 1 << width_bits
+        full = (1 << width) - 1
+        patterns = []
+        for j in range(width_bits):
+            half = 1 << j
+            # Repeat 2^j zeros followed by 2^j ones across the whole block
+            unit = ((1 << half) - 1) << half
+            patterns.append(unit * (full // ((1 << (2 * half)) - 1)))
+        return patterns
 
-        # Store converted query
-        for clause in query:
-            self.query.append(Parser.extract_literals_with_signed(clause))
+    def evaluate_columns(self, expression: ClauseDatabase, columns: List[int], full: int) -> int:
+        """
+        Evaluate an expression over a whole block of assignments at once.
 
-    def parse(self, filename: str) -> None:
+        :param expression: The clauses to evaluate.
+        :param columns: The bit column of every symbol, indexed by symbol id.
+        :param full: The column with every assignment set.
+        :return: The column of the assignments satisfying every clause.
         """
-        Parse the file to extract literals, knowledge base, and query.
+        value = full
+        for clause in expression:
+            clause_value = 0
+            for literal in clause:
+                clause_value |= columns[literal] if literal > 0 else full ^ columns[-literal]
+            value &= clause_value
+            if not value:
+                return 0
+        return value
 
-        :param filename: The file containing the knowledge base and query.
+    def infer_bitparallel(self) -> None:
+        """
+        Run the truth table algorithm on blocks of assignments held as bit columns.
         """
-        with open(filename, 'r') as f:
-            file_content = f.readlines()
-            kb_sentences = file_content[1]
-            query_sentence = file_content[3]
-            self.extract_knowledge_base(kb_sentences)
-            self.extract_query(query_sentence)
+        valid_cases = self.count_models()
+        print("NO" if valid_cases is None else f"YES: {valid_cases}")
 
-            # for item in self.kb:
-            #     print(item)
+    def count_models(self, prefix: Sequence[int] = (), values: Sequence[bool] = (),
+                     cancelled: Callable[[], bool] = None) -> Optional[int]:
+        """
+        Count the models of the knowledge base, evaluating blocks of assignments as bit columns.
 
-    def generate_truth_assignments(self) -> Generator[Dict[str, bool], None, None]:
+        The prefix symbols are fixed to the given values. Of the other symbols,
+        the first BLOCK_BITS vary inside a block, each represented by an integer
+        whose bits are its values over the block; the rest are enumerated across
+        blocks. Clauses are evaluated with integer OR, AND and XOR over the
+        whole block, and models are counted with bit_count.
+
+        :param prefix: The symbols with a fixed value.
+        :param values: The values of the prefix symbols.
+        :param cancelled: Called before each block; enumeration stops when it returns True.
+        :return: The number of models where the query holds, or None if some model
+                 of the knowledge base falsifies the query or the enumeration was cancelled.
         """
-        Generate all possible combinations of truth values for literals.
+        fixed = set(prefix)
+        free = [literal for literal in self.literals if literal not in fixed]
+        inner = free[:TruthTable.BLOCK_BITS]
+        outer = free[TruthTable.BLOCK_BITS:]
+        full = (1 << (1 << len(inner))) - 1
+        columns = [0] * (self.symbol_count + 1)
+        for literal, value in zip(prefix, values):
+            columns[literal] = full if value else 0
+        for literal, pattern in zip(inner, TruthTable.column_patterns(len(inner))):
+            columns[literal] = pattern
+
+        valid_cases = 0
+        for outer_values in product([full, 0], repeat=len(outer)):
+            if cancelled is not None and cancelled():
+                return None
+            if self.progress is not None:
+                self.progress.advance(1 << len(inner))
+            for literal, value in zip(outer, outer_values):
+                columns[literal] = value
+            for auxiliary, (operation, literals) in self.definitions.items():
+                operands = (columns[literal] if literal > 0 else full ^ columns[-literal] for literal in literals)
+                if operation == "&":
+                    column = full
+                    for operand in operands:
+                        column &= operand
+                else:
+                    column = 0
+                    for operand in operands:
+                        column |= operand
+                columns[auxiliary] = column
+
+            kb_value = self.evaluate_columns(self.kb, columns, full)
+            if not kb_value:
+                continue
+            query_value = self.evaluate_columns(self.query, columns, full)
+
+            if kb_value & ~query_value:
+                return None
+            valid_cases += (kb_value & query_value).bit_count()
 
-        :yield: A dictionary representing a truth assignment.
+        return valid_cases
+
+    def __getstate__(self) -> dict:
+        """Keep only what count_models needs when the engine is sent to worker processes."""
+        state = self.__dict__.copy()
+        # The knowledge base holds the conversion cache and possibly a memory-mapped image
+        state["knowledge_base"] = None
+        state["progress"] = None
+        state["kb"] = ClauseDatabase(array('i', self.kb.literals), array('q', self.kb.offsets))
+        state["query"] = ClauseDatabase(array('i', self.query.literals), array('q', self.query.offsets))
+        return state
+
+    @staticmethod
+    def init_worker(engine: "TruthTable", prefix: List[int], cancel: Event) -> None:
         """
-        literals_list = list(self.literals)
-        for values in product([True, False], repeat=len(literals_list)):
-            assignment = {literal: value for literal, value in zip(literals_list, values)}
-            yield assignment
+        Set up a worker process of the sharded mode.
 
-    def infer(self) -> None:
+        :param engine: The engine whose models are counted.
+        :param prefix: The symbols fixed by each shard.
+        :param cancel: The event set once any shard finds a counterexample.
         """
-        Run the truth table algorithm to determine if the knowledge base entails the query.
+        # Forked workers share the parent's tracker otherwise, progress is tracked by the parent as shards complete
+        engine.progress = None
+        TruthTable.worker = (engine, prefix, cancel)
+
+    @staticmethod
+    def count_shard(values: Sequence[bool]) -> Optional[int]:
+        """
+        Count the models of one shard in a worker process.
+
+        :param values: The values of the prefix symbols selecting the shard.
+        :return: The number of models, or None on a counterexample or cancellation.
+        """
+        engine, prefix, cancel = TruthTable.worker
+        valid_cases = engine.count_models(prefix, values, cancel.is_set)
+        if valid_cases is None:
+            # Let the other workers stop at their next block
+            cancel.set()
+        return valid_cases
+
+    def infer_sharded(self) -> None:
+        """
+        Run the truth table algorithm on a process pool.
+
+        The assignment space is split into shards by fixing the last symbols,
+        a few shards per worker so that uneven shards balance out. Each shard
+        is counted with count_models and the counts are summed. A shared event
+        cancels all workers as soon as one shard finds a model of the knowledge
+        base where the query fails, or once the progress budget runs out;
+        progress advances by whole shards.
+        """
+        workers = self.tt_workers or os.cpu_count() or 1
+        prefix_length = min(len(self.literals), (workers * TruthTable.SHARDS_PER_WORKER - 1).bit_length())
+        prefix = self.literals[len(self.literals) - prefix_length:]
+
+        cancel = multiprocessing.Event()
+        with ProcessPoolExecutor(max_workers=workers, initializer=TruthTable.init_worker,
+                                 initargs=(self, prefix, cancel)) as executor:
+            futures = [executor.submit(TruthTable.count_shard, values)
+                       for values in product([True, False], repeat=prefix_length)]
+            shard_size = 1 << (len(self.literals) - prefix_length)
+            timeout = TruthTable.PROGRESS_POLL if self.progress is not None else None
+            pending = set(futures)
+            valid_cases = 0
+            try:
+                while pending:
+                    done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        count = future.result()
+                        if count is None:
+                            print("NO")
+                            return
+                        valid_cases += count
+                        if self.progress is not None:
+                            self.progress.advance(shard_size)
+                    if self.progress is not None:
+                        self.progress.check()
+            finally:
+                # Stops the running shards at their next block when leaving early
+                cancel.set()
+                for future in pending:
+                    future.cancel()
+
+        print(f"YES: {valid_cases}")
+
+    def infer_gray(self) -> None:
         """
+        Run the truth table algorithm in Gray-code order with incremental clause counters.
+
+        Consecutive assignments differ in one symbol. Every KB and query clause
+        keeps the number of its literals that are true, and occurrence lists map
+        each symbol to the clauses containing it, so a flip only updates those
+        clauses and the running counts of unsatisfied KB and query clauses.
+        Definitions of auxiliary symbols keep the same counters: a flip only
+        re-evaluates the definitions containing the flipped symbol, and an
+        auxiliary whose definition changed value is flipped in turn, children
+        before parents, so the change only propagates upwards through
+        auxiliaries whose value changed.
+        """
+        clauses = list(self.kb) + list(self.query)
+        kb_count = len(self.kb)
+        # Occurrence lists stored as [symbol id] -> [clause indices], one list per sign
+        positive: List[List[int]] = [[] for _ in range(self.symbol_count + 1)]
+        negative: List[List[int]] = [[] for _ in range(self.symbol_count + 1)]
+        for index, clause in enumerate(clauses):
+            for literal in clause:
+                if literal > 0:
+                    positive[literal].append(index)
+                else:
+                    negative[-literal].append(index)
+
+        # Definitions numbered children first, with occurrence lists stored as [symbol id] -> [definition numbers]
+        auxiliaries = list(self.definitions)
+        is_conjunction = [operation == "&" for operation, _ in self.definitions.values()]
+        sizes = [len(literals) for _, literals in self.definitions.values()]
+        definition_positive: List[List[int]] = [[] for _ in range(self.symbol_count + 1)]
+        definition_negative: List[List[int]] = [[] for _ in range(self.symbol_count + 1)]
+        for number, (_, literals) in enumerate(self.definitions.values()):
+            for literal in literals:
+                if literal > 0:
+                    definition_positive[literal].append(number)
+                else:
+                    definition_negative[-literal].append(number)
+
+        # Start from the all-False assignment
+        assignment = [False] * (self.symbol_count + 1)
+        self.assign_definitions(assignment)
+        true_literals = array('i', (sum(1 for literal in clause if (literal > 0) == assignment[abs(literal)])
+                                    for clause in clauses))
+        definition_true = array('i', (sum(1 for literal in literals if (literal > 0) == assignment[abs(literal)])
+                                      for _, literals in self.definitions.values()))
+        # Definitions whose value may differ from their auxiliary, as a heap of definition numbers
+        changed: List[int] = []
+
+        def outdated(number: int) -> bool:
+            count = definition_true[number]
+            return (count == sizes[number] if is_conjunction[number] else count > 0) != assignment[auxiliaries[number]]
+        unsatisfied = [0, 0]  # KB clauses, query clauses
+        for index, count in enumerate(true_literals):
+            if count == 0:
+                unsatisfied[index >= kb_count] += 1
+
+        def flip(symbol: int) -> None:
+            value = not assignment[symbol]
+            assignment[symbol] = value
+            # Clauses gaining a true literal, then clauses losing one
+            for index in (positive[symbol] if value else negative[symbol]):
+                true_literals[index] += 1
+                if true_literals[index] == 1:
+                    unsatisfied[index >= kb_count] -= 1
+            for index in (negative[symbol] if value else positive[symbol]):
+                true_literals[index] -= 1
+                if true_literals[index] == 0:
+                    unsatisfied[index >= kb_count] += 1
+            for number in (definition_positive[symbol] if value else definition_negative[symbol]):
+                definition_true[number] += 1
+                if outdated(number):
+                    heapq.heappush(changed, number)
+            for number in (definition_negative[symbol] if value else definition_positive[symbol]):
+                definition_true[number] -= 1
+                if outdated(number):
+                    heapq.heappush(changed, number)
+
+        advance = self.progress.advance if self.progress is not None else None
         valid_cases = 0
-        for assignment in self.generate_truth_assignments():
-            kb_value = self.evaluate_kb(self.kb, assignment)  
-            query_value = self.evaluate_expression(self.query, assignment)
-            
-            if kb_value and query_value:
+        for step in range(1 << len(self.literals)):
+            if advance is not None:
+                advance()
+            if step:
+                # Gray code: step i flips the symbol at the position of the lowest set bit of i
+                flip(self.literals[(step & -step).bit_length() - 1])
+                while changed:
+                    # A definition queued twice, or restored by a later flip, is skipped
+                    number = heapq.heappop(changed)
+                    if outdated(number):
+                        flip(auxiliaries[number])
+
+            if unsatisfied[0] == 0:
+                if unsatisfied[1]:
+                    print("NO")
+                    return
                 valid_cases += 1
 
-            if kb_value and not query_value:
-                print("NO")
-                return
-        
-        print(f"YES: {valid_cases}") 
\ No newline at end of file
+        print(f"YES: {valid_cases}")
+
+    def variable_order(self, supports: List[set]) -> List[int]:
+        """
+        Choose a static order of the original symbols that completes clauses early.
+
+        Symbols are picked greedily: each clause whose symbols are not all
+        ordered yet gives every remaining symbol a weight of one over the
+        number of its remaining symbols, and the heaviest symbol comes next.
+        Ties keep the order of first appearance.
+
+        :param supports: The original symbols each clause depends on.
+        :return: The symbols in the order they are assigned.
+        """
+        remaining = [set(support) for support in supports]
+        unordered = list(self.literals)
+        order = []
+        while unordered:
+            weights = dict.fromkeys(unordered, 0.0)
+            for support in remaining:
+                for symbol in support:
+                    weights[symbol] += 1 / len(support)
+            symbol = max(unordered, key=lambda candidate: weights[candidate])
+            order.append(symbol)
+            unordered.remove(symbol)
+            for support in remaining:
+                support.discard(symbol)
+            remaining = [support for support in remaining if support]
+        return order
+
+    def infer_prune(self) -> None:
+        """
+        Run TT-Entails recursively over partial assignments, pruning decided subtrees.
+
+        Symbols are assigned in a static order from variable_order. Every
+        clause, and every Tseitin definition, is evaluated at the depth where
+        its last symbol is assigned. A subtree where a KB clause is false is
+        pruned; once the KB holds and the query is decided, the subtree
+        contributes 2^(remaining symbols) models or, if the query is false,
+        the answer is NO.
+        """
+        # Original symbols each auxiliary depends on, built children first
+        support = {symbol: {symbol} for symbol in self.literals}
+        for auxiliary, (_, literals) in self.definitions.items():
+            support[auxiliary] = set().union(*(support[abs(literal)] for literal in literals))
+
+        def clause_support(clause: Sequence[int]) -> set:
+            return set().union(*(support[abs(literal)] for literal in clause))
+
+        kb = [list(clause) for clause in self.kb]
+        query = [list(clause) for clause in self.query]
+        order = self.variable_order([clause_support(clause) for clause in kb + query])
+        depth_of = {symbol: index + 1 for index, symbol in enumerate(order)}
+        symbol_count = len(order)
+
+        def depth(dependencies: set) -> int:
+            return max((depth_of[symbol] for symbol in dependencies), default=0)
+
+        # Work done when the given number of symbols is assigned
+        definitions_at = [[] for _ in range(symbol_count + 1)]
+        kb_at = [[] for _ in range(symbol_count + 1)]
+        query_at = [[] for _ in range(symbol_count + 1)]
+        for auxiliary, definition in self.definitions.items():
+            definitions_at[depth(support[auxiliary])].append((auxiliary, definition))
+        for clause in kb:
+            kb_at[depth(clause_support(clause))].append(clause)
+        for clause in query:
+            query_at[depth(clause_support(clause))].append(clause)
+        kb_last = max((index for index, clauses in enumerate(kb_at) if clauses), default=0)
+        query_last = max((index for index, clauses in enumerate(query_at) if clauses), default=0)
+
+        assignment = [False] * (self.symbol_count + 1)
+        progress = self.progress
+
+        def visit(level: int, query_false: bool) -> Optional[int]:
+            for auxiliary, (operation, literals) in definitions_at[level]:
+                values = (assignment[literal] if literal > 0 else not assignment[-literal] for literal in literals)
+                assignment[auxiliary] = all(values) if operation == "&" else any(values)
+            for clause in kb_at[level]:
+                if not self.evaluate_clause(clause, assignment):
+                    if progress is not None:
+                        progress.advance(1 << (symbol_count - level))
+                    return 0
+            if not query_false:
+                query_false = any(not self.evaluate_clause(clause, assignment) for clause in query_at[level])
+
+            if level >= kb_last:
+                if query_false:
+                    # A model of the KB where the query fails
+                    return None
+                if level >= query_last:
+                    if progress is not None:
+                        progress.advance(1 << (symbol_count - level))
+                    return 1 << (symbol_count - level)
+
+            symbol = order[level]
+            total = 0
+            for value in (True, False):
+                assignment[symbol] = value
+                count = visit(level + 1, query_false)
+                if count is None:
+                    return None
+                total += count
+            return total
+
+        valid_cases = visit(0, False)
+        print("NO" if valid_cases is None else f"YES: {valid_cases}")
+
+    def evaluator_source(self) -> str:
+        """
+        Generate the source of a model counter specialized to this KB and query.
+
+        Every symbol becomes a local variable of the generated loop, so each
+        clause is a plain "or" of locals and the KB an "and" of clauses, with
+        Tseitin definitions computed as locals first. The function returns the
+        number of models where the query holds, or None on a counterexample;
+        it calls its advance argument, when given, once per assignment.
+
+        :return: The source of a function named count_models.
+        """
+        def literal_source(literal: int) -> str:
+            return f"v{literal}" if literal > 0 else f"not v{-literal}"
+
+        def cnf_source(clauses: ClauseDatabase) -> str:
+            return " and ".join(f"({' or '.join(map(literal_source, clause)) or 'False'})" for clause in clauses) or "True"
+
+        lines = ["def count_models(advance=None):", "    valid_cases = 0"]
+        if self.literals:
+            # The trailing comma keeps tuple unpacking valid for a single symbol
+            names = "".join(f"v{literal}, " for literal in self.literals)
+            lines.append(f"    for {names.rstrip()} in product((True, False), repeat={len(self.literals)}):")
+        else:
+            lines.append("    for _ in ((),):")
+        lines += ["        if advance is not None:", "            advance()"]
+        for auxiliary, (operation, literals) in self.definitions.items():
+            joiner = " and " if operation == "&" else " or "
+            lines.append(f"        v{auxiliary} = {joiner.join(map(literal_source, literals))}")
+        lines += [
+            f"        if {cnf_source(self.kb)}:",
+            f"            if {cnf_source(self.query)}:",
+            "                valid_cases += 1",
+            "            else:",
+            "                return None",
+            "    return valid_cases",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def evaluator_key(self) -> str:
+        """Return the hash identifying the KB, query and symbols a generated evaluator depends on."""
+        definitions = array('i')
+        for auxiliary, (operation, literals) in self.definitions.items():
+            definitions.extend([auxiliary, KnowledgeBase.DEFINITION_OPERATIONS.index(operation), len(literals)])
+            definitions.extend(literals)
+        fields = [array('i', self.literals), definitions]
+        for database in (self.kb, self.query):
+            fields += [array('i', database.literals), array('q', database.offsets)]
+
+        digest = hashlib.sha256()
+        for field in fields:
+            # Each field is prefixed with its length, so that different fields never hash the same bytes
+            data = field.tobytes()
+            digest.update(len(data).to_bytes(8, "little"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def infer_compiled(self) -> None:
+        """
+        Run the truth table algorithm with a generated evaluator, cached per KB hash.
+
+        The EVALUATOR_CAPACITY most recently used evaluators are kept for the
+        whole process, so repeated runs on one KB compile it only once.
+        """
+        key = self.evaluator_key()
+        count_models = TruthTable.evaluators.get(key)
+        if count_models is None:
+            namespace = {"product": product}
+            exec(compile(self.evaluator_source(), f"<truth table {key[:12]}>", "exec"), namespace)
+            count_models = TruthTable.evaluators[key] = namespace["count_models"]
+            while len(TruthTable.evaluators) > TruthTable.EVALUATOR_CAPACITY:
+                TruthTable.evaluators.popitem(last=False)
+        else:
+            TruthTable.evaluators.move_to_end(key)
+
+        valid_cases = count_models(self.progress.advance if self.progress is not None else None)
+        print("NO" if valid_cases is None else f"YES: {valid_cases}")